@@ -12,11 +12,18 @@ from pathfinder2e_stats.config import get_config as get_config
 from pathfinder2e_stats.config import seed as seed
 from pathfinder2e_stats.config import set_config as set_config
 from pathfinder2e_stats.damage import damage as damage
+from pathfinder2e_stats.damage import damage_many as damage_many
+from pathfinder2e_stats.damage import damage_pmf as damage_pmf
 from pathfinder2e_stats.damage_spec import Damage as Damage
 from pathfinder2e_stats.damage_spec import DamageList as DamageList
 from pathfinder2e_stats.damage_spec import ExpandedDamage as ExpandedDamage
 from pathfinder2e_stats.dice import d20 as d20
 from pathfinder2e_stats.dice import roll as roll
+from pathfinder2e_stats.parallel import sweep as sweep
+from pathfinder2e_stats.session import Session as Session
+from pathfinder2e_stats.session import paired_difference as paired_difference
+from pathfinder2e_stats.streaming import converge as converge
+from pathfinder2e_stats.streaming import stream as stream
 from pathfinder2e_stats.tools import level2rank as level2rank
 from pathfinder2e_stats.tools import rank2level as rank2level
 
@@ -1,7 +1,10 @@
 from collections.abc import Callable
 from typing import Any
 
-from pathfinder2e_stats.damage_spec import Damage
+import xarray
+from xarray import DataArray
+
+from pathfinder2e_stats.damage_spec import Damage, DamageList, ExpandedDamage
 
 
 def _weapon(
@@ -23,3 +26,42 @@ def _weapon(
             f"<pathfinder2e_stats.armory.critical_specialization.{critical}>`"
         )
     return f
+
+
+def _where(
+    cond: bool | DataArray, x: int | DataArray, y: int | DataArray
+) -> int | DataArray:
+    """``x if cond else y``, where `cond` is typically a threshold on a level or
+    rank which may be a :class:`~xarray.DataArray`.
+    """
+    if isinstance(cond, DataArray):
+        return xarray.where(cond, x, y)
+    return x if cond else y
+
+
+def _if(
+    cond: bool | DataArray, spec: Damage | DamageList | ExpandedDamage
+) -> DamageList | ExpandedDamage:
+    """`spec` if `cond` else no damage, where `cond` is typically a threshold on a
+    level or rank which may be a :class:`~xarray.DataArray`.
+    In the latter case, `spec` deals no damage where `cond` is False.
+    """
+    if isinstance(spec, Damage):
+        spec = DamageList([spec])
+    if not isinstance(cond, DataArray):
+        return spec if cond else DamageList()
+
+    def mask(d: Damage) -> Damage:
+        return d.copy(
+            dice=xarray.where(cond, d.dice, 0),
+            faces=xarray.where(cond, d.faces, 0),
+            bonus=(
+                xarray.where(cond, d.bonus, 0)
+                if isinstance(d.bonus, DataArray) or d.bonus
+                else 0
+            ),
+        )
+
+    if isinstance(spec, ExpandedDamage):
+        return ExpandedDamage({k: [mask(d) for d in v] for k, v in spec.items()})
+    return DamageList([mask(d) for d in spec])
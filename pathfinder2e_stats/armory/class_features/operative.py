@@ -1,9 +1,15 @@
+from xarray import DataArray
+
+from pathfinder2e_stats.armory._common import _where
 from pathfinder2e_stats.check import DoS
 from pathfinder2e_stats.damage_spec import Damage, ExpandedDamage
 
 
 def aim(
-    level: int = 1, *, devastating_aim: bool = False, dedication: bool = False
+    level: int | DataArray = 1,
+    *,
+    devastating_aim: bool = False,
+    dedication: bool = False,
 ) -> Damage:
     """Aim damage (:srd_classes:`Operative <3-operative>` class feature).
 
@@ -15,12 +21,14 @@ def aim(
     faces = 6 if devastating_aim else 4
 
     if dedication:
-        return Damage("precision", 2 if level >= 6 else 1, faces)
+        return Damage("precision", _where(level >= 6, 2, 1), faces)
     dice = (level + 7) // 6
     return Damage("precision", dice, faces)
 
 
-def bloody_wounds(level: int = 1, *, dedication: bool = False) -> ExpandedDamage:
+def bloody_wounds(
+    level: int | DataArray = 1, *, dedication: bool = False
+) -> ExpandedDamage:
     """:srd_feats:`Bloody Wounds <535-bloody-wounds>` Operative feat.
 
     :param dedication:
@@ -1,8 +1,10 @@
+from xarray import DataArray
+
 from pathfinder2e_stats.check import DoS
 from pathfinder2e_stats.damage_spec import Damage, DamageList, ExpandedDamage
 
 
-def precise_strike(level: int = 1, *, dedication: bool = False) -> Damage:
+def precise_strike(level: int | DataArray = 1, *, dedication: bool = False) -> Damage:
     """Precise Strike damage (:prd_classes:`Swashbuckler <63>` class feature).
     This is the damage added to strikes that are not a Finisher.
 
@@ -12,7 +14,7 @@ def precise_strike(level: int = 1, *, dedication: bool = False) -> Damage:
     return Damage("precision", 0, 0, dice)
 
 
-def finisher(level: int = 1, *, dedication: bool = False) -> Damage:
+def finisher(level: int | DataArray = 1, *, dedication: bool = False) -> Damage:
     """Base Finisher damage (:prd_classes:`Swashbuckler <63>` class feature).
     For :prd_feats:`Finishing Precision <6235>`, set `dedication` to True.
     """
@@ -20,16 +22,16 @@ def finisher(level: int = 1, *, dedication: bool = False) -> Damage:
     return Damage("precision", dice, 6)
 
 
-def confident_finisher(level: int = 1) -> ExpandedDamage:
+def confident_finisher(level: int | DataArray = 1) -> ExpandedDamage:
     f = finisher(level)
     return f + {DoS.failure: [f.copy(multiplier=0.5)]}
 
 
-def precise_finisher(level: int = 6) -> ExpandedDamage:
+def precise_finisher(level: int | DataArray = 6) -> ExpandedDamage:
     f = finisher(level)
     return f + {DoS.failure: [f]}
 
 
-def bleeding_finisher(level: int = 8) -> DamageList:
+def bleeding_finisher(level: int | DataArray = 8) -> DamageList:
     f = finisher(level)
     return f + f.copy(type="bleed", persistent=True)
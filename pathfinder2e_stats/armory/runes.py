@@ -1,10 +1,13 @@
 import warnings
 
+from xarray import DataArray
+
+from pathfinder2e_stats.armory._common import _if, _where
 from pathfinder2e_stats.check import DoS
 from pathfinder2e_stats.damage_spec import Damage, DamageList, ExpandedDamage
 
 
-def vitalizing(level: int = 6, *, greater: None = None) -> Damage:
+def vitalizing(level: int | DataArray = 6, *, greater: None = None) -> Damage:
     # Deprecated 'greater' parameter
     if isinstance(level, bool):  # positional
         greater = level  # type: ignore[assignment]
@@ -17,7 +20,7 @@ def vitalizing(level: int = 6, *, greater: None = None) -> Damage:
         if greater:
             level = 14
 
-    dice = 2 if level >= 14 else 1
+    dice = _where(level >= 14, 2, 1)
     return Damage("vitality", dice, 6, persistent=True)
 
 
@@ -34,7 +37,7 @@ def corrosive() -> Damage:
     return Damage("acid", 1, 6)
 
 
-def flaming(level: int = 8, *, greater: None = None) -> ExpandedDamage:
+def flaming(level: int | DataArray = 8, *, greater: None = None) -> ExpandedDamage:
     # Deprecated 'greater' parameter
     if isinstance(level, bool):  # positional
         greater = level  # type: ignore[assignment]
@@ -47,7 +50,7 @@ def flaming(level: int = 8, *, greater: None = None) -> ExpandedDamage:
         if greater:
             level = 15
 
-    dice = 2 if level >= 15 else 1
+    dice = _where(level >= 15, 2, 1)
     dmg = Damage("fire", 1, 6) + {
         DoS.critical_success: [Damage("fire", dice, 10, persistent=True)]
     }
@@ -68,7 +71,7 @@ def shock() -> Damage:
     return Damage("electricity", 1, 6)
 
 
-def auto(level: int = 1) -> DamageList | ExpandedDamage:
+def auto(level: int | DataArray = 1) -> DamageList | ExpandedDamage:
     """Use all available property runes for energy damage.
 
     >>> auto(level=20)
@@ -76,14 +79,11 @@ def auto(level: int = 1) -> DamageList | ExpandedDamage:
     plus (1d6)x2 acid plus 2d10 persistent fire
     **Success** 1d6 fire plus 1d6 electricity plus 1d6 acid
     """
-    if level < 8:
-        return DamageList()
-    runes = flaming(level=level)
-    if level >= 10:
-        runes += shock()
-    if level >= 16:
-        runes += corrosive()
-    return runes
+    return (
+        _if(level >= 8, flaming(level=level))
+        + _if(level >= 10, shock())
+        + _if(level >= 16, corrosive())
+    )
 
 
 auto._setup_doc = False  # type: ignore[attr-defined]
@@ -1,8 +1,11 @@
+from xarray import DataArray
+
+from pathfinder2e_stats.armory._common import _where
 from pathfinder2e_stats.damage_spec import Damage
 
 
-def gluon(level: int = 6) -> Damage:
-    faces = min(level, 15) // 3 * 2
+def gluon(level: int | DataArray = 6) -> Damage:
+    faces = _where(level < 15, level, 15) // 3 * 2
     return Damage("bleed", 1, faces, persistent=True)
 
 
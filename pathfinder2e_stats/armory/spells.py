@@ -1,38 +1,38 @@
 from typing import Literal
 
+from xarray import DataArray
+
 from pathfinder2e_stats.check import DoS
 from pathfinder2e_stats.damage_spec import Damage, DamageList, ExpandedDamage
 
 
-def biting_words(rank: int = 1) -> Damage:
+def biting_words(rank: int | DataArray = 1) -> Damage:
     return Damage("sonic", rank * 2, 6)
 
 
-def blazing_bolt(rank: int = 2, actions: Literal[1, 2, 3] = 3) -> Damage:
-    dice = rank
-    if actions > 1:
-        dice *= 2
+def blazing_bolt(rank: int | DataArray = 2, actions: Literal[1, 2, 3] = 3) -> Damage:
+    dice = rank * 2 if actions > 1 else rank
     return Damage("fire", dice, 6)
 
 
-def blistering_invective(rank: int = 2) -> Damage:
+def blistering_invective(rank: int | DataArray = 2) -> Damage:
     return Damage("fire", rank // 2 * 2, 6, persistent=True, basic_save=True)
 
 
-def breathe_fire(rank: int = 1) -> Damage:
+def breathe_fire(rank: int | DataArray = 1) -> Damage:
     return Damage("fire", rank * 2, 6, basic_save=True)
 
 
-def brine_dragon_bile(rank: int = 2) -> Damage:
+def brine_dragon_bile(rank: int | DataArray = 2) -> Damage:
     return Damage("acid", rank // 2 * 2, 6, persistent=True)
 
 
-def dehydrate(rank: int = 1) -> Damage:
+def dehydrate(rank: int | DataArray = 1) -> Damage:
     dice = (rank - 1) // 2 * 3 + 1
     return Damage("fire", dice, 6, basic_save=True, persistent=True)
 
 
-def divine_wrath(rank: int = 4) -> ExpandedDamage:
+def divine_wrath(rank: int | DataArray = 4) -> ExpandedDamage:
     base = Damage("spirit", rank, 10)
     return ExpandedDamage(
         {
@@ -43,12 +43,12 @@ def divine_wrath(rank: int = 4) -> ExpandedDamage:
     )
 
 
-def fireball(rank: int = 3) -> Damage:
+def fireball(rank: int | DataArray = 3) -> Damage:
     return Damage("fire", rank * 2, 6, basic_save=True)
 
 
 def force_barrage(
-    rank: int = 1,
+    rank: int | DataArray = 1,
     actions: Literal[1, 2, 3] = 3,
     corageous_anthem: bool = False,
 ) -> Damage:
@@ -62,23 +62,25 @@ def force_barrage(
     return Damage("force", bolts, 4, bolts * (2 if corageous_anthem else 1))
 
 
-def harm(rank: int = 1, harming_hands: bool = False) -> Damage:
+def harm(rank: int | DataArray = 1, harming_hands: bool = False) -> Damage:
     return Damage("void", rank, 10 if harming_hands else 8, basic_save=True)
 
 
-def heal(rank: int = 1, healing_hands: bool = False) -> Damage:
+def heal(rank: int | DataArray = 1, healing_hands: bool = False) -> Damage:
     return Damage("vitality", rank, 10 if healing_hands else 8, basic_save=True)
 
 
-def lightning_bolt(rank: int = 3) -> Damage:
+def lightning_bolt(rank: int | DataArray = 3) -> Damage:
     return Damage("electricity", rank + 1, 12, basic_save=True)
 
 
-def organsight(rank: int = 3) -> Damage:
+def organsight(rank: int | DataArray = 3) -> Damage:
     return Damage("precision", rank + 1, 6)
 
 
-def shocking_grasp(rank: int = 1, metal: bool = False) -> Damage | ExpandedDamage:
+def shocking_grasp(
+    rank: int | DataArray = 1, metal: bool = False
+) -> Damage | ExpandedDamage:
     d = Damage("electricity", rank + 1, 12)
     if not metal:
         return d
@@ -86,7 +88,7 @@ def shocking_grasp(rank: int = 1, metal: bool = False) -> Damage | ExpandedDamag
     return d.expand() + {DoS.critical_success: [p], DoS.success: [p]}
 
 
-def thunderstrike(rank: int = 1) -> DamageList:
+def thunderstrike(rank: int | DataArray = 1) -> DamageList:
     e = Damage("electricity", rank, 12, basic_save=True)
     s = Damage("sonic", 1, 4, basic_save=True)
     return DamageList([e, s])
@@ -1,11 +1,14 @@
+from xarray import DataArray
+
+from pathfinder2e_stats.armory._common import _if, _where
 from pathfinder2e_stats.check import DoS
 from pathfinder2e_stats.damage_spec import Damage, DamageList, ExpandedDamage
 
 
-def entropic_destabilizer(level: int = 8) -> ExpandedDamage:
+def entropic_destabilizer(level: int | DataArray = 8) -> ExpandedDamage:
     dmg = Damage("void", 1, 4) + {
         DoS.critical_success: [
-            Damage("void", 4 if level >= 15 else 2, 4, persistent=True)
+            Damage("void", _where(level >= 15, 4, 2), 4, persistent=True)
         ]
     }
     assert isinstance(dmg, ExpandedDamage)
@@ -16,10 +19,10 @@ def loudener() -> Damage:
     return Damage("sonic", 1, 6)
 
 
-def flaming(level: int = 8) -> ExpandedDamage:
+def flaming(level: int | DataArray = 8) -> ExpandedDamage:
     dmg = Damage("fire", 1, 6) + {
         DoS.critical_success: [
-            Damage("fire", 2 if level >= 15 else 1, 10, persistent=True)
+            Damage("fire", _where(level >= 15, 2, 1), 10, persistent=True)
         ]
     }
     assert isinstance(dmg, ExpandedDamage)
@@ -30,7 +33,7 @@ def frost() -> Damage:
     return Damage("cold", 1, 6)
 
 
-def shock(level: int = 8) -> Damage | ExpandedDamage:
+def shock(level: int | DataArray = 8) -> Damage | ExpandedDamage:
     """
     .. note::
 
@@ -40,6 +43,10 @@ def shock(level: int = 8) -> Damage | ExpandedDamage:
         Tactical Shock upgrades, unlike Greater Shock runes,
         deal extra damage on a critical hit.
     """
+    if isinstance(level, DataArray):
+        return ExpandedDamage(
+            _if(level < 15, shock(level=1)) + _if(level >= 15, shock(level=15))
+        )
     if level >= 15:
         return ExpandedDamage(
             {
@@ -50,7 +57,7 @@ def shock(level: int = 8) -> Damage | ExpandedDamage:
     return Damage("electricity", 1, 6)
 
 
-def auto(level: int = 1) -> DamageList | ExpandedDamage:
+def auto(level: int | DataArray = 1) -> DamageList | ExpandedDamage:
     """Use all available weapon upgrades for energy damage.
 
     .. note::
@@ -63,14 +70,11 @@ def auto(level: int = 1) -> DamageList | ExpandedDamage:
     plus (1d6)x2 cold plus (1d6)x2 sonic plus 2d10 persistent fire
     **Success** 1d6 fire plus 1d6 electricity plus 1d6 cold plus 1d6 sonic
     """
-    if level < 8:
-        return DamageList()
-    upgrades = flaming(level=level) + shock(level=level)
-    if level >= 12:
-        upgrades += frost()
-    if level >= 19:
-        upgrades += loudener()
-    return upgrades
+    return (
+        _if(level >= 8, flaming(level=level) + shock(level=level))
+        + _if(level >= 12, frost())
+        + _if(level >= 19, loudener())
+    )
 
 
 auto._setup_doc = False  # type: ignore[attr-defined]
@@ -6,7 +6,10 @@ import numpy as np
 import xarray
 from xarray import DataArray, Dataset
 
-from pathfinder2e_stats.dice import d20
+from pathfinder2e_stats.config import _config, get_config
+from pathfinder2e_stats.dice import _d20, _d20_pmf, _int_dtype, d20
+from pathfinder2e_stats.parallel import _split_rolls
+from pathfinder2e_stats.streaming import _reduce_chunks
 from pathfinder2e_stats.tools import _parse_independent_dependent_dims
 
 if TYPE_CHECKING:
@@ -48,6 +51,20 @@ class DoS(IntEnum):
         return self.name.replace("_", " ").capitalize()
 
 
+# All outcomes that can be produced by rolling a check, from best to worst.
+# This is the order of the ``outcome`` dimension of :func:`outcome_counts`.
+_EXACT_OUTCOMES = (
+    DoS.critical_success,
+    DoS.success,
+    DoS.failure,
+    DoS.critical_failure,
+)
+
+# Target number of outcomes in each chunk of check(mode="counts")
+_COUNTS_CHUNK_ELEMENTS = 2**20
+
+
+@_split_rolls
 def check(
     bonus: int | DataArray = 0,
     *,
@@ -65,6 +82,7 @@ def check(
     allow_failure: bool | DataArray = True,
     allow_critical_success: bool | DataArray = True,
     primary_target: DataArray | Dataset | None = None,
+    mode: Literal["roll", "exact", "counts"] = "roll",
 ) -> Dataset:
     """Roll a d20 and compare the result to a Difficulty Class (DC).
 
@@ -161,21 +179,61 @@ def check(
         Passed to :func:`map_outcome` post-processing.
     :param primary_target:
         Passed to :func:`map_outcome` post-processing.
+        When ``mode="exact"``, this must be the output of another call to
+        ``check(..., mode="exact")``; the two checks are assumed to be independent.
+    :param mode:
+
+        ``roll`` (default)
+            Roll the d20 `roll_size` times (see :func:`set_config`).
+        ``exact``
+            Don't roll; instead, enumerate all faces of the d20 and return the exact
+            probability of each outcome. This is much faster than rolling and has no
+            sampling noise, but the output can't be used to model anything that
+            depends on the individual rolls, e.g. a sequence of Strikes where the
+            outcome of the first one influences the following ones.
+            `independent_dims` and `dependent_dims` are ignored.
+        ``counts``
+            Roll like ``roll``, but only return the frequency of each outcome, with
+            the same output as ``exact``. Internally, roll in chunks and count the
+            outcomes of each chunk before moving on to the next one, so that the
+            individual rolls are never held in memory all at once. Use this when you
+            only need :func:`outcome_counts` of a large simulation, or when you need
+            to feed the output of a check with fortune effects or ``primary_target``
+            to ``damage(..., mode="exact")``.
+
     :returns:
         A :class:`~xarray.Dataset` containing the following variables:
 
         bonus, etc.
             As the parameter. Only present when not the default value.
         natural
-            The result of the natural d20 roll before adding the bonus
+            The result of the natural d20 roll before adding the bonus.
+            With `hero_point` or `perfected_form`, this has an extra dimension
+            ``hp_reroll`` with the result of each reroll, unless the
+            ``lazy_rerolls`` config option is set (see :func:`set_config`).
+            Not present when ``mode="exact"`` or ``mode="counts"``.
         use_hero_point
             Whether a hero point was used to reroll the outcome.
             Only present if `hero_point` is not False.
+            When ``mode="exact"``, this is the probability of using the hero point;
+            when ``mode="counts"``, the frequency of using it.
         original_outcome
             The outcome of the check before any modifications by :func:`map_outcome`.
             Only present if any parameters to the function are specified.
+            Not present when ``mode="exact"`` or ``mode="counts"``.
         outcome
-            The final outcome of the check
+            The final outcome of the check.
+            When ``mode="exact"`` or ``mode="counts"``, this is instead a dimension
+            with one point for each degree of success, from critical success to
+            critical failure.
+        original_probability
+            Only when ``mode="exact"`` or ``mode="counts"``: the probability
+            (or frequency) of each outcome before any modifications by
+            :func:`map_outcome`.
+            Only present if any parameters to the function are specified.
+        probability
+            Only when ``mode="exact"`` or ``mode="counts"``: the probability
+            (or frequency) of each outcome.
 
     **Examples:**
 
@@ -251,7 +309,41 @@ def check(
     False    0.6524
     True     0.3476
     Name: use_hero_point, dtype: float64
+
+    The same, but calculating the exact probabilities instead of rolling:
+
+    >>> c = check(12, DC=20, hero_point=DoS.failure, evasion=True, mode="exact")
+    >>> outcome_counts(c).to_pandas()
+    outcome
+    Critical success    0.8775
+    Success             0.0000
+    Failure             0.1050
+    Critical failure    0.0175
+    Name: outcome, dtype: float64
+    >>> c.use_hero_point.round(4).item()
+    0.35
     """
+    if mode not in ("roll", "exact", "counts"):
+        raise ValueError(f"mode must be 'roll', 'exact', or 'counts'; got {mode!r}")
+    if mode == "counts":
+        return _check_counts(
+            bonus=bonus,
+            DC=DC,
+            independent_dims=independent_dims,
+            dependent_dims=dependent_dims,
+            keen=keen,
+            perfected_form=perfected_form,
+            fortune=fortune,
+            misfortune=misfortune,
+            hero_point=hero_point,
+            evasion=evasion,
+            incapacitation=incapacitation,
+            allow_critical_failure=allow_critical_failure,
+            allow_failure=allow_failure,
+            allow_critical_success=allow_critical_success,
+            primary_target=primary_target,
+        )
+
     # Create output dataset, normalize input args, and collect input dimensions
     ds = Dataset(
         data_vars={"bonus": bonus, "DC": DC},
@@ -271,32 +363,212 @@ def check(
         ("primary_target", primary_target, None),
     ):
         if v is not default:
-            if k == "primary_target" and isinstance(v, Dataset):
+            if k == "primary_target" and mode == "exact":
+                assert primary_target is not None
+                v = _outcome_probability(primary_target)
+            elif k == "primary_target" and isinstance(v, Dataset):
                 v = v.outcome
             ds[k] = v
 
+    if mode == "exact":
+        ds = _check_exact(
+            ds,
+            keen=keen,
+            perfected_form=perfected_form,
+            fortune=fortune,
+            misfortune=misfortune,
+            hero_point=hero_point,
+        )
+        return map_outcome(
+            ds,
+            evasion=evasion,
+            incapacitation=incapacitation,
+            allow_critical_failure=allow_critical_failure,
+            allow_failure=allow_failure,
+            allow_critical_success=allow_critical_success,
+            primary_target=primary_target,
+        )
+
     # Normalize and validate independent_dims and dependent_dims
     independent_dims = _parse_independent_dependent_dims(
         "check", ds, independent_dims, dependent_dims
     )
 
-    hp_reroll_coord = ["original"]
-    if perfected_form is not False:
-        independent_dims["hp_reroll"] = 2
-        hp_reroll_coord.append("perfected form")
-    if hero_point is not False:
-        independent_dims["hp_reroll"] = independent_dims.get("hp_reroll", 1) + 1
-        hp_reroll_coord.append("hero point")
+    config = get_config()
+    if config["lazy_rerolls"] and config["backend"] == "numpy":
+        _roll_lazy_rerolls(
+            ds,
+            independent_dims,
+            keen=keen,
+            perfected_form=perfected_form,
+            fortune=fortune,
+            misfortune=misfortune,
+            hero_point=hero_point,
+        )
+    else:
+        hp_reroll_coord = ["original"]
+        if perfected_form is not False:
+            independent_dims["hp_reroll"] = 2
+            hp_reroll_coord.append("perfected form")
+        if hero_point is not False:
+            independent_dims["hp_reroll"] = independent_dims.get("hp_reroll", 1) + 1
+            hp_reroll_coord.append("hero point")
+
+        natural = d20(fortune=fortune, misfortune=misfortune, dims=independent_dims)
+        if len(hp_reroll_coord) > 1:
+            natural.coords["hp_reroll"] = hp_reroll_coord
+        if perfected_form is not False:
+            natural = xarray.where(
+                natural.coords["hp_reroll"] == "perfected form", 10, natural
+            )
+        ds["natural"] = natural
+        ds["outcome"] = outcome = _natural_to_outcome(natural, bonus, DC, keen)
+
+        if hero_point is not False or perfected_form is not False:
+            # Hero point, Perfected Form and fortune effects that apply before the roll
+            # (e.g. Sure Strike) are mutually exclusive.
+            nfortune = ~DataArray(fortune)
+
+            cur_outcome = outcome.sel(hp_reroll="original", drop=True)
+            if perfected_form is not False:
+                use_perfected_form = DataArray(perfected_form) & nfortune
+                pf_outcome = outcome.sel(hp_reroll="perfected form", drop=True)
+                cur_outcome = xarray.where(
+                    use_perfected_form,
+                    np.maximum(pf_outcome, cur_outcome),
+                    cur_outcome,
+                )
+
+            if hero_point is not False:
+                use_hero_point = (cur_outcome <= hero_point) & nfortune
+                hp_outcome = outcome.sel(hp_reroll="hero point", drop=True)
+                cur_outcome = xarray.where(use_hero_point, hp_outcome, cur_outcome)
+                ds["use_hero_point"] = use_hero_point
+
+            ds["outcome"] = cur_outcome
+    assert "hp_reroll" not in ds["outcome"].dims
 
+    return map_outcome(
+        ds,
+        evasion=evasion,
+        incapacitation=incapacitation,
+        allow_critical_failure=allow_critical_failure,
+        allow_failure=allow_failure,
+        allow_critical_success=allow_critical_success,
+        primary_target=primary_target,
+    )
+
+
+def _roll_lazy_rerolls(
+    ds: Dataset,
+    independent_dims: Mapping[Hashable, int],
+    *,
+    keen: bool | DataArray,
+    perfected_form: bool | DataArray,
+    fortune: bool | DataArray,
+    misfortune: bool | DataArray,
+    hero_point: DoS | int | Literal[False] | DataArray,
+) -> None:
+    """Implement :func:`check` with ``mode="roll"`` and the ``lazy_rerolls`` config
+    option. Add the ``natural``, ``outcome`` and ``use_hero_point`` variables to ds.
+
+    Perfected Form doesn't roll at all, as the natural roll is always 10, while the
+    hero point reroll is only rolled for the points along the ``roll`` dimension
+    where it is used for at least one point along the other dimensions.
+    """
     natural = d20(fortune=fortune, misfortune=misfortune, dims=independent_dims)
-    if len(hp_reroll_coord) > 1:
-        natural.coords["hp_reroll"] = hp_reroll_coord
+    ds["natural"] = natural
+    outcome = _natural_to_outcome(natural, ds["bonus"], ds["DC"], keen)
+
+    # Hero point, Perfected Form and fortune effects that apply before the roll
+    # (e.g. Sure Strike) are mutually exclusive.
+    nfortune = ~DataArray(fortune)
     if perfected_form is not False:
-        natural = xarray.where(
-            natural.coords["hp_reroll"] == "perfected form", 10, natural
+        pf_outcome = _natural_to_outcome(DataArray(10), ds["bonus"], ds["DC"], keen)
+        outcome = xarray.where(
+            DataArray(perfected_form) & nfortune,
+            np.maximum(outcome, pf_outcome),
+            outcome,
         )
-    ds["natural"] = natural
 
+    if hero_point is not False:
+        use_hero_point = (outcome <= hero_point) & nfortune
+        ds["use_hero_point"] = use_hero_point
+        rows = np.flatnonzero(
+            use_hero_point.any([d for d in use_hero_point.dims if d != "roll"]).values
+        )
+        outcome = outcome.broadcast_like(use_hero_point).transpose(*use_hero_point.dims)
+        # Don't write back into the output of broadcast_like, which may be a view
+        outcome = outcome.copy()
+        if rows.size:
+            hp_natural = _reroll_d20(
+                rows, fortune=fortune, misfortune=misfortune, dims=independent_dims
+            )
+            hp_outcome = _natural_to_outcome(hp_natural, ds["bonus"], ds["DC"], keen)
+            sub = outcome.isel(roll=rows)
+            sub = xarray.where(use_hero_point.isel(roll=rows), hp_outcome, sub)
+            outcome[{"roll": rows}] = sub.transpose(*outcome.dims)
+
+    ds["outcome"] = outcome
+
+
+def _reroll_d20(
+    rows: np.ndarray,
+    *,
+    fortune: bool | DataArray,
+    misfortune: bool | DataArray,
+    dims: Mapping[Hashable, int],
+) -> DataArray:
+    """Roll a d20 only for the given indices along the ``roll`` dimension.
+
+    With ``counter_rng`` or within a :class:`Session`, where each roll must be
+    the same regardless of which other rolls are rerolled, roll for all indices
+    and then select.
+    """
+    if get_config()["counter_rng"] or getattr(_config, "session", None) is not None:
+        return d20(fortune=fortune, misfortune=misfortune, dims=dims).isel(roll=rows)
+
+    return _d20(fortune=fortune, misfortune=misfortune, dims=dims, roll_size=rows.size)
+
+
+def _natural_to_outcome(
+    natural: DataArray,
+    bonus: int | DataArray,
+    DC: int | DataArray,
+    keen: bool | DataArray,
+) -> DataArray:
+    """Convert natural d20 rolls to degrees of success.
+
+    For integer bonus and DC, this is a single lookup in :data:`_OUTCOME_LUT`,
+    which doesn't allocate any temporary arrays as large as `natural`.
+    """
+    diff = DataArray(bonus) - DC
+    if diff.dtype.kind not in "iu":
+        return _natural_to_outcome_slow(natural, bonus, DC, keen)
+
+    # Beyond these bounds, the outcome no longer depends on bonus - DC
+    diff = diff.clip(_LUT_DIFF_MIN, _LUT_DIFF_MAX) - _LUT_DIFF_MIN
+    lut = _OUTCOME_LUT.astype(_int_dtype(DoS.no_roll, DoS.critical_success))
+    return xarray.apply_ufunc(
+        lambda keen, natural, diff: lut[keen, natural, diff],
+        # Note: a boolean index would be interpreted as a mask
+        DataArray(keen).astype(np.intp),
+        natural,
+        diff,
+        dask="parallelized",
+        output_dtypes=[lut.dtype],
+    )
+
+
+def _natural_to_outcome_slow(
+    natural: DataArray,
+    bonus: int | DataArray,
+    DC: int | DataArray,
+    keen: bool | DataArray,
+) -> DataArray:
+    """Convert natural d20 rolls to degrees of success, one rule at a time.
+    This is used to build :data:`_OUTCOME_LUT` and for non-integer bonus and DC.
+    """
     delta = natural + bonus - DC
 
     assert DoS.failure.value == 0
@@ -317,41 +589,217 @@ def check(
         DoS.critical_success,
         outcome,
     )
-    ds["outcome"] = outcome
+    return outcome.astype(_int_dtype(DoS.no_roll, DoS.critical_success))
 
-    if hero_point is not False or perfected_form is not False:
-        # Hero point, Perfected Form and fortune effects that apply before the roll
-        # (e.g. Sure Strike) are mutually exclusive.
-        nfortune = ~DataArray(fortune)
 
-        cur_outcome = outcome.sel(hp_reroll="original", drop=True)
-        if perfected_form is not False:
-            use_perfected_form = DataArray(perfected_form) & nfortune
-            pf_outcome = outcome.sel(hp_reroll="perfected form", drop=True)
-            cur_outcome = xarray.where(
-                use_perfected_form,
-                np.maximum(pf_outcome, cur_outcome),
-                cur_outcome,
-            )
+_LUT_DIFF_MIN = -30
+_LUT_DIFF_MAX = 10
 
-        if hero_point is not False:
-            use_hero_point = (cur_outcome <= hero_point) & nfortune
-            hp_outcome = outcome.sel(hp_reroll="hero point", drop=True)
-            cur_outcome = xarray.where(use_hero_point, hp_outcome, cur_outcome)
-            ds["use_hero_point"] = use_hero_point
+# Degree of success for every combination of keen (0 or 1), natural d20 roll
+# (0 is unused), and bonus - DC - _LUT_DIFF_MIN
+_OUTCOME_LUT = (
+    _natural_to_outcome_slow(
+        DataArray(np.arange(21), dims=["natural"]),
+        DataArray(np.arange(_LUT_DIFF_MIN, _LUT_DIFF_MAX + 1), dims=["diff"]),
+        0,
+        DataArray([False, True], dims=["keen"]),
+    )
+    .transpose("keen", "natural", "diff")
+    .values.astype(np.int8)
+)
 
-        ds["outcome"] = cur_outcome
-    assert "hp_reroll" not in ds["outcome"].dims
 
-    return map_outcome(
-        ds,
-        evasion=evasion,
-        incapacitation=incapacitation,
-        allow_critical_failure=allow_critical_failure,
-        allow_failure=allow_failure,
-        allow_critical_success=allow_critical_success,
-        primary_target=primary_target,
+def _check_exact(
+    ds: Dataset,
+    *,
+    keen: bool | DataArray,
+    perfected_form: bool | DataArray,
+    fortune: bool | DataArray,
+    misfortune: bool | DataArray,
+    hero_point: DoS | int | Literal[False] | DataArray,
+) -> Dataset:
+    """Implement :func:`check` with ``mode="exact"``, before :func:`map_outcome`.
+
+    Instead of rolling, enumerate all 20 faces of the d20 and weigh each of them by
+    its probability.
+    """
+    p_natural = _d20_pmf(fortune=fortune, misfortune=misfortune, dim="__natural")
+    outcome = _natural_to_outcome(
+        p_natural.coords["__natural"], ds["bonus"], ds["DC"], keen
+    ).drop_vars("__natural")
+    p_natural = p_natural.drop_vars("__natural")
+
+    # Hero point, Perfected Form and fortune effects that apply before the roll
+    # (e.g. Sure Strike) are mutually exclusive.
+    nfortune = ~DataArray(fortune)
+
+    cur_outcome = outcome
+    if perfected_form is not False:
+        pf_outcome = _natural_to_outcome(DataArray(10), ds["bonus"], ds["DC"], keen)
+        cur_outcome = xarray.where(
+            DataArray(perfected_form) & nfortune,
+            np.maximum(pf_outcome, cur_outcome),
+            cur_outcome,
+        )
+
+    if hero_point is False:
+        ds["probability"] = _outcome_pmf(p_natural, cur_outcome, "__natural")
+    else:
+        # The hero point reroll is independent from the original roll
+        use_hero_point = (cur_outcome <= hero_point) & nfortune
+        p_use_hero_point = (p_natural * use_hero_point).sum("__natural")
+        ds["use_hero_point"] = p_use_hero_point
+        ds["probability"] = _outcome_pmf(
+            p_natural.where(~use_hero_point, 0), cur_outcome, "__natural"
+        ) + p_use_hero_point * _outcome_pmf(p_natural, outcome, "__natural")
+
+    return ds
+
+
+def _check_counts(**kwargs: Any) -> Dataset:
+    """Implement :func:`check` with ``mode="counts"``.
+
+    Call ``check(**kwargs)`` on chunks of the ``roll`` dimension, each holding
+    about ``_COUNTS_CHUNK_ELEMENTS`` outcomes, and accumulate the outcome counts.
+    """
+    first, totals = _reduce_chunks(
+        check,
+        (),
+        kwargs,
+        accumulate=_accumulate_counts,
+        chunk_elements=_COUNTS_CHUNK_ELEMENTS,
+    )
+    roll_size = get_config()["roll_size"]
+    ds = first.drop_vars(
+        [name for name, v in first.variables.items() if "roll" in v.dims]
+        + [name for name in ("hp_reroll",) if name in first.coords]
     )
+    for name, total in totals.items():
+        ds[name] = total / roll_size
+    return ds
+
+
+def _accumulate_counts(
+    totals: dict[Hashable, DataArray], chunk: Dataset
+) -> dict[Hashable, DataArray]:
+    """Add the outcome counts of a chunk of :func:`check` with ``mode="roll"``
+    to the running totals of :func:`_check_counts`.
+    """
+    new = {}
+    if "use_hero_point" in chunk:
+        new["use_hero_point"] = chunk["use_hero_point"].sum("roll")
+    if "original_outcome" in chunk:
+        new["original_probability"] = _outcome_pmf(
+            DataArray(1), chunk["original_outcome"], "roll"
+        )
+    new["probability"] = _outcome_pmf(DataArray(1), chunk["outcome"], "roll")
+    return {k: totals[k] + v if k in totals else v for k, v in new.items()}
+
+
+def _outcome_pmf(p: DataArray, outcome: DataArray, dim: str) -> DataArray:
+    """Given the probability `p` of each point along `dim` and
+    the `outcome` of each point, return the probability of each outcome
+    along the new dimension ``outcome``.
+    """
+    values = DataArray(
+        [dos.value for dos in _EXACT_OUTCOMES],
+        dims=["outcome"],
+        coords={"outcome": [str(dos) for dos in _EXACT_OUTCOMES]},
+    )
+    return (p * (outcome == values)).sum(dim)
+
+
+def _outcome_probability(obj: DataArray | Dataset) -> DataArray:
+    """Return the probability of each outcome, along dimension ``outcome``,
+    of either the output of :func:`check` with ``mode="exact"``, the output of
+    :func:`check` with ``mode="roll"``, or its ``outcome`` variable.
+    Rolled outcomes are converted to their frequencies along the ``roll`` dimension.
+    """
+    if isinstance(obj, Dataset):
+        if "probability" in obj.data_vars:
+            return obj["probability"]
+        obj = obj["outcome"]
+    if "outcome" in obj.dims:
+        return obj  # Already a probability table
+    return _outcome_pmf(DataArray(1 / obj.sizes["roll"]), obj, "roll")
+
+
+def _map_probability(
+    probability: DataArray,
+    *,
+    evasion: bool | DataArray,
+    incapacitation: bool | Literal[-1, 0, 1] | DataArray,
+    allow_critical_failure: bool | DataArray,
+    allow_failure: bool | DataArray,
+    allow_critical_success: bool | DataArray,
+    primary_target: DataArray | Dataset | None,
+) -> DataArray:
+    """Implement :func:`map_outcome` for the output of :func:`check` with
+    ``mode="exact"``.
+
+    Map each of the possible outcomes through :func:`map_outcome`, then redistribute
+    their probabilities.
+    """
+    from_ = DataArray([dos.value for dos in _EXACT_OUTCOMES], dims=["__from"])
+    p_from = probability.rename({"outcome": "__from"}).drop_vars("__from")
+
+    def remap(pt: DataArray | None) -> DataArray:
+        to = map_outcome(
+            from_,
+            evasion=evasion,
+            incapacitation=incapacitation,
+            allow_critical_failure=allow_critical_failure,
+            allow_failure=allow_failure,
+            allow_critical_success=allow_critical_success,
+            primary_target=pt,
+        )
+        return _outcome_pmf(p_from, to, "__from")
+
+    if primary_target is None:
+        return remap(None)
+
+    # The roll vs. the primary target is independent from the current one
+    p_hit = (
+        _outcome_probability(primary_target)
+        .sel(outcome=[str(DoS.critical_success), str(DoS.success)])
+        .sum("outcome")
+    )
+    return p_hit * remap(DataArray(DoS.success)) + (1 - p_hit) * remap(None)
+
+
+def _map_outcome_exact(
+    ds: Dataset,
+    map_: Any,
+    **kwargs: Any,
+) -> Dataset:
+    """Implement :func:`map_outcome` for the output of :func:`check` with
+    ``mode="exact"``.
+    """
+    if map_ is not None:
+        raise ValueError(
+            "Bespoke mappings are not supported for the output of "
+            "check(..., mode='exact')"
+        )
+    defaults = {
+        "evasion": False,
+        "incapacitation": False,
+        "allow_critical_failure": True,
+        "allow_failure": True,
+        "allow_critical_success": True,
+        "primary_target": None,
+    }
+    changed = {k: v for k, v in kwargs.items() if v is not defaults[k]}
+    if not changed:
+        return ds
+
+    ds = ds.rename({"probability": "original_probability"})
+    for k, v in changed.items():
+        # Note: when map_outcome is a tail call from check, this is redundant.
+        if k == "primary_target":
+            v = _outcome_probability(v)
+        ds[k] = v
+    ds["probability"] = _map_probability(ds["original_probability"], **kwargs)
+    return ds
 
 
 def map_outcome(
@@ -480,6 +928,18 @@ def map_outcome(
       Attributes:
           legend:   {-2: 'No roll', -1: 'Critical failure', 0: 'Failure', 1: 'Succe...
     """
+    if isinstance(outcome, Dataset) and "probability" in outcome.data_vars:
+        return _map_outcome_exact(
+            outcome,
+            map_,
+            evasion=evasion,
+            incapacitation=incapacitation,
+            allow_critical_failure=allow_critical_failure,
+            allow_failure=allow_failure,
+            allow_critical_success=allow_critical_success,
+            primary_target=primary_target,
+        )
+
     if isinstance(outcome, Dataset):
         ds = outcome
         changed = map_ is not None
@@ -513,6 +973,114 @@ def map_outcome(
         )
         return ds
 
+    if isinstance(primary_target, Dataset):
+        primary_target = primary_target["outcome"]
+    rules: dict[str, Any] = {
+        "evasion": evasion,
+        "incapacitation": incapacitation,
+        "allow_critical_failure": allow_critical_failure,
+        "allow_failure": allow_failure,
+        "allow_critical_success": allow_critical_success,
+    }
+    if outcome.dtype.kind not in "iu":
+        return _map_outcome_rules(outcome, map_, **rules, primary_target=primary_target)
+
+    # Apply all rules to every possible outcome, producing a lookup table
+    # along dimension __lut, then look up each point of the input.
+    # The lookup table has the shape of the parameters, which are typically
+    # much smaller than the input.
+    from_ = DataArray(
+        np.arange(_MAP_LUT_MIN, _MAP_LUT_MAX + 1, dtype=outcome.dtype),
+        dims=["__lut"],
+    )
+    if primary_target is None:
+        lut = _map_outcome_rules(from_, map_, **rules, primary_target=None)
+        return xarray.apply_ufunc(
+            _lookup_outcome,
+            outcome,
+            lut,
+            input_core_dims=[[], ["__lut"]],
+            dask="parallelized",
+            output_dtypes=[lut.dtype],
+        )
+
+    # Add a row to the lookup table for when the primary target was hit
+    hit = DataArray([False, True], dims=["__hit"])
+    lut = _map_outcome_rules(
+        from_, map_, **rules, primary_target=xarray.where(hit, DoS.success, DoS.failure)
+    )
+    return xarray.apply_ufunc(
+        _lookup_outcome,
+        outcome,
+        lut,
+        primary_target >= DoS.success,
+        input_core_dims=[[], ["__hit", "__lut"], []],
+        dask="parallelized",
+        output_dtypes=[lut.dtype],
+    )
+
+
+# Range of outcomes in the lookup table of map_outcome. Outcomes outside of
+# [no_roll, critical_success], e.g. from chaining after an integer map_, are
+# clipped by the rules after adding incapacitation (-1 to +1), so all outcomes
+# below _MAP_LUT_MIN map like _MAP_LUT_MIN and all above _MAP_LUT_MAX map like
+# _MAP_LUT_MAX.
+_MAP_LUT_MIN = DoS.no_roll - 1
+_MAP_LUT_MAX = DoS.critical_success + 1
+
+
+def _lookup_outcome(
+    outcome: np.ndarray, lut: np.ndarray, hit: np.ndarray | None = None
+) -> np.ndarray:
+    """Look up each outcome in a table produced by :func:`_map_outcome_rules`.
+
+    :param outcome:
+        Outcomes to map, broadcastable against ``lut[..., 0]``.
+    :param lut:
+        Table with the mapped value of each outcome from _MAP_LUT_MIN to
+        _MAP_LUT_MAX along the last axis, optionally preceded by an axis
+        for whether the primary target was missed or hit.
+    :param hit:
+        Whether the primary target was hit, broadcastable against `outcome`.
+    """
+    if outcome.size and (outcome.min() < _MAP_LUT_MIN or outcome.max() > _MAP_LUT_MAX):
+        outcome = outcome.clip(_MAP_LUT_MIN, _MAP_LUT_MAX)
+    if hit is None:
+        # Rotate the table so that negative outcomes are negative indices,
+        # which spares a temporary array of indices as large as the input
+        lut = np.roll(lut, _MAP_LUT_MIN, axis=-1)
+        idx = outcome
+    else:
+        idx = outcome - _MAP_LUT_MIN + hit * lut.shape[-1]
+        lut = lut.reshape(*lut.shape[:-2], -1)
+    idx = idx[..., np.newaxis]
+    # apply_ufunc omits leading dimensions of size 1
+    ndim = max(lut.ndim, idx.ndim)
+    lut = lut.reshape((1,) * (ndim - lut.ndim) + lut.shape)
+    idx = idx.reshape((1,) * (ndim - idx.ndim) + idx.shape)
+    return np.take_along_axis(lut, idx, axis=-1)[..., 0]
+
+
+def _map_outcome_rules(
+    outcome: DataArray,
+    map_: (
+        Mapping[DoS | int | DataArray, Any]
+        | Iterable[tuple[DoS | int | DataArray, Any]]
+        | None
+    ),
+    /,
+    *,
+    evasion: bool | DataArray,
+    incapacitation: bool | Literal[-1, 0, 1] | DataArray,
+    allow_critical_failure: bool | DataArray,
+    allow_failure: bool | DataArray,
+    allow_critical_success: bool | DataArray,
+    primary_target: DataArray | None,
+) -> DataArray:
+    """Implement :func:`map_outcome` for a DataArray, applying one rule at a time.
+    This is used to build the lookup table of :func:`map_outcome` and for
+    non-integer outcomes.
+    """
     orig_outcome = outcome
     outcome = xarray.where(
         evasion & (outcome == DoS.success),
@@ -531,13 +1099,14 @@ def map_outcome(
         DoS.success,
     )
     if primary_target is not None:
-        if isinstance(primary_target, Dataset):
-            primary_target = primary_target.outcome
         outcome = xarray.where(
             (primary_target >= DoS.success) & (outcome == DoS.success),
             DoS.failure,
             outcome,
         )
+    if orig_outcome.dtype.kind == "i":
+        # Don't upcast compact dtypes
+        outcome = outcome.astype(orig_outcome.dtype)
 
     if map_ is None:
         return outcome
@@ -576,9 +1145,12 @@ def outcome_counts(
     :param outcome:
         Either the :class:`~xarray.Dataset` returned by :func:`check` or
         :func:`map_outcome` or just their ``outcome`` variable.
+        If it is the output of ``check(..., mode="exact")`` or
+        ``check(..., mode="counts")``, return its ``probability`` variable.
     :param dim:
         The dimension to reduce when counting the outcomes.
-        Default: ``roll``.
+        Default: ``roll``. Ignored for ``check(..., mode="exact")`` and
+        ``check(..., mode="counts")``.
     :param new_dim:
         The name of the new dimension containing all
         outcome values. Default: ``outcome``.
@@ -607,8 +1179,34 @@ def outcome_counts(
     Coordinates:
       * outcome  (outcome) <U16 256B 'Critical success' ... 'Critical failure'
     """
+    if isinstance(outcome, Dataset) and "probability" in outcome.data_vars:
+        if not normalize:
+            raise ValueError(
+                "Can't count the outcomes of check(..., mode='exact'); "
+                "set normalize=True"
+            )
+        return outcome["probability"].rename("outcome").rename({"outcome": new_dim})
+
     if isinstance(outcome, Dataset):
-        outcome = outcome.outcome
+        outcome = outcome["outcome"]
+
+    if outcome.chunks is not None:
+        # dask-backed (see set_config(backend="dask")).
+        # Count the outcomes chunk by chunk, then compute the small output in order
+        # to drop the outcomes that never occurred, like value_counts does.
+        vc = xarray.concat(
+            [(outcome == dos).sum([dim]) for dos in reversed(DoS)],
+            dim=new_dim,
+            coords="minimal",
+            compat="override",
+            join="exact",
+        ).compute()
+        other_dims = [d for d in vc.dims if d != new_dim]
+        vc.coords[new_dim] = [str(dos) for dos in reversed(DoS)]
+        vc = vc.isel({new_dim: vc.any(other_dims).values}).transpose(..., new_dim)
+        vc = vc.rename(outcome.name)
+        vc.attrs.update(outcome.attrs)
+        return vc / outcome.sizes[dim] if normalize else vc
 
     # Use accessor installed in pathfinder2e_stats.accessors
     vc = outcome.value_counts(dim, new_dim=new_dim, normalize=normalize)
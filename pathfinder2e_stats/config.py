@@ -1,6 +1,6 @@
 import threading
 from collections.abc import Collection, Hashable
-from typing import Any, TypedDict, cast
+from typing import Any, Literal, TypedDict, cast
 
 import numpy as np
 
@@ -35,6 +35,57 @@ def seed(n: Any | None = None) -> None:
     See also :func:`seed`.
     """
     _config.rng = np.random.default_rng(n)
+    # Restart the counter-based streams; see set_config(counter_rng=True)
+    _config.__dict__.pop("counter_draw", None)
+    if isinstance(n, np.random.Generator | np.random.BitGenerator):
+        # Don't consume the caller's generator unless counter_rng is used
+        _config.__dict__.pop("counter_key", None)
+    else:
+        _config.counter_key = _new_counter_key(np.random.default_rng(n))
+
+
+def _new_counter_key(gen: np.random.Generator) -> np.ndarray:
+    """Generate a Philox key for the counter-based random number generator"""
+    return gen.integers(2**64, size=2, dtype=np.uint64)
+
+
+def _counter_raw(
+    shape: tuple[int, ...], *, roll_start: int | None = None
+) -> np.ndarray:
+    """Draw raw 64-bit random numbers from the counter-based random number
+    generator used by ``set_config(counter_rng=True)``.
+
+    Every call (*draw*) uses a separate Philox stream, keyed on the seed and on
+    the number of previous draws since :func:`seed` was called. Within a draw,
+    the random numbers for each point along the ``roll`` dimension (the first
+    axis of `shape`) start at a fixed counter which depends on the absolute index
+    of the roll, so that roll i is always the same regardless of how the ``roll``
+    dimension is split across chunks, threads, or processes.
+
+    :param shape:
+        Output shape. The first axis is the ``roll`` dimension.
+    :param roll_start:
+        Absolute index of the first roll. Default: ``get_config()["roll_offset"]``.
+    :returns:
+        uint64 array of the given shape.
+    """
+    gen = rng()  # Seed to 0 on first use
+    try:
+        key = _config.counter_key
+    except AttributeError:
+        key = _config.counter_key = _new_counter_key(gen)
+    draw = _config.__dict__.get("counter_draw", 0)
+    _config.counter_draw = draw + 1
+    if roll_start is None:
+        roll_start = get_config()["roll_offset"]
+
+    n, *rest = shape
+    per_roll = int(np.prod(rest))
+    # Philox produces 4 uint64 for each increment of the counter
+    blocks = -(-per_roll // 4)
+    bitgen = np.random.Philox(key=key, counter=[roll_start * blocks, draw, 0, 0])
+    raw = bitgen.random_raw(n * blocks * 4).reshape(n, blocks * 4)
+    return raw[:, :per_roll].reshape(shape)
 
 
 class Config(TypedDict):
@@ -50,17 +101,50 @@ class Config(TypedDict):
     damage_independent_dims: set[Hashable]
     #: Default `dependent_dims` parameter for :func:`~pathfinder2e_stats.damage`.
     damage_dependent_dims: set[Hashable]
+    #: Use the narrowest integer dtypes that can hold rolls. Default: False.
+    compact_dtypes: bool
+    #: Algorithm used by :func:`~pathfinder2e_stats.roll` to roll multiple dice.
+    #: Default: ``"dice"``.
+    dice_sampler: Literal["dice", "cdf"]
+    #: Use stratified sampling in :func:`~pathfinder2e_stats.d20`. Default: False.
+    stratified_d20: bool
+    #: Use a counter-based random number generator. Default: False.
+    counter_rng: bool
+    #: Absolute index of the first roll, for ``counter_rng``. Default: 0.
+    roll_offset: int
+    #: Number of threads used by :func:`~pathfinder2e_stats.check` and
+    #: :func:`~pathfinder2e_stats.damage`. Default: 1.
+    threads: int
+    #: Array library backing the rolls. Default: ``"numpy"``.
+    backend: Literal["numpy", "dask"]
+    #: Size of the dask chunks along the ``roll`` dimension. Default: 100_000.
+    dask_chunk_size: int
+    #: Roll hero points and Perfected Form only where they're used.
+    #: Default: False.
+    lazy_rerolls: bool
 
 
 def get_config() -> Config:
     """Return the current configuration settings."""
     d = _config.__dict__.copy()
     d.pop("rng", None)
+    d.pop("session", None)
+    d.pop("counter_key", None)
+    d.pop("counter_draw", None)
     d.setdefault("roll_size", _roll_size_default)
     d.setdefault("check_independent_dims", set())
     d.setdefault("check_dependent_dims", set())
     d.setdefault("damage_independent_dims", set())
     d.setdefault("damage_dependent_dims", set())
+    d.setdefault("compact_dtypes", False)
+    d.setdefault("dice_sampler", "dice")
+    d.setdefault("stratified_d20", False)
+    d.setdefault("counter_rng", False)
+    d.setdefault("roll_offset", 0)
+    d.setdefault("threads", 1)
+    d.setdefault("backend", "numpy")
+    d.setdefault("dask_chunk_size", 100_000)
+    d.setdefault("lazy_rerolls", False)
     return cast(Config, d)
 
 
@@ -70,6 +154,16 @@ def set_config(
     check_dependent_dims: Collection[Hashable] | None = None,
     damage_independent_dims: Collection[Hashable] | None = None,
     damage_dependent_dims: Collection[Hashable] | None = None,
+    *,
+    compact_dtypes: bool | None = None,
+    dice_sampler: Literal["dice", "cdf"] | None = None,
+    stratified_d20: bool | None = None,
+    counter_rng: bool | None = None,
+    roll_offset: int | None = None,
+    threads: int | None = None,
+    backend: Literal["numpy", "dask"] | None = None,
+    dask_chunk_size: int | None = None,
+    lazy_rerolls: bool | None = None,
 ) -> None:
     """Set one or more library settings.
     All settings are thread-local.
@@ -116,8 +210,139 @@ def set_config(
 
         Default: empty set.
 
+    :param compact_dtypes:
+        If True, store the results of :func:`roll`, :func:`d20`, :func:`check`, and
+        :func:`damage` with the narrowest signed integer dtype that can safely hold
+        them (typically ``int8`` for d20 rolls and degrees of success and ``int8`` or
+        ``int16`` for damage) instead of ``int64``. This reduces memory usage, which
+        is typically the bottleneck of large multi-dimensional simulations.
+        Note that this changes the sequence of random numbers.
+
+        Default: False.
+
+    :param dice_sampler:
+        Algorithm used by :func:`roll` to roll multiple dice and sum them up:
+
+        ``dice``
+            Roll each die separately and then sum them up. Memory usage and
+            run time are proportional to the number of dice.
+        ``cdf``
+            Draw the sum directly from its precomputed cumulative distribution
+            function (inverse transform sampling), with a single uniform random
+            number per output element. Memory usage and run time are independent
+            of the number of dice, which matters for high-level spells such as
+            a rank 9 :func:`~pathfinder2e_stats.armory.spells.fireball`.
+            Note that this changes the sequence of random numbers.
+
+        Default: ``dice``.
+
+    :param stratified_d20:
+        If True, :func:`d20` (and, consequently, :func:`check`) uses stratified
+        sampling: every block of 20 consecutive rolls along the ``roll`` dimension
+        contains every face exactly once, in random order, independently for every
+        point along the other dimensions. This means that the outcome frequencies
+        of a check are exact when `roll_size` is a multiple of 20, unless fortune,
+        misfortune, or rerolls are involved, in which case they are still much more
+        precise than with plain random sampling.
+        Note that this changes the sequence of random numbers.
+
+        Default: False.
+
+    :param counter_rng:
+        If True, draw all random numbers from a counter-based generator
+        (:class:`numpy.random.Philox`) instead of the generator returned by
+        :func:`rng`. Every roll along the ``roll`` dimension is drawn from its own
+        position in the stream, which depends only on the seed, on the number of
+        random draws since :func:`seed` was called, and on the absolute index of the
+        roll. This means that you can split a simulation across multiple chunks,
+        threads, or processes and get the exact same results as running it in one
+        go, as long as each of them calls :func:`seed` with the same value and
+        sets `roll_offset` to the index of its first roll.
+        :func:`stream` and :func:`converge` do this automatically.
+        Note that this changes the sequence of random numbers.
+
+        Default: False.
+
+    :param roll_offset:
+        Absolute index of the first roll along the ``roll`` dimension.
+        Only meaningful when `counter_rng` is True.
+
+        Default: 0.
+
+    :param threads:
+        Number of threads used by :func:`check` and :func:`damage` when rolling.
+        If greater than 1, the ``roll`` dimension is split into equal chunks which
+        are processed in parallel by a pool of threads. Each thread inherits the
+        settings of the calling thread and uses its own random number generator,
+        spawned from :func:`rng`. This delivers the best speedup on free-threaded
+        Python builds, but also some on GIL-enabled builds, as numpy releases the
+        GIL for most heavy operations.
+        Note that this changes the sequence of random numbers, unless
+        `counter_rng` is also set, in which case the results are identical for any
+        number of threads.
+
+        Default: 1.
+
+    :param backend:
+        Array library backing the output of :func:`roll` and :func:`d20`, and
+        consequently of :func:`check` and :func:`damage`:
+
+        ``numpy``
+            Roll immediately and hold all rolls in memory.
+        ``dask``
+            Return lazy :class:`dask.array.Array` objects, split into chunks of
+            `dask_chunk_size` rolls along the ``roll`` dimension. Nothing is rolled
+            until you call ``.compute()`` (or ``.values``, ``.item()``, etc.) on the
+            final result, which then processes the chunks in parallel with the
+            threaded or multiprocessing scheduler of dask, optionally holding only a
+            few chunks in memory at any given time if you reduce the ``roll``
+            dimension, e.g. with ``.mean("roll")``.
+            Each chunk uses its own random number generator, spawned from
+            :func:`rng` when the roll is defined, so that results don't depend on
+            the scheduler. Note that this changes the sequence of random numbers,
+            unless `counter_rng` is also set. Requires
+            `dask <https://www.dask.org/>`_ to be installed.
+
+        Default: ``numpy``.
+
+    :param dask_chunk_size:
+        Number of rolls in each dask chunk, when `backend` is ``dask``.
+
+        Default: 100_000.
+
+    :param lazy_rerolls:
+        If True, :func:`check` with `hero_point` rolls the second d20 only for the
+        rolls where the hero point is actually used, instead of rolling it for all
+        of them and discarding most, and `perfected_form` doesn't roll at all.
+        This reduces random draws, run time, and memory usage when rerolls are
+        rare, e.g. with ``hero_point=DoS.critical_failure``.
+        The ``natural`` variable returned by :func:`check` then contains only the
+        first roll and lacks the ``hp_reroll`` dimension.
+        Note that this changes the sequence of random numbers.
+
+        Default: False.
+
+    **Example:**
+
+    Split 10 rolls across two workers, getting the same result as rolling
+    them all at once:
+
+    >>> from pathfinder2e_stats import roll, seed
+    >>> seed(0)
+    >>> set_config(counter_rng=True, roll_size=10)
+    >>> roll(1, 20).values
+    array([20, 20,  3,  3,  3,  8,  5,  8,  9, 18])
+    >>> def worker(roll_offset, roll_size):
+    ...     seed(0)
+    ...     set_config(roll_offset=roll_offset, roll_size=roll_size)
+    ...     return roll(1, 20).values
+    >>> worker(0, 4), worker(4, 6)
+    (array([20, 20,  3,  3]), array([ 3,  8,  5,  8,  9, 18]))
+
     .. only:: doctest
 
+        >>> seed(0)
+        >>> set_config(counter_rng=False, roll_offset=0, roll_size=100_000)
         >>> set_config(check_independent_dims=(), check_dependent_dims=())
     """
     if roll_size is not None:
@@ -130,3 +355,35 @@ def set_config(
         _config.damage_independent_dims = set(damage_independent_dims)
     if damage_dependent_dims is not None:
         _config.damage_dependent_dims = set(damage_dependent_dims)
+    if compact_dtypes is not None:
+        _config.compact_dtypes = compact_dtypes
+    if dice_sampler is not None:
+        if dice_sampler not in ("dice", "cdf"):
+            raise ValueError(
+                f"dice_sampler must be 'dice' or 'cdf'; got {dice_sampler!r}"
+            )
+        _config.dice_sampler = dice_sampler
+    if stratified_d20 is not None:
+        _config.stratified_d20 = stratified_d20
+    if counter_rng is not None:
+        _config.counter_rng = counter_rng
+    if roll_offset is not None:
+        if roll_offset < 0:
+            raise ValueError(f"roll_offset must be non-negative; got {roll_offset}")
+        _config.roll_offset = roll_offset
+    if threads is not None:
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1; got {threads}")
+        _config.threads = threads
+    if backend is not None:
+        if backend not in ("numpy", "dask"):
+            raise ValueError(f"backend must be 'numpy' or 'dask'; got {backend!r}")
+        _config.backend = backend
+    if dask_chunk_size is not None:
+        if dask_chunk_size < 1:
+            raise ValueError(
+                f"dask_chunk_size must be at least 1; got {dask_chunk_size}"
+            )
+        _config.dask_chunk_size = dask_chunk_size
+    if lazy_rerolls is not None:
+        _config.lazy_rerolls = lazy_rerolls
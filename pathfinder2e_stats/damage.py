@@ -1,16 +1,32 @@
-from collections.abc import Collection, Hashable, Mapping
-from typing import cast
+from collections.abc import Callable, Collection, Hashable, Mapping
+from typing import Any, Literal, TypeVar, cast
 
 import numpy as np
 import xarray
 from xarray import DataArray, Dataset
 
-from pathfinder2e_stats.check import check
-from pathfinder2e_stats.damage_spec import Damage, DamageLike, ExpandedDamage
-from pathfinder2e_stats.dice import roll
+from pathfinder2e_stats.accessors import _bincount
+from pathfinder2e_stats.check import (
+    _COUNTS_CHUNK_ELEMENTS,
+    _EXACT_OUTCOMES,
+    DoS,
+    _accumulate_counts,
+    _outcome_probability,
+    check,
+)
+from pathfinder2e_stats.damage_spec import (
+    Damage,
+    DamageLike,
+    ExpandedDamage,
+    _split_array_spec,
+)
+from pathfinder2e_stats.dice import _dice_pmf, _int_dtype, roll
+from pathfinder2e_stats.parallel import _split_rolls
+from pathfinder2e_stats.streaming import _reduce_chunks
 from pathfinder2e_stats.tools import _parse_independent_dependent_dims
 
 
+@_split_rolls
 def damage(
     check_outcome: Dataset,
     damage_spec: DamageLike,
@@ -23,6 +39,7 @@ def damage(
     persistent_damage_rounds: int = 3,
     persistent_damage_DC: int | Mapping[str, int] | DataArray = 15,
     splash_damage_targets: int = 2,
+    mode: Literal["roll", "exact", "mean", "counts"] = "roll",
 ) -> Dataset:
     """Roll for damage.
 
@@ -42,6 +59,11 @@ def damage(
         :class:`~pathfinder2e_stats.ExpandedDamage`, a
         dict representing an :class:`~pathfinder2e_stats.ExpandedDamage`, or
         a combination thereof using the `+` operator.
+
+        The dice, faces, and bonus of each :class:`~pathfinder2e_stats.Damage` can
+        be :class:`~xarray.DataArray`, in which case their dimensions are added to
+        the output. Like the dimensions of `check_outcome`, they must be listed in
+        either `independent_dims` or `dependent_dims`. See example below.
     :param independent_dims:
         Dimensions along which to roll independently for each point.
 
@@ -141,6 +163,33 @@ def damage(
         The number of targets affected by splash damage,
         including the main target. When calculating total damage, splash damage will be
         multiplied by this number. Default: 2 targets (main + 1 secondary target).
+    :param mode:
+
+        ``roll`` (default)
+            Roll damage once for every roll of `check_outcome`.
+        ``exact``
+            Don't roll; instead, calculate the exact probability of dealing each
+            amount of damage. `check_outcome` should be the output of
+            ``check(..., mode="exact")`` or ``check(..., mode="counts")``;
+            if it isn't, the probability of each
+            outcome is estimated from its frequency along the ``roll`` dimension.
+            `independent_dims` and `dependent_dims` are ignored.
+        ``counts``
+            Roll damage once for every roll of `check_outcome`, like ``roll``, but
+            in chunks of rolls which are counted and discarded as soon as they're
+            rolled, so that memory usage doesn't grow with the number of rolls.
+            The output has the same format as ``exact``, with frequencies in
+            place of probabilities.
+            Note that this only bounds the memory used by the damage rolls:
+            `check_outcome` must still hold every roll. To avoid materializing
+            it, pass ``check(..., mode="counts")`` to ``damage(..., mode="exact")``
+            instead.
+        ``mean``
+            Don't roll; instead, calculate the expected damage.
+            This is much faster than rolling and then calculating the mean
+            along the ``roll`` dimension.
+            The same considerations as for ``exact`` apply.
+
     :returns:
         A shallow copy of `check_outcome` with additional variables for the damage:
 
@@ -201,6 +250,25 @@ def damage(
         damage_spec
             String representation of the `damage_spec` parameter.
 
+        When ``mode="exact"``, `direct_damage`, `splash_damage`, `persistent_damage`,
+        and `total_damage` are instead the probability of each amount of damage,
+        along a new dimension ``damage``. The variables of `check_outcome` along the
+        ``roll`` dimension are replaced by the probability of each outcome, as in
+        ``check(..., mode="exact")``. `persistent_damage` is the damage accumulated
+        over all rounds and lacks the ``persistent_round`` dimension, while
+        `apply_persistent_damage` is the probability that persistent damage is still
+        active at the end of each round. `persistent_damage_check` is omitted.
+        ``mode="counts"`` returns the same variables as ``mode="exact"``, with the
+        frequency of each amount of damage along the ``roll`` dimension in place of
+        its probability.
+
+        When ``mode="mean"``, `direct_damage`, `splash_damage`, `persistent_damage`,
+        and `total_damage` are instead the expected damage. `persistent_damage` is
+        the expected damage for a single round and lacks the ``persistent_round``
+        dimension, while `apply_persistent_damage` is the probability that
+        persistent damage is still active at the end of each round.
+        `persistent_damage_check` is omitted.
+
     **Examples:**
 
     Strike an AC17 enemy with a Longsword (+8 to hit, 1d8+4 damage):
@@ -293,10 +361,398 @@ def damage(
     1    13.47350
     2     7.64498
     Name: total_damage, dtype: float64
+
+    The same, but calculating the exact probabilities instead of rolling:
+
+    >>> saving_throw = check(reflex_bonus, DC=21, mode="exact")
+    >>> dmg = damage(saving_throw, spec, resistances=resistances, mode="exact")
+    >>> (dmg.total_damage * dmg.damage).sum("damage").round(4).to_pandas()
+    target
+    0    15.625
+    1    13.525
+    2     7.676
+    dtype: float64
+
+    The expected damage can be calculated directly, which is even faster:
+
+    >>> damage(
+    ...     saving_throw, spec, resistances=resistances, mode="mean"
+    ... ).total_damage.round(4).to_pandas()
+    target
+    0    15.625
+    1    13.525
+    2     7.676
+    Name: total_damage, dtype: float64
+
+    What is the probability of dealing at least 20 damage to each target?
+
+    >>> dmg.total_damage.sel(damage=slice(20, None)).sum("damage").round(4).to_pandas()
+    target
+    0    0.3047
+    1    0.2410
+    2    0.0902
+    Name: total_damage, dtype: float64
+
+    Strike with a longsword by a champion with +4 STR modifier at every level,
+    with the striking runes and weapon specialization of their level, against an
+    enemy of the same level with moderate AC:
+
+    >>> from pathfinder2e_stats import tables
+    >>> PC = tables.PC
+    >>> spec = Damage(
+    ...     "slashing",
+    ...     PC.weapon_dice.striking_rune,
+    ...     8,
+    ...     4 + PC.weapon_specialization.champion,
+    ... )
+    >>> attack_roll = check(PC.level + 12, DC=PC.level + 16, dependent_dims=["level"])
+    >>> dmg = damage(attack_roll, spec, dependent_dims=["level"])
+    >>> dmg.total_damage.mean("roll").sel(level=[1, 5, 10, 15, 20]).round(2).to_pandas()
+    level
+    1     10.14
+    5     15.55
+    10    17.93
+    15    28.08
+    20    33.43
+    Name: total_damage, dtype: float64
     """
-    out = check_outcome.copy(deep=False)
+    if mode not in ("roll", "exact", "mean", "counts"):
+        raise ValueError(
+            f"mode must be 'roll', 'exact', 'mean', or 'counts'; got {mode!r}"
+        )
+
     damage_spec = ExpandedDamage(damage_spec)
+    split = _split_array_spec(damage_spec)
+    if split is not None and mode != "counts":
+        return _damage_array_spec(
+            check_outcome,
+            damage_spec,
+            *split,
+            mode=mode,
+            independent_dims=independent_dims,
+            dependent_dims=dependent_dims,
+            weaknesses=weaknesses,
+            resistances=resistances,
+            immunities=immunities,
+            persistent_damage_rounds=persistent_damage_rounds,
+            persistent_damage_DC=persistent_damage_DC,
+            splash_damage_targets=splash_damage_targets,
+        )
+    if mode == "exact":
+        return _damage_exact(
+            check_outcome,
+            damage_spec,
+            weaknesses=_parse_weaknesses(weaknesses),
+            resistances=_parse_weaknesses(resistances),
+            immunities=_parse_weaknesses(immunities),
+            persistent_damage_rounds=persistent_damage_rounds,
+            persistent_damage_DC=persistent_damage_DC,
+            splash_damage_targets=splash_damage_targets,
+        )
+    if mode == "mean":
+        return _damage_mean(
+            check_outcome,
+            damage_spec,
+            weaknesses=_parse_weaknesses(weaknesses),
+            resistances=_parse_weaknesses(resistances),
+            immunities=_parse_weaknesses(immunities),
+            persistent_damage_rounds=persistent_damage_rounds,
+            persistent_damage_DC=persistent_damage_DC,
+            splash_damage_targets=splash_damage_targets,
+        )
+    if "probability" in check_outcome.data_vars:
+        raise ValueError(
+            "The output of check(..., mode='exact') can only be used with "
+            "damage(..., mode='exact') or damage(..., mode='mean')"
+        )
+    if mode == "counts":
+        return _damage_counts(
+            damage,
+            check_outcome,
+            damage_spec,
+            independent_dims=independent_dims,
+            dependent_dims=dependent_dims,
+            weaknesses=weaknesses,
+            resistances=resistances,
+            immunities=immunities,
+            persistent_damage_rounds=persistent_damage_rounds,
+            persistent_damage_DC=persistent_damage_DC,
+            splash_damage_targets=splash_damage_targets,
+        )
+
+    return _damage_roll(
+        check_outcome,
+        [damage_spec],
+        None,
+        independent_dims=independent_dims,
+        dependent_dims=dependent_dims,
+        weaknesses=weaknesses,
+        resistances=resistances,
+        immunities=immunities,
+        persistent_damage_rounds=persistent_damage_rounds,
+        persistent_damage_DC=persistent_damage_DC,
+        splash_damage_targets=splash_damage_targets,
+    )
+
+
+@_split_rolls
+def damage_many(
+    check_outcome: Dataset,
+    damage_specs: Mapping[Hashable, DamageLike],
+    *,
+    independent_dims: Collection[Hashable] = (),
+    dependent_dims: Collection[Hashable] = (),
+    weaknesses: Mapping[str, int] | DataArray | None = None,
+    resistances: Mapping[str, int] | DataArray | None = None,
+    immunities: Mapping[str, bool] | Collection[str] | DataArray | None = None,
+    persistent_damage_rounds: int = 3,
+    persistent_damage_DC: int | Mapping[str, int] | DataArray = 15,
+    splash_damage_targets: int = 2,
+    mode: Literal["roll", "exact", "mean", "counts"] = "roll",
+) -> Dataset:
+    """Roll for damage with multiple alternative damage specs, e.g. different
+    weapons or spells, against the same check outcome.
+
+    This is equivalent to calling :func:`damage` once for each spec and
+    concatenating the results along a new ``spec`` dimension, but faster:
+    identical dice across specs, e.g. the base weapon die, are rolled only once
+    and shared, so that the comparison between specs is not affected by the
+    noise of rolling them separately.
+
+    :param check_outcome:
+        The outcome of the check that caused the damage; see :func:`damage`.
+    :param damage_specs:
+        Mapping of ``{label: damage spec}``, where each damage spec is anything
+        accepted by :func:`damage`. The labels become the coordinate of the
+        ``spec`` dimension.
+    :param mode:
+        See :func:`damage`. Dice are shared between specs only with
+        ``mode="roll"`` and ``mode="counts"``.
+
+    All other parameters are the same as in :func:`damage`. The check to recover
+    from persistent damage is also shared between specs.
+
+    :returns:
+        The same as :func:`damage`, where the variables that depend on the damage
+        spec gain the ``spec`` dimension. Damage types that a spec does not deal
+        have zero damage.
+
+    **Example:**
+
+    .. only:: doctest
+
+        >>> from pathfinder2e_stats import Damage, check, seed
+        >>> seed(0)
+
+    Which is the better rune for a +1 striking longsword against an enemy
+    resistant to fire, :prd_equipment:`Flaming <2838>` or
+    :prd_equipment:`Shock <2849>`?
+
+    >>> longsword = Damage("slashing", 2, 8, 1)
+    >>> dmg = damage_many(
+    ...     check(10, DC=20),
+    ...     {
+    ...         "flaming": longsword + Damage("fire", 1, 6),
+    ...         "shock": longsword + Damage("electricity", 1, 6),
+    ...     },
+    ...     resistances={"fire": 5},
+    ... )
+    >>> dmg.total_damage.mean("roll").round(2).to_pandas()
+    spec
+    flaming    6.21
+    shock      8.10
+    Name: total_damage, dtype: float64
+
+    The slashing damage of the longsword is the same for both runes:
+
+    >>> slashing = dmg.direct_damage.sel(damage_type="slashing")
+    >>> bool((slashing.sel(spec="flaming") == slashing.sel(spec="shock")).all())
+    True
+    """
+    if mode not in ("roll", "exact", "mean", "counts"):
+        raise ValueError(
+            f"mode must be 'roll', 'exact', 'mean', or 'counts'; got {mode!r}"
+        )
+    if not damage_specs:
+        raise ValueError("damage_specs must not be empty")
+    if "spec" in check_outcome.dims:
+        raise ValueError("check_outcome must not have a 'spec' dimension")
+
+    names = list(damage_specs)
+    specs = [ExpandedDamage(spec) for spec in damage_specs.values()]
+    if any(_split_array_spec(spec) is not None for spec in specs):
+        raise TypeError("damage_many() does not support array-valued damage specs")
+    kwargs: dict[str, Any] = {
+        "independent_dims": independent_dims,
+        "dependent_dims": dependent_dims,
+        "weaknesses": weaknesses,
+        "resistances": resistances,
+        "immunities": immunities,
+        "persistent_damage_rounds": persistent_damage_rounds,
+        "persistent_damage_DC": persistent_damage_DC,
+        "splash_damage_targets": splash_damage_targets,
+    }
+    if mode in ("exact", "mean"):
+        return _damage_many_no_roll(
+            check_outcome,
+            [damage(check_outcome, spec, mode=mode, **kwargs) for spec in specs],
+            names,
+            pmf=mode == "exact",
+        )
+    if "probability" in check_outcome.data_vars:
+        raise ValueError(
+            "The output of check(..., mode='exact') can only be used with "
+            "damage_many(..., mode='exact') or damage_many(..., mode='mean')"
+        )
+    if mode == "counts":
+        return _damage_counts(
+            damage_many, check_outcome, dict(zip(names, specs, strict=True)), **kwargs
+        )
+    return _damage_roll(check_outcome, specs, names, **kwargs)
+
+
+def _damage_many_no_roll(
+    check_outcome: Dataset,
+    results: list[Dataset],
+    names: list[Hashable],
+    *,
+    pmf: bool,
+) -> Dataset:
+    """Implement :func:`damage_many` with ``mode="exact"`` or ``mode="mean"``,
+    by concatenating the outputs of :func:`damage` for each spec.
+
+    :param pmf:
+        True if `results` hold probability mass functions along the ``damage``
+        dimension, in which case damage types that a spec does not deal have
+        probability 1 of dealing zero damage; False if they hold expected damage.
+    """
+    spec_vars = [
+        k
+        for k in ("direct_damage", "splash_damage", "persistent_damage", "total_damage")
+        if any(k in r for r in results)
+    ]
+    # Variables that don't depend on the spec, e.g. weaknesses, only differ
+    # in the damage types they cover
+    shared = results[0].drop_vars(spec_vars, errors="ignore")
+    for r in results[1:]:
+        shared = shared.combine_first(r.drop_vars(spec_vars, errors="ignore"))
+    for k, v in shared.data_vars.items():
+        dtype = next(r[k].dtype for r in results if k in r)
+        shared[k] = v.fillna(0).astype(dtype)
+
+    by_spec = []
+    for k in spec_vars:
+        template = next(r[k] for r in results if k in r)
+        if "damage_type" in template.dims:
+            template = template.isel(damage_type=slice(0, 0))
+        concat = xarray.concat(
+            [r[k] if k in r else xarray.zeros_like(template) for r in results],
+            dim="spec",
+            join="outer",
+            fill_value=0,
+        )
+        by_spec.append(
+            concat.transpose(
+                *(d for d in concat.dims if d in check_outcome.dims), "spec", ...
+            )
+        )
+
+    out = xarray.merge([shared, *by_spec], join="outer", fill_value=0)
+    out.coords["spec"] = names
+    out.attrs = {}
+    for r in results:
+        out.attrs.update(r.attrs)
+    out.attrs["damage_spec"] = {
+        name: r.attrs["damage_spec"] for name, r in zip(names, results, strict=True)
+    }
+
+    if pmf:
+        for k in spec_vars:
+            if "damage_type" not in out[k].dims:
+                continue
+            present = DataArray(
+                [
+                    [k in r and t in r.damage_type for t in out.damage_type.values]
+                    for r in results
+                ],
+                dims=["spec", "damage_type"],
+                coords={"spec": names, "damage_type": out.damage_type},
+            )
+            out[k] = out[k].where(present | (out.damage != 0), 1.0)
+    return out
+
+
+def _damage_array_spec(
+    check_outcome: Dataset,
+    damage_spec: ExpandedDamage,
+    specs: list[ExpandedDamage],
+    index: DataArray,
+    *,
+    mode: Literal["roll", "exact", "mean"],
+    **kwargs: Any,
+) -> Dataset:
+    """Implement :func:`damage` for array-valued damage specs, given the distinct
+    plain specs and the index returned by :func:`_split_array_spec`.
+
+    With ``mode="roll"``, roll every distinct group of dice once, and add it only
+    to the points whose spec uses it, so that memory usage is proportional to the
+    number of points and not to the number of points times the number of specs.
+    With ``mode="exact"`` and ``mode="mean"``, which don't have a ``roll``
+    dimension, evaluate all specs with :func:`damage_many` and then pick for each
+    point the spec it is made of.
+    """
+    check_outcome, index = xarray.align(check_outcome, index, join="inner")
+    if mode == "roll":
+        if "probability" in check_outcome.data_vars:
+            raise ValueError(
+                "The output of check(..., mode='exact') can only be used with "
+                "damage(..., mode='exact') or damage(..., mode='mean')"
+            )
+        # The dimensions of the spec must be listed in either independent_dims or
+        # dependent_dims, like those of check_outcome.
+        check_outcome = check_outcome.assign(
+            outcome=check_outcome.outcome.broadcast_like(index).transpose("roll", ...)
+        )
+        out = _damage_roll(check_outcome, specs, None, spec_index=index, **kwargs)
+    else:
+        out = damage_many(check_outcome, dict(enumerate(specs)), mode=mode, **kwargs)
+        out = out.isel(spec=index).drop_vars("spec")
     out.attrs["damage_spec"] = damage_spec.to_dict_of_str()
+    return out
+
+
+def _damage_roll(
+    check_outcome: Dataset,
+    damage_specs: list[ExpandedDamage],
+    names: list[Hashable] | None,
+    *,
+    independent_dims: Collection[Hashable],
+    dependent_dims: Collection[Hashable],
+    weaknesses: Mapping[str, int] | DataArray | None,
+    resistances: Mapping[str, int] | DataArray | None,
+    immunities: Mapping[str, bool] | Collection[str] | DataArray | None,
+    persistent_damage_rounds: int,
+    persistent_damage_DC: int | Mapping[str, int] | DataArray,
+    splash_damage_targets: int,
+    spec_index: DataArray | None = None,
+) -> Dataset:
+    """Implement :func:`damage` and :func:`damage_many` with ``mode="roll"``.
+
+    :param names:
+        Labels of the ``spec`` dimension, one for each of `damage_specs`,
+        or None to return the damage of a single spec without it.
+    :param spec_index:
+        Optional index of `damage_specs` for each point of an array-valued spec;
+        see :func:`_roll_damage`. Requires `names` to be None.
+    """
+    out = check_outcome.copy(deep=False)
+    if names is None:
+        out.attrs["damage_spec"] = damage_specs[0].to_dict_of_str()
+    else:
+        out.attrs["damage_spec"] = {
+            name: spec.to_dict_of_str()
+            for name, spec in zip(names, damage_specs, strict=True)
+        }
 
     independent_dims = _parse_independent_dependent_dims(
         "damage", check_outcome, independent_dims, dependent_dims
@@ -314,27 +770,39 @@ def damage(
     del persistent_independent_dims["roll"]
     persistent_independent_dims["persistent_round"] = persistent_damage_rounds
 
-    damages = {
-        name: _roll_damage(check_outcome.outcome, spec, dims)
-        for name, spec, dims in (
-            ("direct_damage", damage_spec.filter("direct"), independent_dims),
-            ("splash_damage", damage_spec.filter("splash"), independent_dims),
-            (
-                "persistent_damage",
-                damage_spec.filter("persistent"),
-                persistent_independent_dims,
-            ),
-        )
-        if spec
-    }
-    damages = dict(
-        zip(
-            damages,
-            xarray.align(*damages.values(), join="outer", copy=False, fill_value=0),
-            strict=False,
-        )
+    weaknesses = _parse_weaknesses(weaknesses)
+    resistances = _parse_weaknesses(resistances)
+    immunities = _parse_weaknesses(immunities)
+    dtype = _int_dtype(
+        0,
+        max(
+            _max_damage(
+                spec,
+                weaknesses,
+                splash_damage_targets=splash_damage_targets,
+                persistent_damage_rounds=persistent_damage_rounds,
+            )
+            for spec in damage_specs
+        ),
     )
-    out.update(damages)
+
+    program, damage_types = _compile_damage(*damage_specs)
+    for component, dims in zip(
+        _COMPONENTS,
+        (independent_dims, independent_dims, persistent_independent_dims),
+        strict=True,
+    ):
+        rows = program[program["component"] == _COMPONENTS.index(component)]
+        if rows.size:
+            out[f"{component}_damage"] = _roll_damage(
+                check_outcome.outcome,
+                rows,
+                damage_types,
+                dims,
+                dtype=dtype,
+                names=names,
+                spec_index=spec_index,
+            )
 
     if "splash_damage" in out:
         # splash damage does not affect secondary targets on a miss.
@@ -343,9 +811,6 @@ def damage(
         assert "direct_damage" in out
         out["direct_damage"] += out["splash_damage"]
 
-    weaknesses = _parse_weaknesses(weaknesses)
-    resistances = _parse_weaknesses(resistances)
-    immunities = _parse_weaknesses(immunities)
     _, weaknesses, resistances, immunities = xarray.align(
         out, weaknesses, resistances, immunities, join="left", copy=False, fill_value=0
     )
@@ -363,7 +828,7 @@ def damage(
             damage = damage.where(~immunities, 0)
             damage = cast(DataArray, np.maximum(0, damage - resistances))
             damage = damage + xarray.where(damage > 0, weaknesses, 0)
-            out[k] = damage
+            out[k] = damage.astype(dtype)
 
     total_damage = []
     if "direct_damage" in out:
@@ -373,15 +838,9 @@ def damage(
         # Splash damage to main target is already included in direct damage
         total_damage.append(out["splash_damage"] * (splash_damage_targets - 1))
     if "persistent_damage" in out:
-        if isinstance(persistent_damage_DC, int):
-            persistent_damage_DC = dict.fromkeys(
-                out.damage_type.values, persistent_damage_DC
-            )
-        persistent_damage_DC = _parse_weaknesses(persistent_damage_DC)
-        _, persistent_damage_DC = xarray.align(
-            out, persistent_damage_DC, join="left", fill_value=15
+        out["persistent_damage_DC"] = persistent_damage_DC = _parse_persistent_DC(
+            out, persistent_damage_DC
         )
-        out["persistent_damage_DC"] = persistent_damage_DC
 
         out["persistent_damage_check"] = check(
             DC=persistent_damage_DC,
@@ -410,62 +869,800 @@ def damage(
         )
 
     if total_damage:
-        out["total_damage"] = sum(total_damage).sum("damage_type")  # type: ignore[union-attr]
+        out["total_damage"] = (
+            sum(total_damage).sum("damage_type").astype(dtype)  # type: ignore[union-attr]
+        )
         out["damage_type"] = out["damage_type"].astype("U")
     else:
-        out["total_damage"] = xarray.zeros_like(out["outcome"])
+        out["total_damage"] = xarray.zeros_like(out["outcome"], dtype=dtype)
+        if names is not None:
+            out["total_damage"] = out["total_damage"].expand_dims(spec=names)
         out["damage_type"] = ("damage_type", np.asarray([], dtype="U"))
 
     return out
 
 
+# Components of the damage, in the order of :func:`_compile_damage`
+_COMPONENTS = ("direct", "splash", "persistent")
+
+# A compiled damage spec is a flat array of rows with these fields.
+# See _compile_damage.
+_PROGRAM_DTYPE = np.dtype(
+    [
+        ("group", np.intp),
+        ("dice", np.intp),
+        ("faces", np.intp),
+        ("bonus", np.intp),
+        ("multiplier", np.float64),
+        ("dos", np.int8),
+        ("damage_type", np.intp),
+        ("component", np.int8),
+        ("spec", np.intp),
+    ]
+)
+
+
+def _compile_damage(*damage_specs: ExpandedDamage) -> tuple[np.ndarray, list[str]]:
+    """Compile one or more damage specs to a flat *dice program*, with one row for
+    every :class:`Damage` of every degree of success of every spec.
+
+    :returns:
+        Tuple of
+
+        - array with dtype :data:`_PROGRAM_DTYPE`, where ``group`` is the index of
+          the distinct roll, shared by all rows that differ only by multiplier,
+          degree of success, and spec; ``damage_type`` is an index of the list
+          below; ``component`` is an index of :data:`_COMPONENTS`; and ``spec`` is
+          an index of `damage_specs`.
+        - sorted list of damage types of all specs
+    """
+    damage_types = sorted(
+        {d.type for spec in damage_specs for specs in spec.values() for d in specs}
+    )
+    groups: dict[Damage, int] = {}
+    rows = []
+    for i, spec in enumerate(damage_specs):
+        for dos, specs in spec.items():
+            for d in specs:
+                # The key includes the damage type, persistent, and splash.
+                # Don't include multiplier in the key, so that along all
+                # dependent dimensions you roll damage only once and then
+                # double/halve it as needed.
+                group = groups.setdefault(d.copy(multiplier=1), len(groups))
+                component = 2 if d.persistent else 1 if d.splash else 0
+                rows.append(
+                    (
+                        group,
+                        d.dice,
+                        d.faces,
+                        d.bonus,
+                        d.multiplier,
+                        dos,
+                        damage_types.index(d.type),
+                        component,
+                        i,
+                    )
+                )
+    return np.array(rows, dtype=_PROGRAM_DTYPE), damage_types
+
+
 def _roll_damage(
     check_outcome: DataArray,
-    spec: ExpandedDamage,
+    program: np.ndarray,
+    damage_types: list[str],
     independent_dims: Mapping[Hashable, int],
+    *,
+    dtype: np.dtype,
+    names: list[Hashable] | None = None,
+    spec_index: DataArray | None = None,
+) -> DataArray:
+    """Run the rows of a dice program compiled by :func:`_compile_damage`.
+
+    Roll each group of dice once, and add it, multiplied as needed, to a buffer
+    of damage by spec, damage type and degree of success. Then pick the damage of
+    the outcome of each point in a single pass. Outcomes that deal no damage point
+    to an extra slot full of zeros.
+
+    :param names:
+        Labels of the ``spec`` dimension, or None if the program was compiled from
+        a single spec, in which case the output lacks the dimension.
+    :param spec_index:
+        For array-valued specs: index of the spec of each point, with the
+        dimensions of the arrays. The buffer has these dimensions instead of
+        ``spec``, and each row is only added to the points whose spec has it.
+        Requires `names` to be None.
+    """
+    dos_slots = list(dict.fromkeys(program["dos"].tolist()))
+    # Negative outcomes are negative indices
+    slot = np.full(len(DoS), len(dos_slots), dtype=np.int8)
+    for i, dos in enumerate(dos_slots):
+        slot[dos] = i
+
+    if spec_index is None:
+        spec_dims: dict[Hashable, int] = {"spec": 1 if names is None else len(names)}
+    else:
+        assert names is None
+        spec_dims = {
+            d: spec_index.sizes[d] for d in spec_index.dims if d not in independent_dims
+        }
+    buffer_dims = ("roll", *independent_dims, *spec_dims)
+
+    buffer = None
+    for group in dict.fromkeys(program["group"].tolist()):
+        rows = program[program["group"] == group]
+        r = roll(
+            int(rows[0]["dice"]),
+            int(rows[0]["faces"]),
+            int(rows[0]["bonus"]),
+            dims=independent_dims,
+        )
+        # Upcast before multiplying and summing
+        r = r.astype(np.promote_types(r.dtype, dtype))
+        if buffer is None:
+            shape = (
+                *r.shape,
+                *spec_dims.values(),
+                len(damage_types),
+                len(dos_slots) + 1,
+            )
+            if isinstance(r.data, np.ndarray):
+                buffer = np.zeros(shape, dtype=r.dtype)
+            else:  # dask
+                import dask.array as da  # noqa: PLC0415
+
+                buffer = da.zeros(
+                    shape,
+                    dtype=r.dtype,
+                    chunks=(*r.data.chunks, *((n,) for n in shape[r.ndim :])),
+                )
+        if spec_index is None:
+            for row in rows:
+                buffer[..., row["spec"], row["damage_type"], slot[row["dos"]]] += (
+                    _apply_multiplier(r.data, row["multiplier"])
+                )
+            continue
+
+        # Rows which differ only by spec are added at once, masked by spec_index.
+        # A spec may have the same row more than once.
+        by_spec: dict[tuple[float, int, int], list[int]] = {}
+        for row in rows:
+            key = (float(row["multiplier"]), int(row["damage_type"]), int(row["dos"]))
+            by_spec.setdefault(key, []).append(int(row["spec"]))
+        for (multiplier, damage_type, dos), specs in by_spec.items():
+            counts = np.bincount(specs, minlength=int(spec_index.max()) + 1)
+            weight = spec_index.copy(data=counts.astype(r.dtype)[spec_index.values])
+            contrib = (_apply_multiplier(r, multiplier) * weight).transpose(
+                *buffer_dims
+            )
+            buffer[..., damage_type, slot[dos]] += contrib.data
+
+    table = DataArray(
+        buffer,
+        dims=(*buffer_dims, "damage_type", "__dos"),
+        coords={"damage_type": damage_types},
+    )
+    if spec_index is None:
+        table = table.assign_coords(spec=names or [None])
+        if names is None:
+            table = table.isel(spec=0, drop=True)
+    return xarray.apply_ufunc(
+        _take_by_outcome,
+        check_outcome,
+        table,
+        kwargs={"slot": slot},
+        input_core_dims=[[], ["__dos"]],
+        dask="parallelized",
+        output_dtypes=[table.dtype],
+        dask_gufunc_kwargs={"allow_rechunk": True},
+    ).transpose(
+        *check_outcome.dims,
+        *(d for d in ("spec", "damage_type") if d in table.dims),
+        ...,
+    )
+
+
+def _take_by_outcome(
+    outcome: np.ndarray, table: np.ndarray, *, slot: np.ndarray
+) -> np.ndarray:
+    """For each point, pick ``table[..., slot[outcome]]``, broadcasting
+    `outcome` against ``table[..., 0]``.
+    """
+    idx = slot[outcome][..., np.newaxis]
+    # apply_ufunc omits leading dimensions of size 1
+    ndim = max(table.ndim, idx.ndim)
+    table = table.reshape((1,) * (ndim - table.ndim) + table.shape)
+    idx = idx.reshape((1,) * (ndim - idx.ndim) + idx.shape)
+    return np.take_along_axis(table, idx, axis=-1)[..., 0]
+
+
+def _max_damage(
+    damage_spec: ExpandedDamage,
+    weaknesses: DataArray,
+    *,
+    splash_damage_targets: int,
+    persistent_damage_rounds: int,
+) -> int:
+    """Conservative upper bound of the total damage that :func:`damage` can deal,
+    used to pick a compact dtype that can't overflow.
+    """
+    max_by_outcome = [
+        sum(max(1, int(d.dice * d.faces + d.bonus)) * 2 for d in specs)
+        for specs in damage_spec.values()
+    ]
+    max_weakness = max(0, int(weaknesses.max())) if weaknesses.size else 0
+    n_specs = sum(len(specs) for specs in damage_spec.values())
+    return (max([0, *max_by_outcome]) + max_weakness * n_specs) * (
+        max(1, splash_damage_targets) + persistent_damage_rounds
+    )
+
+
+_T = TypeVar("_T", DataArray, np.ndarray)
+
+
+def _apply_multiplier(r: _T, multiplier: float) -> _T:
+    """Double or halve rolled damage"""
+    assert multiplier in (0.5, 1, 2)
+    if multiplier == 2:
+        r = r * 2  # Don't use *= to avoid modifying the cache
+    elif multiplier == 0.5:
+        r = r // 2
+
+    # Halved damage is rounded down, but can't be reduced below 1.
+    # If the combined penalties on an attack would reduce the damage to 0 or
+    # below, you still deal 1 damage.
+    return cast(_T, np.maximum(1, r))
+
+
+def damage_pmf(damage_spec: DamageLike) -> DataArray:
+    """Calculate the exact probability mass function of a damage profile, for each
+    degree of success and damage type.
+
+    This follows the same rules as :func:`damage`; however, it does not distinguish
+    between direct, splash, and persistent damage. You may want to call
+    :meth:`ExpandedDamage.filter` first.
+
+    :param damage_spec:
+        The damage specification; see :func:`damage`.
+    :returns:
+        A :class:`~xarray.DataArray` with dimensions ``(outcome, damage_type,
+        damage)``, where ``outcome`` has the same coordinate as
+        ``check(..., mode="exact")`` and ``damage`` is the amount of damage dealt,
+        with the probability of dealing exactly that amount of damage.
+        The probabilities add up to 1 for each outcome and damage type.
+
+    **Example:**
+
+    >>> damage_pmf(Damage("fire", 1, 4, basic_save=True)).sel(damage_type="fire")
+    <xarray.DataArray (outcome: 4, damage: 9)> Size: 288B
+    array([[1.  , 0.  , 0.  , 0.  , 0.  , 0.  , 0.  , 0.  , 0.  ],
+           [0.  , 0.75, 0.25, 0.  , 0.  , 0.  , 0.  , 0.  , 0.  ],
+           [0.  , 0.25, 0.25, 0.25, 0.25, 0.  , 0.  , 0.  , 0.  ],
+           [0.  , 0.  , 0.25, 0.  , 0.25, 0.  , 0.25, 0.  , 0.25]])
+    Coordinates:
+      * outcome      (outcome) <U16 256B 'Critical success' ... 'Critical failure'
+      * damage       (damage) int64 72B 0 1 2 3 4 5 6 7 8
+        damage_type  <U4 16B 'fire'
+    """
+    damage_spec = ExpandedDamage(damage_spec)
+    if _split_array_spec(damage_spec) is not None:
+        raise TypeError("damage_pmf() does not support array-valued damage specs")
+    pmfs = [_spec_pmf(damage_spec.get(dos, [])) for dos in _EXACT_OUTCOMES]
+    types = sorted({t for pmf in pmfs for t in pmf})
+    size = max((p.size for pmf in pmfs for p in pmf.values()), default=1)
+
+    out = np.zeros((len(pmfs), len(types), size))
+    for i, pmf in enumerate(pmfs):
+        for j, t in enumerate(types):
+            if t in pmf:
+                out[i, j, : pmf[t].size] = pmf[t]
+            else:
+                out[i, j, 0] = 1  # No damage of this type for this outcome
+
+    return DataArray(
+        out,
+        dims=["outcome", "damage_type", "damage"],
+        coords={
+            "outcome": [str(dos) for dos in _EXACT_OUTCOMES],
+            "damage_type": np.asarray(types, dtype="U"),
+            "damage": np.arange(size),
+        },
+    )
+
+
+def _spec_pmf(specs: list[Damage]) -> dict[str, np.ndarray]:
+    """Exact counterpart of :func:`_roll_damage`, for a single degree of success.
+
+    :returns:
+        ``{damage type: probability mass function}``
+    """
+    # Damage that differs only by multiplier is rolled once; see _roll_damage
+    multipliers: dict[Damage, list[float]] = {}
+    for d in specs:
+        multipliers.setdefault(d.copy(multiplier=1), []).append(d.multiplier)
+
+    out: dict[str, np.ndarray] = {}
+    for d, mults in multipliers.items():
+        pmf = _dice_pmf(int(d.dice), int(d.faces), int(d.bonus))
+        rolled = np.arange(pmf.size)
+        dealt = sum(_apply_multiplier(rolled, m) for m in mults)
+        pmf = np.bincount(dealt, weights=pmf)
+        out[d.type] = np.convolve(out[d.type], pmf) if d.type in out else pmf
+    return out
+
+
+def _setup_no_roll(
+    check_outcome: Dataset,
+    damage_spec: ExpandedDamage,
+    *,
+    weaknesses: DataArray,
+    resistances: DataArray,
+    immunities: DataArray,
+) -> tuple[Dataset, dict[str, DataArray], DataArray, DataArray, DataArray]:
+    """Common setup of :func:`damage` for ``mode="exact"`` and ``mode="mean"``.
+
+    :returns:
+        Tuple of
+
+        - shallow copy of `check_outcome`, with the ``probability`` variable and
+          the weaknesses, resistances, and immunities
+        - ``{"direct" | "splash" | "persistent": damage_pmf(...)}``, aligned on
+          the same damage types
+        - weaknesses, resistances, and immunities, aligned to the damage types
+    """
+    if "probability" in check_outcome.data_vars:
+        out = check_outcome.copy(deep=False)
+    else:
+        out = check_outcome.drop_vars(
+            [k for k, v in check_outcome.variables.items() if "roll" in v.dims]
+        )
+        out["probability"] = _outcome_probability(check_outcome)
+    out.attrs["damage_spec"] = damage_spec.to_dict_of_str()
+
+    names: tuple[Literal["direct", "splash", "persistent"], ...] = (
+        "direct",
+        "splash",
+        "persistent",
+    )
+    pmfs = xarray.align(
+        *[damage_pmf(damage_spec.filter(name)) for name in names],
+        join="outer",
+        fill_value=0,
+    )
+    # Damage types that are missing from some of the pmfs
+    pmfs = tuple(pmf + ((pmf.sum("damage") == 0) & (pmf.damage == 0)) for pmf in pmfs)
+    out.coords["damage_type"] = pmfs[0].coords["damage_type"]
+
+    _, weaknesses, resistances, immunities = xarray.align(
+        out, weaknesses, resistances, immunities, join="left", copy=False, fill_value=0
+    )
+    immunities = immunities.astype(bool)
+    if weaknesses.any():
+        out["weaknesses"] = weaknesses
+    if resistances.any():
+        out["resistances"] = resistances
+    if immunities.any():
+        out["immunities"] = immunities
+
+    return out, dict(zip(names, pmfs, strict=True)), weaknesses, resistances, immunities
+
+
+def _damage_mean(
+    check_outcome: Dataset,
+    damage_spec: ExpandedDamage,
+    *,
+    weaknesses: DataArray,
+    resistances: DataArray,
+    immunities: DataArray,
+    persistent_damage_rounds: int,
+    persistent_damage_DC: int | Mapping[str, int] | DataArray,
+    splash_damage_targets: int,
+) -> Dataset:
+    """Implement :func:`damage` with ``mode="mean"``"""
+    out, pmfs, weaknesses, resistances, immunities = _setup_no_roll(
+        check_outcome,
+        damage_spec,
+        weaknesses=weaknesses,
+        resistances=resistances,
+        immunities=immunities,
+    )
+    p = out["probability"]
+
+    def expected(pmf: DataArray) -> DataArray:
+        """Expected damage after weaknesses, resistances, and immunities,
+        weighted by the probability of each outcome
+        """
+        dealt = np.maximum(0, pmf.damage - resistances)
+        dealt = dealt + xarray.where(dealt > 0, weaknesses, 0)
+        dealt = dealt.where(~immunities, 0)
+        mean = (pmf * dealt).sum("damage")
+        return (mean * p).sum("outcome").transpose(..., "damage_type")
+
+    total_damage = []
+    if damage_spec.filter("direct", "splash"):
+        # Splash damage to the main target is added to direct damage before
+        # applying weaknesses and resistances
+        out["direct_damage"] = expected(_convolve(pmfs["direct"], pmfs["splash"]))
+        total_damage.append(out["direct_damage"])
+    if damage_spec.filter("splash"):
+        out.attrs["splash_damage_targets"] = splash_damage_targets
+        out["splash_damage"] = expected(pmfs["splash"])
+        total_damage.append(out["splash_damage"] * (splash_damage_targets - 1))
+    if damage_spec.filter("persistent"):
+        out["persistent_damage"] = expected(pmfs["persistent"])
+        out["persistent_damage_DC"] = _parse_persistent_DC(out, persistent_damage_DC)
+        out["apply_persistent_damage"] = _apply_persistent_damage(
+            _persistent_continue(out["persistent_damage_DC"]),
+            persistent_damage_rounds,
+        )
+        total_damage.append(
+            out["persistent_damage"]
+            * out["apply_persistent_damage"].sum("persistent_round")
+        )
+
+    if total_damage:
+        out["total_damage"] = sum(total_damage).sum("damage_type")  # type: ignore[union-attr]
+    else:
+        out["total_damage"] = xarray.zeros_like(p.sum("outcome"))
+    return out
+
+
+def _persistent_continue(DC: DataArray) -> DataArray:
+    """Probability of failing the flat check to end persistent damage"""
+    flat_check = check(
+        DC=DC,
+        mode="exact",
+        allow_critical_failure=False,
+        allow_critical_success=False,
+    )
+    return 1 - flat_check.probability.sel(outcome=str(DoS.success), drop=True)
+
+
+def _apply_persistent_damage(p_continue: DataArray, rounds: int) -> DataArray:
+    """Probability that persistent damage is still active on each round.
+
+    The flat check to end persistent damage is rolled after taking damage,
+    so the probability of taking damage on round k is p_continue ** k.
+    """
+    return p_continue ** DataArray(np.arange(rounds), dims=["persistent_round"])
+
+
+def _convolve(a: DataArray, b: DataArray) -> DataArray:
+    """Probability mass function of the sum of two independent variables,
+    along the ``damage`` dimension.
+    """
+    a, b = xarray.broadcast(a, b, exclude=["damage"])
+    a = a.transpose(..., "damage")
+    b = b.transpose(..., *a.dims)
+    out = np.zeros((*a.shape[:-1], a.sizes["damage"] + b.sizes["damage"] - 1))
+    for idx in np.ndindex(a.shape[:-1]):
+        out[idx] = np.convolve(a.values[idx], b.values[idx])
+    return DataArray(
+        out,
+        dims=a.dims,
+        coords={k: v for k, v in a.coords.items() if "damage" not in v.dims},
+    ).assign_coords(damage=np.arange(out.shape[-1]))
+
+
+def _damage_exact(
+    check_outcome: Dataset,
+    damage_spec: ExpandedDamage,
+    *,
+    weaknesses: DataArray,
+    resistances: DataArray,
+    immunities: DataArray,
+    persistent_damage_rounds: int,
+    persistent_damage_DC: int | Mapping[str, int] | DataArray,
+    splash_damage_targets: int,
+) -> Dataset:
+    """Implement :func:`damage` with ``mode="exact"``"""
+    out, pmfs, weaknesses, resistances, immunities = _setup_no_roll(
+        check_outcome,
+        damage_spec,
+        weaknesses=weaknesses,
+        resistances=resistances,
+        immunities=immunities,
+    )
+    if damage_spec.filter("persistent"):
+        out["persistent_damage_DC"] = _parse_persistent_DC(out, persistent_damage_DC)
+        p_continue = _persistent_continue(out["persistent_damage_DC"])
+        out["apply_persistent_damage"] = _apply_persistent_damage(
+            p_continue, persistent_damage_rounds
+        )
+    else:
+        p_continue = xarray.zeros_like(weaknesses, dtype=float)
+
+    # Calculate the probability mass functions separately for every combination of
+    # weaknesses, resistances, immunities, and persistent damage DC.
+    # Then, weight them by the probability of each outcome.
+    cells = [
+        a.transpose(..., "damage_type")
+        for a in xarray.broadcast(weaknesses, resistances, immunities, p_continue)
+    ]
+    cell_dims = cells[0].dims[:-1]
+    cell_shape = cells[0].shape[:-1]
+    results: tuple[list[np.ndarray], ...] = ([], [], [], [])
+    for idx in np.ndindex(cell_shape):
+        w, r, i, q = (a.values[idx] for a in cells)
+        for o in range(len(_EXACT_OUTCOMES)):
+            cell_pmfs = _outcome_damage_pmf(
+                pmfs["direct"].values[o],
+                pmfs["splash"].values[o],
+                pmfs["persistent"].values[o],
+                weaknesses=w,
+                resistances=r,
+                immunities=i,
+                p_continue=q,
+                persistent_damage_rounds=persistent_damage_rounds,
+                splash_damage_targets=splash_damage_targets,
+            )
+            for result, pmf in zip(results, cell_pmfs, strict=True):
+                result.append(pmf)
+    direct_pmfs, splash_pmfs, persistent_pmfs, total_pmfs = results
+
+    size = max(p.shape[-1] for result in results for p in result)
+    shape = (*cell_shape, len(_EXACT_OUTCOMES))
+    dims = (*cell_dims, "outcome", "damage_type", "damage")
+
+    def weighted_sum(pmfs: list[np.ndarray], dims: tuple[Hashable, ...]) -> DataArray:
+        stacked = _pad_stack(pmfs, size)
+        pmf = DataArray(stacked.reshape(*shape, *stacked.shape[1:]), dims=dims)
+        weighted = (pmf * out["probability"]).sum("outcome")
+        return weighted.transpose(..., *(d for d in dims if d != "outcome"))
+
+    if damage_spec.filter("direct", "splash"):
+        out["direct_damage"] = weighted_sum(direct_pmfs, dims)
+    if damage_spec.filter("splash"):
+        out.attrs["splash_damage_targets"] = splash_damage_targets
+        out["splash_damage"] = weighted_sum(splash_pmfs, dims)
+    if damage_spec.filter("persistent"):
+        out["persistent_damage"] = weighted_sum(persistent_pmfs, dims)
+    out["total_damage"] = weighted_sum(
+        total_pmfs, tuple(dim for dim in dims if dim != "damage_type")
+    )
+    out.coords["damage"] = np.arange(size)
+    # Trim trailing zeros
+    nonzero = [
+        (v != 0).any([d for d in v.dims if d != "damage"]).values
+        for v in out.data_vars.values()
+        if "damage" in v.dims
+    ]
+    size = int(np.flatnonzero(np.any(nonzero, axis=0))[-1]) + 1
+    return out.isel(damage=slice(0, size))
+
+
+def _damage_counts(
+    func: Callable[..., Dataset],
+    check_outcome: Dataset,
+    damage_spec: DamageLike | Mapping[Hashable, DamageLike],
+    **kwargs: Any,
+) -> Dataset:
+    """Implement :func:`damage` and :func:`damage_many` with ``mode="counts"``.
+
+    Call ``func(check_outcome, damage_spec, **kwargs)`` on chunks of the ``roll``
+    dimension and accumulate the histograms of damage and the outcome counts.
+    """
+    roll_size = check_outcome.sizes["roll"]
+    first, totals = _reduce_chunks(
+        func,
+        (check_outcome, damage_spec),
+        kwargs,
+        accumulate=_accumulate_damage_counts,
+        chunk_elements=_COUNTS_CHUNK_ELEMENTS,
+        roll_size=roll_size,
+    )
+    ds = first.drop_vars(
+        [name for name, v in first.variables.items() if "roll" in v.dims]
+        + [name for name in ("hp_reroll",) if name in first.coords]
+    )
+
+    hists = {k: v for k, v in totals.items() if "damage" in v.dims}
+    size = max(int(v["damage"].max()) for v in hists.values()) + 1
+    for name, hist in hists.items():
+        totals[name] = hist.reindex(damage=np.arange(size), fill_value=0).transpose(
+            ..., "damage"
+        )
+    for name, total in totals.items():
+        ds[name] = total / roll_size
+    return ds
+
+
+def _accumulate_damage_counts(
+    totals: dict[Hashable, DataArray], chunk: Dataset
+) -> dict[Hashable, DataArray]:
+    """Add the histograms of damage and the outcome counts of a chunk of
+    :func:`damage` with ``mode="roll"`` to the running totals of
+    :func:`_damage_counts`.
+    """
+    totals = {**totals, **_accumulate_counts(totals, chunk)}
+    new = {}
+    for name in ("direct_damage", "splash_damage", "total_damage"):
+        if name in chunk:
+            new[name] = _bincount(chunk[name], "roll", "damage")
+    if "persistent_damage" in chunk:
+        new["persistent_damage"] = _bincount(
+            chunk["persistent_damage"]
+            .where(chunk["apply_persistent_damage"], 0)
+            .sum("persistent_round"),
+            "roll",
+            "damage",
+        )
+        new["apply_persistent_damage"] = chunk["apply_persistent_damage"].sum("roll")
+
+    for name, v in new.items():
+        if name in totals and "damage" in v.dims:
+            # The range of damage may differ between chunks
+            a, b = xarray.align(totals[name], v, join="outer", fill_value=0)
+            totals[name] = a + b
+        elif name in totals:
+            totals[name] = totals[name] + v
+        else:
+            totals[name] = v
+    return totals
+
+
+def _outcome_damage_pmf(
+    direct: np.ndarray,
+    splash: np.ndarray,
+    persistent: np.ndarray,
+    *,
+    weaknesses: np.ndarray,
+    resistances: np.ndarray,
+    immunities: np.ndarray,
+    p_continue: np.ndarray,
+    persistent_damage_rounds: int,
+    splash_damage_targets: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Exact counterpart of :func:`damage` for a single degree of success and
+    a single combination of weaknesses, resistances, immunities, and persistent
+    damage DC.
+
+    :param direct:
+        Probability mass function of direct damage, with shape (damage type, damage)
+    :param splash:
+        Probability mass function of splash damage, with shape (damage type, damage)
+    :param persistent:
+        Probability mass function of persistent damage for a single round,
+        with shape (damage type, damage)
+    :param weaknesses:
+        1D array with one element per damage type
+    :param resistances:
+        1D array with one element per damage type
+    :param immunities:
+        1D array with one element per damage type
+    :param p_continue:
+        Probability of failing the flat check to end persistent damage;
+        1D array with one element per damage type
+    :returns:
+        Tuple of probability mass functions of direct damage (including splash
+        damage to the main target), splash damage, and persistent damage over all
+        rounds, all with shape (damage type, damage), and of total damage (1D).
+    """
+    direct_out = []
+    splash_out = []
+    persistent_out = []
+    total = np.ones(1)
+    for d, s, p, w, r, i, q in zip(
+        direct,
+        splash,
+        persistent,
+        weaknesses,
+        resistances,
+        immunities,
+        p_continue,
+        strict=True,
+    ):
+        direct_out.append(_weaknesses_pmf(np.convolve(d, s), w, r, i))
+        splash_out.append(_weaknesses_pmf(s, w, r, i))
+        persistent_out.append(
+            _persistent_pmf(_weaknesses_pmf(p, w, r, i), q, persistent_damage_rounds)
+        )
+
+        # total = W(direct + splash) + W(splash) * (splash_damage_targets - 1),
+        # where both instances of splash are the same roll.
+        # Splash damage is typically a small number, so iterate on its values.
+        secondary = np.arange(s.size)
+        if not i:
+            secondary = np.maximum(0, secondary - r)
+            secondary += np.where(secondary > 0, w, 0)
+        secondary *= splash_damage_targets - 1
+        total_t = np.zeros(direct_out[-1].size + secondary.max())
+        for splash_value in np.flatnonzero(s):
+            main = _weaknesses_pmf(np.pad(d, (int(splash_value), 0)), w, r, i)
+            start = secondary[splash_value]
+            total_t[start : start + main.size] += s[splash_value] * main
+        total = np.convolve(total, np.convolve(total_t, persistent_out[-1]))
+
+    return (
+        _pad_stack(direct_out),
+        _pad_stack(splash_out),
+        _pad_stack(persistent_out),
+        total,
+    )
+
+
+def _persistent_pmf(pmf: np.ndarray, p_continue: float, rounds: int) -> np.ndarray:
+    """Probability mass function of the persistent damage accumulated over
+    multiple rounds.
+
+    This is a Markov chain where, on each round, the target takes damage and then
+    either ends the persistent damage or carries on to the next round.
+    The damage accumulated from round k onwards is::
+
+        T[k] = pmf + (T[k + 1] with probability p_continue, else 0)
+
+    :param pmf:
+        Probability mass function of the persistent damage for a single round,
+        after weaknesses and resistances
+    :param p_continue:
+        Probability of failing the flat check to end persistent damage
+    :param rounds:
+        Maximum number of rounds
+
+    In the frequency domain, each round is the same affine map
+    ``T -> pmf * (p_continue * T + 1 - p_continue)``, which is composed `rounds`
+    times by repeated squaring over the fixed support of the final result, for a
+    cost of O(n log n) for a support of size n.
+    """
+    if rounds == 0:
+        return np.ones(1)
+    n = rounds * (pmf.size - 1) + 1
+    spectrum = np.fft.rfft(pmf, n)
+    a = p_continue * spectrum
+    b = (1 - p_continue) * spectrum
+    acc_a = np.ones_like(spectrum)
+    acc_b = np.zeros_like(spectrum)
+    while rounds:
+        if rounds & 1:
+            acc_a, acc_b = a * acc_a, a * acc_b + b
+        a, b = a * a, a * b + b
+        rounds >>= 1
+    # T[rounds] is 0 damage, i.e. 1 in the frequency domain
+    acc = np.fft.irfft(acc_a + acc_b, n)
+    # Discard floating point noise around zero
+    return np.where(acc < 1e-15, 0.0, acc)
+
+
+def _weaknesses_pmf(
+    pmf: np.ndarray, weakness: int, resistance: int, immunity: bool
+) -> np.ndarray:
+    """Apply weaknesses, resistances, and immunities to the probability mass function
+    of a single damage type.
+    """
+    if immunity:
+        return np.ones(1)
+    dealt = np.maximum(0, np.arange(pmf.size) - resistance)
+    dealt += np.where(dealt > 0, weakness, 0)
+    return np.bincount(dealt, weights=pmf)
+
+
+def _pad_stack(pmfs: list[np.ndarray], size: int | None = None) -> np.ndarray:
+    """Stack probability mass functions of different lengths together,
+    padding them with zeros along the last axis.
+    """
+    if size is None:
+        size = max((p.shape[-1] for p in pmfs), default=1)
+    if not pmfs:
+        return np.zeros((0, size))
+    return np.stack(
+        [np.pad(p, [(0, 0)] * (p.ndim - 1) + [(0, size - p.shape[-1])]) for p in pmfs]
+    )
+
+
+def _parse_persistent_DC(
+    out: Dataset, persistent_damage_DC: int | Mapping[str, int] | DataArray
 ) -> DataArray:
-    # Only roll once and then double/halve instead of rolling separately for each
-    # outcome. This matters in case of multiple targets receiving the same damage.
-    cache: dict[Damage, xarray.DataArray] = {}
-
-    dmg_by_dos = []  # dims=(roll, damage_type)
-    for specs in spec.values():
-        dmg_by_type = []  # dims=(roll,); specific for the current DoS
-        for d in specs:
-            # Cache key includes in the damage type, persistent, and splash
-            # Don't include multiplier in the cache key, so that along all
-            # dependent dimensions you roll damage only once and then
-            # double/halve it as needed.
-            key = d.copy(multiplier=1)
-            try:
-                r = cache[key]
-            except KeyError:
-                r = roll(d.dice, d.faces, d.bonus, dims=independent_dims)
-                cache[key] = r
-
-            assert d.multiplier in (0.5, 1, 2)
-            if d.multiplier == 2:
-                r = r * 2  # Don't use *= to avoid modifying the cache
-            elif d.multiplier == 0.5:
-                r = r // 2
-
-            # Halved damage is rounded down, but can't be reduced below 1.
-            # If the combined penalties on an attack would reduce the damage to 0 or
-            # below, you still deal 1 damage.
-            r = cast(DataArray, np.maximum(1, r))
-
-            dmg_by_type.append(r)
-
-        r = xarray.concat(dmg_by_type, dim="damage_type", join="outer", fill_value=0)
-        r.coords["damage_type"] = [d.type for d in specs]
-        r = r.groupby("damage_type", squeeze=False).sum()
-        dmg_by_dos.append(r)
-
-    dmg_by_dos = list(xarray.align(*dmg_by_dos, copy=False, join="outer", fill_value=0))
-    return sum(
-        xarray.where(check_outcome == dos, dmg, 0)
-        for dos, dmg in zip(spec, dmg_by_dos, strict=False)
+    """Parse the persistent_damage_DC parameter of :func:`damage`
+    and align it to the damage types of `out`.
+    """
+    if isinstance(persistent_damage_DC, int):
+        persistent_damage_DC = dict.fromkeys(
+            out.damage_type.values, persistent_damage_DC
+        )
+    persistent_damage_DC = _parse_weaknesses(persistent_damage_DC)
+    _, persistent_damage_DC = xarray.align(
+        out, persistent_damage_DC, join="left", fill_value=15
     )
+    return persistent_damage_DC
 
 
 def _parse_weaknesses(a: Collection[str] | DataArray | None) -> DataArray:
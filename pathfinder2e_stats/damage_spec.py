@@ -7,8 +7,15 @@ from dataclasses import dataclass
 from itertools import groupby
 from typing import Any, Literal, TypeAlias, overload
 
+import numpy as np
+import xarray
+from xarray import DataArray
+
 from pathfinder2e_stats.check import DoS
 
+# Fields of Damage that can be DataArrays
+_ARRAY_FIELDS = ("dice", "faces", "bonus")
+
 
 @dataclass(frozen=True, slots=True)
 class Damage:
@@ -16,12 +23,16 @@ class Damage:
 
     :param str type:
         Damage type, e.g. "fire".
-    :param int dice:
+    :param dice:
         Number of dice to roll.
-    :param int faces:
+    :param faces:
         Number of faces on each die.
-    :param int bonus:
+    :param bonus:
         Flat bonus to add to the roll.
+
+    `dice`, `faces`, and `bonus` can be either int or :class:`~xarray.DataArray` of
+    int, e.g. to vary with the level of a character; see *Array-valued damage*
+    below.
     :param bool persistent:
         Whether the damage is persistent.
         It is tracked separately by :func:`damage`. Default: False.
@@ -115,6 +126,33 @@ class Damage:
     ... + Damage("fire", 0, 0, 1, splash=True))
     **Damage** 1d8 fire plus 1 persistent fire plus 1 fire splash
 
+    **Array-valued damage**
+
+    A longsword with the striking runes and weapon specialization of a champion
+    with +4 STR modifier, at every level from 1 to 20:
+
+    >>> from pathfinder2e_stats import tables
+    >>> PC = tables.PC
+    >>> Damage(
+    ...     "slashing",
+    ...     PC.weapon_dice.striking_rune,
+    ...     8,
+    ...     4 + PC.weapon_specialization.champion,
+    ... )
+    **Damage** [1..4]d8+[4..10] slashing
+
+    :func:`~pathfinder2e_stats.damage` rolls array-valued damage in a single pass,
+    adding the dimensions of the arrays (``level`` in the example above) to its
+    output. Identical damage at different points of the arrays, e.g. the 1d8+4 at
+    levels 1 to 3, is rolled only once. Two array-valued :class:`Damage` are equal
+    if their arrays are :meth:`~xarray.DataArray.identical`.
+
+    Like for plain damage, `dice` and `faces` must be zero at the same points.
+    At the points where its dice, faces, and bonus are all zero, array-valued
+    damage deals no damage at all, e.g. for a property rune which is only
+    available from a certain level onwards; traits such as deadly don't add extra
+    dice there either.
+
     **Complex cases**
 
     Some damage profiles follow neither the general rule for weapons and attack spells
@@ -123,9 +161,9 @@ class Damage:
     """
 
     type: str
-    dice: int
-    faces: int
-    bonus: int = 0
+    dice: int | DataArray
+    faces: int | DataArray
+    bonus: int | DataArray = 0
     multiplier: float = 1
     persistent: bool = False
     splash: bool = False
@@ -140,16 +178,22 @@ class Damage:
     def __post_init__(self) -> None:
         """Data validation"""
         for k, t in self.__annotations__.items():
-            cls = eval(t)
             v = getattr(self, k)
+            if k in _ARRAY_FIELDS and isinstance(v, DataArray):
+                if v.dtype.kind not in "iu":
+                    raise TypeError(f"{k} must have int dtype; got {v.dtype}")
+                continue
+            cls = eval(t.removesuffix(" | DataArray"))
             if cls is float:
                 if type(v) not in (int, float):
                     raise TypeError(f"{k} must be of type int or float; got {type(v)}")
             elif type(v) is not cls:
                 raise TypeError(f"{k} must be of type {t}; got {type(v)}")
-        if self.dice < 0:
+        dice = np.asarray(self.dice)
+        faces = np.asarray(self.faces)
+        if (dice < 0).any():
             raise ValueError(f"dice must be non-negative; got {self.dice}")
-        for faces in (
+        for f in (
             self.faces,
             self.two_hands,
             self.deadly,
@@ -157,9 +201,9 @@ class Damage:
             self.fatal_aim,
             self.boost,
         ):
-            if faces not in {0, 2, 4, 6, 8, 10, 12}:
-                raise ValueError(f"Invalid dice faces: {faces}")
-        if (self.dice == 0) != (self.faces == 0):
+            if not np.isin(f, [0, 2, 4, 6, 8, 10, 12]).all():
+                raise ValueError(f"Invalid dice faces: {f}")
+        if ((dice == 0) != (faces == 0)).any():
             raise ValueError(
                 f"dice and faces must be both zero or both non-zero; got {self}"
             )
@@ -172,15 +216,57 @@ class Damage:
         if self.fatal and self.fatal_aim:
             raise ValueError("Can't have both fatal and fatal aim traits")
 
+    def __eq__(self, other: object) -> bool:
+        """Compare array-valued fields with :meth:`xarray.DataArray.identical`"""
+        if type(other) is not type(self):
+            return NotImplemented
+        for k in self.__annotations__:
+            v, w = getattr(self, k), getattr(other, k)
+            if isinstance(v, DataArray) or isinstance(w, DataArray):
+                if not (
+                    isinstance(v, DataArray)
+                    and isinstance(w, DataArray)
+                    and v.identical(w)
+                ):
+                    return False
+            elif v != w:
+                return False
+        return True
+
+    def __hash__(self) -> int:
+        """Hash array-valued fields by their dimensions and shape, so that
+        identical arrays hash the same.
+        """
+        return hash(
+            tuple(
+                (v.dims, v.shape) if isinstance(v, DataArray) else v
+                for v in (getattr(self, k) for k in self.__annotations__)
+            )
+        )
+
+    def _is_array(self, *fields: str) -> bool:
+        """Return True if any of the given fields is a DataArray"""
+        return any(isinstance(getattr(self, k), DataArray) for k in fields)
+
+    def _if_dice(self, v: int | DataArray) -> int | DataArray:
+        """Return `v`, or 0 where array-valued dice are 0, so that extra dice
+        aren't added to the points that deal no damage.
+        """
+        if isinstance(self.dice, DataArray):
+            return xarray.where(self.dice > 0, v, 0)
+        return v
+
     def _base_repr(self) -> str:
-        if self.dice and self.faces:
-            s = f"{self.dice}d{self.faces}"
-            if self.bonus > 0:
+        if self._is_array("dice") or self.dice:
+            s = f"{_int_repr(self.dice)}d{_int_repr(self.faces)}"
+            if isinstance(self.bonus, DataArray):
+                s += f"+{_int_repr(self.bonus)}"
+            elif self.bonus > 0:
                 s += f"+{self.bonus}"
             elif self.bonus < 0:
                 s += f"-{-self.bonus}"
         else:
-            s = str(self.bonus)
+            s = _int_repr(self.bonus)
 
         if self.multiplier == 0.5:
             s = f"({s})/2"
@@ -235,6 +321,16 @@ class Damage:
         """
         # Don't sort e.g. slashing + fire alphabetically
         types_by_appearance: dict[str, int] = {}
+        # Array-valued faces can't be sorted; keep them after the plain ones,
+        # in order of appearance, and only combine them with the same array.
+        arrays_by_appearance: dict[int, int] = {}
+
+        def faces_key(d: Damage) -> tuple[int, int]:
+            if isinstance(d.faces, DataArray):
+                return 1, arrays_by_appearance.setdefault(
+                    id(d.faces), len(arrays_by_appearance)
+                )
+            return 0, -d.faces  # Largest die size first
 
         def key(d: Damage) -> tuple:
             return (
@@ -242,7 +338,7 @@ class Damage:
                 d.persistent,  # persistent damage next-to-last
                 types_by_appearance.setdefault(d.type, len(types_by_appearance)),
                 -d.multiplier,  # Doubled damage first
-                -d.faces,  # Largest die size first
+                faces_key(d),
                 d.scatter,
                 d.two_hands,
                 d.deadly,
@@ -264,6 +360,7 @@ class Damage:
                 )
             if (
                 len(out) > 1
+                and not out[-1]._is_array("faces")
                 and out[-1].faces == 0
                 and all(
                     getattr(out[-1], k) == getattr(out[-2], k)
@@ -301,7 +398,8 @@ class Damage:
             raise ValueError("Must use 1 or 2 hands to wield")
         if self.two_hands:
             return self.copy(
-                faces=self.two_hands if hands == 2 else self.faces, two_hands=0
+                faces=self._if_dice(self.two_hands) if hands == 2 else self.faces,
+                two_hands=0,
             )
         if self.fatal_aim:
             return self.copy(fatal=self.fatal_aim if hands == 2 else 0, fatal_aim=0)
@@ -326,7 +424,7 @@ class Damage:
         base = self.copy(boost=0)
         if not do_boost:
             return base
-        boost = Damage(self.type, self.dice, self.boost)
+        boost = Damage(self.type, self.dice, self._if_dice(self.boost))
         # Boost dice don't double on critical hits
         if self.basic_save:
             return base + {
@@ -368,7 +466,7 @@ class Damage:
         >>> Damage("bludgeoning", 2, 12).reduce_die()
         **Damage** 2d10 bludgeoning
         """
-        return self.copy(faces=self.faces - 2)
+        return self.copy(faces=self._if_dice(self.faces - 2))
 
     def increase_die(self) -> Damage:
         """Increase the damage die size by 1 step.
@@ -378,7 +476,7 @@ class Damage:
         >>> Damage("piercing", 1, 4).increase_die()
         **Damage** 1d6 piercing
         """
-        return self.copy(faces=self.faces + 2)
+        return self.copy(faces=self._if_dice(self.faces + 2))
 
     def vicious_swing(self, dice: int = 1) -> Damage | ExpandedDamage:
         """:prd_feats:`Vicious Swing <4775>`, a.k.a. Power Attack, and similar effects.
@@ -409,20 +507,26 @@ class Damage:
           **Critical success** (3d8)x2 slashing plus 2d8 slashing
           **Success** 3d8 slashing
         """
+        dice_ = self._if_dice(dice)
         if not self.deadly:
-            return self.copy(dice=self.dice + dice)
+            return self.copy(dice=self.dice + dice_)
 
         # Extra dice don't increase deadly dice and don't add extra splash damage,
         # but they are increased by fatal and add to scatter damage
         res = self + {
             DoS.critical_success: [
-                Damage(self.type, dice, self.fatal or self.faces, multiplier=2),
+                Damage(
+                    self.type,
+                    dice_,
+                    self._if_dice(self.fatal) if self.fatal else self.faces,
+                    multiplier=2,
+                ),
             ],
-            DoS.success: [Damage(self.type, dice, self.faces)],
+            DoS.success: [Damage(self.type, dice_, self.faces)],
         }
         if self.scatter:
             # Vicious Swing adds to scatter damage
-            splash = Damage(self.type, 0, 0, dice, splash=True)
+            splash = Damage(self.type, 0, 0, dice_, splash=True)
             res[DoS.critical_success].append(splash)
             res[DoS.success].append(splash)
         return res.simplify()
@@ -459,24 +563,34 @@ class Damage:
         out[DoS.success] = [base]
         if self.fatal:
             out[DoS.critical_success] = [
-                base.copy(faces=self.fatal, multiplier=2),
-                base.copy(dice=1, faces=self.fatal, bonus=0),
+                base.copy(faces=self._if_dice(self.fatal), multiplier=2),
+                base.copy(
+                    dice=self._if_dice(1), faces=self._if_dice(self.fatal), bonus=0
+                ),
             ]
         else:
             if self.splash:
                 crit = base
-            elif self.dice == 0:
+            elif not self._is_array("dice") and self.dice == 0:
                 crit = base.copy(bonus=base.bonus * 2)
             else:
                 crit = base.copy(multiplier=2)
             out[DoS.critical_success] = [crit]
         if self.deadly:
             out[DoS.critical_success].append(
-                base.copy(dice=max(1, self.dice - 1), faces=self.deadly, bonus=0)
+                base.copy(
+                    dice=(
+                        self._if_dice((self.dice - 1).clip(min=1))
+                        if isinstance(self.dice, DataArray)
+                        else max(1, self.dice - 1)
+                    ),
+                    faces=self._if_dice(self.deadly),
+                    bonus=0,
+                )
             )
         if self.scatter:
             # Unlike regular splash, scatter does not deal any damage on a miss.
-            crit_dice = self.dice + (1 if self.fatal else 0)
+            crit_dice = self.dice + self._if_dice(1 if self.fatal else 0)
             out[DoS.critical_success].append(
                 Damage(self.type, 0, 0, crit_dice, splash=True)
             )
@@ -485,11 +599,25 @@ class Damage:
         if self.basic_save:
             out[DoS.critical_failure] = out.pop(DoS.critical_success)
             out[DoS.failure] = out.pop(DoS.success)
-            if self.dice == 0 and self.bonus > 0:
+            if self._is_array("dice") or self.dice > 0:
+                out[DoS.success] = [base.copy(multiplier=0.5)]
+            elif isinstance(self.bonus, DataArray):
+                if (self.bonus < 0).any():
+                    raise ValueError(
+                        "Array-valued flat damage with a basic saving throw must be "
+                        f"non-negative; got {self.bonus}"
+                    )
+                # Minimum 1 damage on a save, except where there's no damage at all
+                out[DoS.success] = [
+                    base.copy(
+                        bonus=xarray.where(
+                            self.bonus > 0, np.maximum(1, self.bonus // 2), 0
+                        )
+                    )
+                ]
+            elif self.bonus > 0:
                 # Minimum 1 damage on a save
                 out[DoS.success] = [base.copy(bonus=max(1, self.bonus // 2))]
-            elif self.dice > 0:
-                out[DoS.success] = [base.copy(multiplier=0.5)]
 
         return ExpandedDamage(out)
 
@@ -742,6 +870,67 @@ class ExpandedDamage(UserDict[DoS, list[Damage]]):
         return ExpandedDamage({k: DamageList(v).simplify() for k, v in self.items()})
 
 
+def _int_repr(v: int | DataArray) -> str:
+    """Pretty-print an int or the range of an array-valued field of :class:`Damage`"""
+    if not isinstance(v, DataArray):
+        return str(v)
+    lo, hi = int(v.min()), int(v.max())
+    return str(lo) if lo == hi else f"[{lo}..{hi}]"
+
+
+def _split_array_spec(
+    spec: ExpandedDamage,
+) -> tuple[list[ExpandedDamage], DataArray] | None:
+    """Split a damage spec where the dice, faces, and/or bonus of some
+    :class:`Damage` are :class:`~xarray.DataArray` into the distinct plain specs
+    it is made of.
+
+    :returns:
+        None if `spec` is not array-valued; otherwise a tuple of
+
+        - list of the distinct :class:`ExpandedDamage` with plain int fields
+        - :class:`~xarray.DataArray` with the dimensions of all the arrays in
+          `spec`, broadcasted against each other, with the index in the above list
+          of the spec of each point
+    """
+    fields = [
+        (dos, i, k, v)
+        for dos, specs in spec.items()
+        for i, d in enumerate(specs)
+        for k in _ARRAY_FIELDS
+        if isinstance(v := getattr(d, k), DataArray)
+    ]
+    if not fields:
+        return None
+    arrays = xarray.broadcast(*xarray.align(*(v for *_, v in fields), join="inner"))
+    template = arrays[0]
+    values = [a.transpose(*template.dims).values for a in arrays]
+
+    distinct: dict[tuple, int] = {}
+    out: list[ExpandedDamage] = []
+    index = np.empty(template.shape, dtype=np.intp)
+    for point in np.ndindex(index.shape):
+        changes: dict[tuple[DoS, int], dict[str, int]] = {}
+        for (dos, i, k, _), vals in zip(fields, values, strict=True):
+            changes.setdefault((dos, i), {})[k] = int(vals[point])
+        point_spec: dict[DoS, list[Damage]] = {}
+        for dos, specs in spec.items():
+            point_spec[dos] = []
+            for i, d in enumerate(specs):
+                if (dos, i) not in changes:
+                    point_spec[dos].append(d)
+                    continue
+                d = d.copy(**changes[(dos, i)])
+                # Array-valued damage which is all zeros at this point
+                if d.dice or d.bonus:
+                    point_spec[dos].append(d)
+        key = tuple((dos, tuple(specs)) for dos, specs in point_spec.items())
+        index[point] = distinct.setdefault(key, len(distinct))
+        if index[point] == len(out):
+            out.append(ExpandedDamage(point_spec))
+    return out, template.copy(data=index)
+
+
 ExpandedDamageLike: TypeAlias = (
     ExpandedDamage | Mapping[int, Collection[Damage]] | Mapping[DoS, Collection[Damage]]
 )
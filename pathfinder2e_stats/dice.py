@@ -2,13 +2,15 @@
 
 import re
 from collections.abc import Hashable, Mapping
+from functools import cache, partial
 from typing import cast, overload
 
 import numpy as np
 import xarray
 from xarray import DataArray
 
-from pathfinder2e_stats.config import get_config, rng
+from pathfinder2e_stats.config import _config, _counter_raw, get_config, rng
+from pathfinder2e_stats.parallel import _dask_rolls
 
 # XdY+Z | XdY-Z | dY+Z | dY-Z | dY
 _pattern = re.compile(r"([0-9]+)?d([0-9]+)([+-][0-9]+)?$")
@@ -115,13 +117,41 @@ def roll(
 
     if dims is None:
         dims = {}
+    return _roll(dice, faces, bonus, dims=dims, roll_size=get_config()["roll_size"])
 
-    roll_size = get_config()["roll_size"]
-    raw = DataArray(
-        rng().integers(1, faces + 1, size=(roll_size, dice, *dims.values())),
-        dims=("roll", "__dice", *dims),
-    )
-    return cast(DataArray, np.maximum(0, raw.sum("__dice") + bonus))
+
+def _roll(
+    dice: int,
+    faces: int,
+    bonus: int,
+    *,
+    dims: Mapping[Hashable, int],
+    roll_size: int,
+) -> DataArray:
+    """Implement :func:`roll` for an explicit number of rolls, which may be
+    smaller than the ``roll_size`` config option.
+    With the dask backend, `roll_size` must match the config option.
+    """
+    config = get_config()
+    dtype = _int_dtype(min(0, bonus), dice * faces + max(0, bonus))
+
+    session = getattr(_config, "session", None)
+    if config["backend"] == "dask" and session is None:
+        return _dask_rolls(partial(roll, dims=dims), dims, dtype, dice, faces, bonus)
+    if session is not None:
+        # Common random numbers; see Session
+        raw = session._draw(faces, {"roll": roll_size, "__dice": dice, **dims})
+    elif config["dice_sampler"] == "cdf" and dice > 1:
+        # Inverse transform sampling
+        u = _uniform((roll_size, *dims.values()))
+        idx = np.searchsorted(_dice_cdf(dice, faces, bonus), u, side="right")
+        return DataArray(idx.astype(dtype), dims=("roll", *dims))
+    else:
+        raw = DataArray(
+            _integers(faces, (roll_size, dice, *dims.values())),
+            dims=("roll", "__dice", *dims),
+        )
+    return cast(DataArray, np.maximum(0, raw.sum("__dice", dtype=dtype) + bonus))
 
 
 def d20(
@@ -189,16 +219,37 @@ def d20(
         but on each element along the `roll` dimension there would be a single attack
         roll minus 0, 5, and 10 respectively.
     """
+    return _d20(fortune=fortune, misfortune=misfortune, dims=dims)
+
+
+def _d20(
+    *,
+    fortune: bool | DataArray,
+    misfortune: bool | DataArray,
+    dims: Mapping[Hashable, int] | None,
+    roll_size: int | None = None,
+) -> DataArray:
+    """Implement :func:`d20`.
+
+    :param roll_size:
+        Number of rolls, which may be smaller than the ``roll_size`` config option
+        with the numpy backend. Default: the ``roll_size`` config option.
+    """
+    roll_d20 = (
+        _stratified_d20
+        if get_config()["stratified_d20"] and getattr(_config, "session", None) is None
+        else _plain_d20
+    )
     if fortune is True and misfortune is True:
-        return roll(1, 20, dims=dims)
+        return roll_d20(dims, roll_size)
     if fortune is False and misfortune is False:
-        return roll(1, 20, dims=dims)
+        return roll_d20(dims, roll_size)
 
     fortune = DataArray(fortune)
     misfortune = DataArray(misfortune)
     dims = dict(dims) if dims else {}
     dims["__fortune"] = 2
-    raw = roll(1, 20, dims=dims)
+    raw = roll_d20(dims, roll_size)
     return xarray.where(
         fortune & ~misfortune,
         raw.max("__fortune"),  # roll with fortune
@@ -208,3 +259,137 @@ def d20(
             raw.isel(__fortune=0),  # roll normally (disregard second roll)
         ),
     )
+
+
+def _plain_d20(
+    dims: Mapping[Hashable, int] | None, roll_size: int | None = None
+) -> DataArray:
+    """Roll a d20 without fortune or misfortune"""
+    if roll_size is None:
+        return roll(1, 20, dims=dims)
+    return _roll(1, 20, 0, dims=dims or {}, roll_size=roll_size)
+
+
+def _stratified_d20(
+    dims: Mapping[Hashable, int] | None, roll_size: int | None = None
+) -> DataArray:
+    """Roll a d20 without fortune or misfortune, making sure that every block of
+    20 rolls contains every face exactly once.
+    """
+    dims = dict(dims) if dims else {}
+    config = get_config()
+    if roll_size is None:
+        roll_size = config["roll_size"]
+    if config["backend"] == "dask":
+        return _dask_rolls(_stratified_d20, dims, _int_dtype(1, 20), dims)
+    if config["counter_rng"]:
+        # Align the blocks to the absolute roll index, so that the result
+        # doesn't depend on how the roll dimension is chunked
+        offset = config["roll_offset"]
+        start = offset // 20 * 20
+        stop = -(-(offset + roll_size) // 20) * 20
+        keys = _counter_raw((stop - start, *dims.values()), roll_start=start)
+        keys = keys.reshape(-1, 20, *dims.values())
+        ranks = keys.argsort(axis=1).argsort(axis=1) + 1
+        ranks = ranks.reshape(-1, *dims.values())[offset - start :][:roll_size]
+        return DataArray(ranks.astype(_int_dtype(1, 20)), dims=("roll", *dims))
+
+    nblocks = -(-roll_size // 20)  # Round up
+    faces = np.arange(1, 21, dtype=_int_dtype(1, 20))
+    shape = (*dims.values(), nblocks, 20)
+    raw = rng().permuted(np.broadcast_to(faces, shape), axis=-1)
+    raw = raw.reshape(*dims.values(), nblocks * 20)[..., :roll_size]
+    return DataArray(raw, dims=(*dims, "roll")).transpose("roll", ...)
+
+
+def _integers(faces: int, shape: tuple[int, ...]) -> np.ndarray:
+    """Roll dice with the given number of faces, with either :func:`rng` or the
+    counter-based generator, depending on the ``counter_rng`` config option.
+    """
+    dtype = _int_dtype(1, faces)
+    if get_config()["counter_rng"]:
+        # Multiply-shift: map the top 32 bits to [0, faces)
+        raw = _counter_raw(shape) >> np.uint64(32)
+        return (raw * np.uint64(faces) >> np.uint64(32)).astype(dtype) + 1
+    return rng().integers(1, faces + 1, size=shape, dtype=dtype)
+
+
+def _uniform(shape: tuple[int, ...]) -> np.ndarray:
+    """Draw uniform floats in [0, 1), with either :func:`rng` or the
+    counter-based generator, depending on the ``counter_rng`` config option.
+    """
+    if get_config()["counter_rng"]:
+        return (_counter_raw(shape) >> np.uint64(11)) * 2.0**-53
+    return rng().random(size=shape)
+
+
+def _int_dtype(lo: int, hi: int) -> np.dtype:
+    """Return the narrowest signed integer dtype that can hold all values between
+    `lo` and `hi`, if the ``compact_dtypes`` config option is set, or int64 otherwise.
+    """
+    if get_config()["compact_dtypes"]:
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _dice_pmf(dice: int, faces: int, bonus: int = 0) -> np.ndarray:
+    """Exact probability mass function of :func:`roll`.
+
+    :returns:
+        1D array where the element at index i is the probability of rolling i.
+    """
+    pmf = np.ones(1)
+    if dice:
+        die = np.full(faces, 1 / faces)
+        for _ in range(dice):
+            pmf = np.convolve(pmf, die)
+    # Element 0 of pmf is the probability of rolling all 1s
+    values = np.maximum(0, np.arange(pmf.size) + dice + bonus)
+    return np.bincount(values, weights=pmf)
+
+
+@cache
+def _dice_cdf(dice: int, faces: int, bonus: int) -> np.ndarray:
+    """Cumulative distribution function of :func:`roll`.
+
+    :returns:
+        Read-only 1D array where the element at index i is the probability of
+        rolling i or less.
+    """
+    cdf = np.cumsum(_dice_pmf(dice, faces, bonus))
+    # Prevent floating point error from causing searchsorted to go out of bounds
+    cdf[-1] = 1.0
+    cdf.flags.writeable = False
+    return cdf
+
+
+def _d20_pmf(
+    *,
+    fortune: bool | DataArray = False,
+    misfortune: bool | DataArray = False,
+    dim: Hashable = "natural",
+) -> DataArray:
+    """Exact probability mass function of :func:`d20`.
+
+    :returns:
+        :class:`~xarray.DataArray` with the probability of each face,
+        with dimension `dim` (with coordinate 1 to 20) plus the dimensions of
+        `fortune` and `misfortune`.
+    """
+    faces = np.arange(1, 21)
+    natural = DataArray(faces, dims=[dim], coords={dim: faces})
+    fortune = DataArray(fortune)
+    misfortune = DataArray(misfortune)
+    # P(max of two d20 = n) = (2n - 1) / 400; P(min of two d20 = n) = (41 - 2n) / 400
+    return xarray.where(
+        fortune & ~misfortune,
+        (natural * 2 - 1) / 400,
+        xarray.where(
+            misfortune & ~fortune,
+            (41 - natural * 2) / 400,
+            xarray.full_like(natural, 1 / 20, dtype=float),
+        ),
+    )
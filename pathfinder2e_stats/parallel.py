@@ -0,0 +1,311 @@
+"""Parallel execution"""
+
+import functools
+import itertools
+from collections.abc import Callable, Hashable, Iterable, Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar, cast
+
+import numpy as np
+import xarray
+from xarray import DataArray, Dataset
+
+from pathfinder2e_stats.config import _config, _new_counter_key, get_config, rng, seed
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def _split_rolls(func: _F) -> _F:
+    """Decorator for :func:`check` and :func:`damage`.
+
+    If the ``threads`` config option is greater than 1, split the ``roll``
+    dimension into one chunk per thread, slicing all the parameters with the
+    ``roll`` dimension accordingly, call `func` once per chunk in a thread pool,
+    and concatenate the results.
+
+    Each thread inherits the configuration of the calling thread. Unless the
+    ``counter_rng`` config option is set, each thread draws from its own random
+    number generator, spawned from a seed drawn from :func:`rng` of the calling
+    thread. With ``counter_rng``, each thread replays the stream of the calling
+    thread at the offset of its chunk, so that the result is identical to a
+    single-threaded call.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        config = get_config()
+        roll_size = config["roll_size"]
+        threads = min(config["threads"], roll_size)
+        if (
+            threads < 2
+            or config["backend"] == "dask"
+            or kwargs.get("mode", "roll") != "roll"
+            or getattr(_config, "session", None) is not None
+        ):
+            return func(*args, **kwargs)
+
+        bounds = np.linspace(0, roll_size, threads + 1).astype(int).tolist()
+        state, children = _fork(threads)
+
+        def run_chunk(i: int) -> tuple[Dataset, int]:
+            start, stop = bounds[i], bounds[i + 1]
+            chunk_args = [_slice_rolls(arg, start, stop, roll_size) for arg in args]
+            chunk_kwargs = {
+                k: _slice_rolls(v, start, stop, roll_size) for k, v in kwargs.items()
+            }
+            return _run_rolls(
+                state,
+                children[i],
+                start,
+                stop - start,
+                func,
+                *chunk_args,
+                **chunk_kwargs,
+            )
+
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(run_chunk, range(threads)))
+
+        # Advance the counter-based stream as if func had run on this thread
+        if config["counter_rng"]:
+            _config.counter_draw = results[0][1]
+        return xarray.concat(
+            [chunk for chunk, _ in results],
+            dim="roll",
+            data_vars="minimal",
+            coords="minimal",
+            compat="override",
+            join="exact",
+        )
+
+    return cast(_F, wrapper)
+
+
+def _fork(n: int) -> tuple[dict[str, Any], list[np.random.SeedSequence]]:
+    """Prepare to run chunks of rolls outside of the calling thread.
+
+    :returns:
+        Tuple of
+
+        - snapshot of the settings of the calling thread, to be passed to
+          :func:`_run_rolls`
+        - `n` independent seeds, spawned from a seed drawn from :func:`rng`
+    """
+    gen = rng()  # Seed to 0 on first use
+    if get_config()["counter_rng"] and "counter_key" not in _config.__dict__:
+        _config.counter_key = _new_counter_key(gen)
+    children = np.random.SeedSequence(gen.integers(2**63)).spawn(n)
+    state = _config.__dict__.copy()
+    state.pop("rng", None)
+    state.pop("session", None)
+    state["threads"] = 1
+    state["backend"] = "numpy"
+    return state, children
+
+
+def _run_rolls(
+    state: dict[str, Any],
+    seed_seq: np.random.SeedSequence,
+    roll_start: int,
+    roll_size: int,
+    func: Callable[..., Any],
+    /,
+    *args: Any,
+    **kwargs: Any,
+) -> tuple[Any, int]:
+    """Call func on a chunk of the roll dimension, on any thread or process,
+    with the settings captured by :func:`_fork`.
+
+    :param roll_start:
+        Index of the first roll of the chunk, relative to the ``roll_offset``
+        config option of the calling thread.
+    :returns:
+        Tuple of (output of func, draw counter of the counter-based random number
+        generator after calling func)
+    """
+    orig_state = _config.__dict__.copy()
+    _config.__dict__.clear()
+    _config.__dict__.update(state)
+    _config.roll_size = roll_size
+    _config.roll_offset = state.get("roll_offset", 0) + roll_start
+    _config.rng = np.random.default_rng(seed_seq)
+    try:
+        return func(*args, **kwargs), _config.__dict__.get("counter_draw", 0)
+    finally:
+        _config.__dict__.clear()
+        _config.__dict__.update(orig_state)
+
+
+def _dask_rolls(
+    func: Callable[..., DataArray],
+    dims: Mapping[Hashable, int],
+    dtype: np.dtype,
+    /,
+    *args: Any,
+) -> DataArray:
+    """Lazily call ``func(*args)`` once for each dask chunk of the ``roll``
+    dimension, as set by the ``dask_chunk_size`` config option.
+
+    :param func:
+        Function which returns a numpy-backed :class:`~xarray.DataArray` with
+        dims ``("roll", *dims)``. It must draw exactly once from the
+        counter-based random number generator when ``counter_rng`` is set.
+    :returns:
+        dask-backed :class:`~xarray.DataArray` with dims ``("roll", *dims)``
+    """
+    import dask  # noqa: PLC0415
+    import dask.array as da  # noqa: PLC0415
+
+    config = get_config()
+    roll_size = config["roll_size"]
+    chunk_size = config["dask_chunk_size"]
+    starts = list(range(0, roll_size, chunk_size))
+    state, children = _fork(len(starts))
+    blocks = []
+    for start, seed_seq in zip(starts, children, strict=True):
+        n = min(chunk_size, roll_size - start)
+        block = dask.delayed(_run_rolls)(
+            state, seed_seq, start, n, _values, func, *args
+        )
+        block = block[0]
+        blocks.append(da.from_delayed(block, shape=(n, *dims.values()), dtype=dtype))
+    if config["counter_rng"]:
+        _config.counter_draw = _config.__dict__.get("counter_draw", 0) + 1
+    # Don't inherit the name of the dask array
+    return DataArray(da.concatenate(blocks), dims=("roll", *dims)).rename(None)
+
+
+def _values(func: Callable[..., DataArray], /, *args: Any) -> np.ndarray:
+    """Call func and return the numpy array wrapped by its output"""
+    return func(*args).values
+
+
+def _slice_rolls(obj: Any, start: int, stop: int, roll_size: int) -> Any:
+    """Slice obj along the roll dimension if it has one"""
+    if isinstance(obj, DataArray | Dataset) and obj.sizes.get("roll") == roll_size:
+        return obj.isel(roll=slice(start, stop))
+    return obj
+
+
+def sweep(
+    func: Callable[..., DataArray | Dataset],
+    /,
+    *,
+    executor: Executor | None = None,
+    **axes: Iterable[Hashable],
+) -> Dataset:
+    """Run a simulation for every combination of a grid of parameters, in parallel
+    across multiple processes, and collect the results in a single dataset.
+
+    :param func:
+        Function which runs the simulation for a single point of the grid,
+        typically by calling :func:`check` and :func:`damage`. It is called with
+        one keyword argument for each axis and must return a
+        :class:`~xarray.DataArray` or :class:`~xarray.Dataset`.
+        When using the default executor, it must be importable by the worker
+        processes, which means that it can't be a lambda or a function defined
+        in a Jupyter notebook; save it in a module instead.
+    :param executor:
+        :class:`concurrent.futures.Executor` used to run `func`.
+        Default: a new :class:`~concurrent.futures.ProcessPoolExecutor` with one
+        worker per CPU, which is shut down afterwards.
+    :param axes:
+        Grid of parameters; each keyword is the name of a parameter of `func`
+        and each value is the collection of values it can assume.
+    :returns:
+        A :class:`~xarray.Dataset` with one dimension for each axis, in the order
+        they were passed, in addition to the dimensions returned by `func`.
+        If `func` returns an unnamed :class:`~xarray.DataArray`, it is stored in
+        the ``value`` variable.
+
+    Each point of the grid runs with the settings of the calling thread
+    (see :func:`set_config`) and with its own seed, spawned from a seed drawn from
+    :func:`rng`, so that results are reproducible regardless of the executor and
+    number of workers.
+
+    **Example:**
+
+    .. only:: doctest
+
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> from pathfinder2e_stats import Damage, check, damage, seed
+        >>> seed(0)
+
+    Mean damage of a Strike with a striking and a greater striking longsword,
+    by level of the fighter and enemy:
+
+    >>> def strike(level, dice):
+    ...     outcome = check(level + 9, DC=level + 17)
+    ...     return damage(outcome, Damage("slashing", dice, 8, 4)).total_damage.mean()
+    >>> with ThreadPoolExecutor() as executor:
+    ...     res = sweep(strike, level=[1, 10, 20], dice=[2, 3], executor=executor)
+    >>> res.total_damage.round(2).to_pandas()
+    dice       2      3
+    level
+    1      10.42  14.02
+    10     10.39  13.98
+    20     10.41  13.95
+    """
+    if not axes:
+        raise TypeError("sweep() requires at least one axis")
+    names = list(axes)
+    values = [list(v) for v in axes.values()]
+    points = list(itertools.product(*values))
+    if not points:
+        raise ValueError("All axes must have at least one value")
+    seeds = np.random.SeedSequence(rng().integers(2**63)).spawn(len(points))
+    state = _config.__dict__.copy()
+    for k in ("rng", "session", "counter_key", "counter_draw"):
+        state.pop(k, None)
+
+    def submit(ex: Executor) -> list[Dataset]:
+        return list(
+            ex.map(
+                functools.partial(_sweep_point, func, state),
+                seeds,
+                [dict(zip(names, point, strict=True)) for point in points],
+            )
+        )
+
+    if executor is None:
+        with ProcessPoolExecutor() as ex:
+            results = submit(ex)
+    else:
+        results = submit(executor)
+
+    # Nest the results by axis, innermost axis last
+    nested: Any = results
+    for size in reversed([len(v) for v in values[1:]]):
+        nested = [nested[i : i + size] for i in range(0, len(nested), size)]
+    out = xarray.combine_nested(
+        nested,
+        concat_dim=names,
+        data_vars="all",
+        coords="different",
+        compat="equals",
+        join="outer",
+        combine_attrs="drop_conflicts",
+    )
+    out = out.assign_coords(dict(zip(names, values, strict=True)))
+    return out.transpose(*names, ...)
+
+
+def _sweep_point(
+    func: Callable[..., DataArray | Dataset],
+    state: dict[str, Any],
+    seed_seq: np.random.SeedSequence,
+    params: dict[str, Any],
+) -> Dataset:
+    """Run a single point of :func:`sweep` in a worker"""
+    orig_state = _config.__dict__.copy()
+    _config.__dict__.clear()
+    _config.__dict__.update(state)
+    seed(seed_seq)
+    try:
+        out = func(**params)
+    finally:
+        _config.__dict__.clear()
+        _config.__dict__.update(orig_state)
+    if isinstance(out, DataArray):
+        out = out.to_dataset(name=out.name if out.name is not None else "value")
+    return out
@@ -0,0 +1,209 @@
+"""Common random numbers across scenario variants"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Hashable, Mapping
+from statistics import NormalDist
+from typing import Any
+
+import numpy as np
+import xarray
+from xarray import DataArray, Dataset
+
+from pathfinder2e_stats.config import _config
+from pathfinder2e_stats.dice import _int_dtype
+
+
+class Session:
+    """Evaluate multiple variants of the same scenario on the same dice rolls
+    (*common random numbers*), so that the differences between them have much
+    lower variance than if each variant was rolled independently.
+
+    Use the session as a context manager, once for each variant. All calls to
+    :func:`roll`, :func:`d20`, :func:`check`, and :func:`damage` in the context
+    draw their dice from a bank owned by the session instead of the global random
+    number generator. Dice are matched across variants by their number of faces
+    and by the order in which they are rolled: for example, the first d20 rolled
+    in each variant is always the same. When a variant rolls more dice, or along
+    more dimensions, than a previous variant, the dice in common are reused and
+    the others are rolled anew; e.g. the first of the two d20 rolled for a check
+    with fortune is the same d20 rolled for the same check without fortune.
+
+    :param seed:
+        Seed of the random number generator owned by the session.
+        Accepts the same values as :func:`seed`. Default: random.
+
+    **Example:**
+
+    Compare the damage of a Longsword (+8 to hit, 1d8+4) against AC17, with and
+    without Sure Strike:
+
+    .. only:: doctest
+
+        >>> from pathfinder2e_stats import Damage, check, damage
+
+    >>> spec = Damage("slashing", 1, 8, 4)
+    >>> session = Session(seed=0)
+    >>> with session:
+    ...     base = damage(check(8, DC=17), spec).total_damage
+    >>> with session:
+    ...     sure_strike = damage(check(8, DC=17, fortune=True), spec).total_damage
+    >>> diff = paired_difference(base, sure_strike)
+    >>> float(diff.difference.round(2)), float(diff.stderr.round(3))
+    (2.79, 0.015)
+
+    Or, equivalently:
+
+    >>> session.compare({
+    ...     "base": lambda: damage(check(8, DC=17), spec).total_damage,
+    ...     "sure strike": lambda: damage(
+    ...         check(8, DC=17, fortune=True), spec).total_damage,
+    ... }).round(2).to_pandas()
+                 mean  difference  stderr  ci_low  ci_high
+    variant
+    base         5.94        0.00    0.00    0.00     0.00
+    sure strike  8.73        2.79    0.02    2.76     2.82
+    """
+
+    _rng: np.random.Generator
+    _bank: dict[tuple[int, int], DataArray]
+    _counters: dict[int, int]
+
+    def __init__(self, seed: Any | None = None):
+        self._rng = np.random.default_rng(seed)
+        self._bank = {}
+        self._counters = {}
+
+    def __enter__(self) -> Session:
+        if getattr(_config, "session", None) is not None:
+            raise RuntimeError("Sessions can't be nested")
+        self._counters = {}
+        _config.session = self
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        del _config.session
+
+    def _draw(self, faces: int, dims: Mapping[Hashable, int]) -> DataArray:
+        """Roll dice with the given number of faces, reusing the dice rolled
+        by the previous variants where possible.
+
+        Called by :func:`roll`.
+        """
+        idx = self._counters.get(faces, 0)
+        self._counters[faces] = idx + 1
+        key = faces, idx
+
+        new = DataArray(
+            self._rng.integers(
+                1, faces + 1, size=tuple(dims.values()), dtype=_int_dtype(1, faces)
+            ),
+            dims=list(dims),
+        )
+        old = self._bank.get(key)
+        if old is not None:
+            # Overwrite the dice in common with the banked ones.
+            # Along the dimensions that are missing from either, the banked dice
+            # correspond to the first element.
+            old = old.isel({d: 0 for d in old.dims if d not in dims})
+            region = {
+                d: slice(0, min(size, old.sizes[d])) if d in old.dims else 0
+                for d, size in dims.items()
+            }
+            overlap = old.isel({d: region[d] for d in old.dims})
+            overlap = overlap.transpose(*(d for d in dims if d in old.dims))
+            new.values[tuple(region.values())] = overlap.values
+
+        if old is None or all(
+            dims.get(d, 0) >= size for d, size in self._bank[key].sizes.items()
+        ):
+            self._bank[key] = new
+        return new
+
+    def compare(
+        self,
+        variants: Mapping[Hashable, Callable[[], DataArray]],
+        *,
+        baseline: Hashable | None = None,
+        confidence: float = 0.95,
+    ) -> Dataset:
+        """Evaluate multiple variants of the same scenario in this session and
+        compare them against a baseline.
+
+        :param variants:
+            Mapping of variant names to functions without parameters that
+            return a :class:`~xarray.DataArray` with the ``roll`` dimension,
+            e.g. the ``total_damage`` of :func:`damage`.
+        :param baseline:
+            Name of the baseline variant. Default: the first variant.
+        :param float confidence:
+            Confidence level of the confidence interval. Default: 0.95.
+        :returns:
+            A :class:`~xarray.Dataset` with a new dimension ``variant`` and the
+            same variables as :func:`paired_difference`, plus ``mean``, which is
+            the mean of each variant along ``roll``.
+        """
+        results = {}
+        for name, func in variants.items():
+            with self:
+                results[name] = func()
+        if baseline is None:
+            baseline = next(iter(results))
+
+        values = xarray.concat(
+            list(results.values()), dim="variant", join="outer", fill_value=0
+        )
+        values.coords["variant"] = list(results)
+        out = paired_difference(
+            values.sel(variant=baseline, drop=True), values, confidence=confidence
+        )
+        out["mean"] = values.mean("roll")
+        out = out[["mean", *out.data_vars]]
+        out.attrs["baseline"] = baseline
+        return out
+
+
+def paired_difference(
+    a: DataArray,
+    b: DataArray,
+    *,
+    dim: str = "roll",
+    confidence: float = 0.95,
+) -> Dataset:
+    """Compare two variants of the same scenario which were rolled on the same dice,
+    e.g. by a :class:`Session`.
+
+    :param a:
+        Baseline, e.g. the ``total_damage`` of :func:`damage`
+    :param b:
+        Variant to compare against the baseline
+    :param dim:
+        Dimension along which the two variants are paired. Default: ``roll``.
+    :param float confidence:
+        Confidence level of the confidence interval. Default: 0.95.
+    :returns:
+        A :class:`~xarray.Dataset` with variables
+
+        difference
+            Mean of ``b - a``.
+        stderr
+            Standard error of `difference`.
+        ci_low, ci_high
+            Bounds of the confidence interval of `difference`, using the normal
+            approximation.
+    """
+    diff = b - a
+    n = diff.sizes[dim]
+    mean = diff.mean(dim)
+    stderr = diff.std(dim, ddof=1) / np.sqrt(n)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    out = Dataset(
+        {
+            "difference": mean,
+            "stderr": stderr,
+            "ci_low": mean - z * stderr,
+            "ci_high": mean + z * stderr,
+        }
+    )
+    out.attrs["confidence"] = confidence
+    return out
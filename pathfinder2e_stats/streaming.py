@@ -0,0 +1,340 @@
+"""Run simulations in chunks with bounded memory"""
+
+from collections.abc import Callable, Collection, Hashable, Mapping, Sequence
+from typing import Any
+
+import xarray
+from xarray import DataArray, Dataset
+
+from pathfinder2e_stats.accessors import _bincount
+from pathfinder2e_stats.config import _config, get_config, set_config
+from pathfinder2e_stats.parallel import _slice_rolls
+
+
+def stream(
+    func: Callable[[], DataArray | Dataset],
+    roll_size: int,
+    *,
+    chunk_size: int | None = None,
+) -> Dataset:
+    """Run a simulation over the ``roll`` dimension in fixed-size chunks and
+    aggregate the results on the fly, so that memory usage does not depend on
+    `roll_size`.
+
+    This lets you run many more rolls than would fit in memory, e.g. to
+    measure small tail probabilities.
+
+    :param func:
+        Function without parameters which runs the simulation, typically by calling
+        :func:`check` and :func:`damage`, and returns a
+        :class:`~xarray.DataArray` or :class:`~xarray.Dataset` with the ``roll``
+        dimension. It is called repeatedly with ``get_config()["roll_size"]`` set to
+        the size of the chunk.
+    :param int roll_size:
+        Total number of rolls.
+    :param int chunk_size:
+        Number of rolls in each chunk. Default: ``get_config()["roll_size"]``.
+    :returns:
+        A :class:`~xarray.Dataset` with, for each numeric variable ``<name>`` of
+        the output of `func` with the ``roll`` dimension:
+
+        <name>_mean
+            Mean along the ``roll`` dimension.
+        <name>_var
+            Variance along the ``roll`` dimension.
+        <name>_counts
+            Only for integer variables: number of occurrences of each value along
+            the ``roll`` dimension, along a new dimension ``<name>``.
+
+        Variables without the ``roll`` dimension are copied from the first chunk.
+        The ``roll_size`` attribute is set to the total number of rolls.
+
+    If the ``counter_rng`` config option is set (see :func:`set_config`), the
+    rolls do not depend on `chunk_size`; the result is the same, save for floating
+    point rounding, as calling `func` once with ``roll_size=roll_size``.
+
+    **Example:**
+
+    .. only:: doctest
+
+        >>> from pathfinder2e_stats import Damage, check, damage, seed
+        >>> seed(0)
+
+    Strike an AC17 enemy with a Longsword (+8 to hit, 1d8+4 damage) a
+    million times, without ever holding more than 100,000 rolls in memory.
+    How likely is it to deal 20 damage or more?
+
+    >>> def strike():
+    ...     return damage(check(8, DC=17), Damage("slashing", 1, 8, 4))
+    >>> res = stream(strike, 1_000_000, chunk_size=100_000)
+    >>> res.total_damage_mean.round(4).item()
+    5.9554
+    >>> counts = res.total_damage_counts
+    >>> (counts.sel(total_damage=slice(20, None)).sum() / res.roll_size).item()
+    0.037677
+    """
+    if chunk_size is None:
+        chunk_size = get_config()["roll_size"]
+    if roll_size < 1 or chunk_size < 1:
+        raise ValueError("roll_size and chunk_size must be positive")
+
+    acc = _Accumulator()
+    draw = _config.__dict__.get("counter_draw", 0)
+    for start in range(0, roll_size, chunk_size):
+        acc.update(_run_chunk(func, min(chunk_size, roll_size - start), start, draw))
+    return acc.result()
+
+
+def converge(
+    func: Callable[[], DataArray | Dataset],
+    target_stderr: float,
+    *,
+    mean: Collection[Hashable] = (),
+    counts: Collection[Hashable] = (),
+    chunk_size: int | None = None,
+    max_roll_size: int = 10_000_000,
+) -> Dataset:
+    """Run a simulation like :func:`stream`, adding chunks of rolls until the
+    standard error of the requested statistics drops below a target.
+
+    :param func:
+        Function without parameters which runs the simulation.
+        See :func:`stream`.
+    :param float target_stderr:
+        Stop when the standard error of all the requested statistics,
+        across all points of all other dimensions, is at or below this value.
+    :param mean:
+        Names of the variables returned by `func` whose mean must converge,
+        e.g. ``["total_damage"]``.
+    :param counts:
+        Names of the integer variables returned by `func` whose frequency of
+        each value must converge, e.g. ``["outcome"]``.
+    :param int chunk_size:
+        Number of rolls to add at each iteration.
+        Default: ``get_config()["roll_size"]``.
+    :param int max_roll_size:
+        Stop after this many rolls, even if the target has not been reached.
+        Default: 10,000,000.
+    :returns:
+        The same as :func:`stream`, plus
+
+        <name>_mean_stderr
+            Standard error of ``<name>_mean``, for each variable in `mean`.
+        <name>_freq_stderr
+            Standard error of the frequency of each value of ``<name>``, for each
+            variable in `counts`. The frequency is estimated as
+            ``(count + 1) / (roll_size + 2)``, so that a value which has been
+            observed in all or none of the rolls doesn't prematurely converge.
+
+        and the attributes
+
+        roll_size
+            Total number of rolls.
+        stderr
+            Achieved standard error, which is the maximum of all the
+            ``*_stderr`` variables.
+        converged
+            True if `target_stderr` has been reached; False if the simulation
+            was stopped by `max_roll_size`.
+
+    **Example:**
+
+    .. only:: doctest
+
+        >>> from pathfinder2e_stats import Damage, check, damage, seed
+        >>> seed(0)
+
+    Measure the mean damage of a Longsword (+8 to hit, 1d8+4 damage) against AC17
+    to within ±0.01 damage (standard error):
+
+    >>> def strike():
+    ...     return damage(check(8, DC=17), Damage("slashing", 1, 8, 4))
+    >>> res = converge(strike, 0.01, mean=["total_damage"], chunk_size=100_000)
+    >>> res.roll_size, res.converged
+    (400000, True)
+    >>> res.total_damage_mean.round(2).item()
+    5.96
+    >>> res.total_damage_mean_stderr.round(4).item()
+    0.0093
+    """
+    if not mean and not counts:
+        raise ValueError("At least one of mean or counts must be specified")
+    if chunk_size is None:
+        chunk_size = get_config()["roll_size"]
+    if chunk_size < 1 or max_roll_size < 1:
+        raise ValueError("chunk_size and max_roll_size must be positive")
+
+    acc = _Accumulator()
+    draw = _config.__dict__.get("counter_draw", 0)
+    while True:
+        n = min(chunk_size, max_roll_size - acc.n)
+        acc.update(_run_chunk(func, n, acc.n, draw))
+        stderr = acc.stderr(mean=mean, counts=counts)
+        achieved = max(float(v.max()) for v in stderr.values())
+        if achieved <= target_stderr or acc.n >= max_roll_size:
+            break
+
+    out = acc.result()
+    out.update(stderr)
+    out.attrs["stderr"] = achieved
+    out.attrs["converged"] = achieved <= target_stderr
+    return out
+
+
+def _run_chunk(
+    func: Callable[[], DataArray | Dataset], roll_size: int, roll_start: int, draw: int
+) -> Dataset:
+    """Call func with the roll_size and roll_offset config options temporarily set.
+    Replay the draws of the counter-based random number generator from `draw`,
+    so that the chunks match a single call to func when ``counter_rng`` is set.
+    """
+    config = get_config()
+    orig_roll_size = config["roll_size"]
+    orig_roll_offset = config["roll_offset"]
+    set_config(roll_size=roll_size, roll_offset=orig_roll_offset + roll_start)
+    _config.counter_draw = draw
+    try:
+        chunk = func()
+    finally:
+        set_config(roll_size=orig_roll_size, roll_offset=orig_roll_offset)
+    if isinstance(chunk, DataArray):
+        chunk = chunk.to_dataset(name=chunk.name if chunk.name is not None else "value")
+    return chunk
+
+
+def _reduce_chunks(
+    func: Callable[..., Dataset],
+    args: Sequence[Any],
+    kwargs: Mapping[str, Any],
+    *,
+    accumulate: Callable[[dict[Hashable, Any], Dataset], dict[Hashable, Any]],
+    chunk_elements: int,
+    roll_size: int | None = None,
+) -> tuple[Dataset, dict[Hashable, Any]]:
+    """Call ``func(*args, **kwargs)`` on consecutive chunks of the ``roll``
+    dimension, slicing all the parameters with the ``roll`` dimension accordingly,
+    and fold the outputs with ``totals = accumulate(totals, chunk)``.
+
+    The first chunk is small and is used to measure how many elements each roll
+    produces; the following ones are sized so that the largest variable holds about
+    `chunk_elements` elements.
+
+    :param roll_size:
+        Total number of rolls. Default: the ``roll_size`` config option.
+    :returns:
+        Tuple of (output of the first chunk, final totals)
+    """
+    if roll_size is None:
+        roll_size = get_config()["roll_size"]
+    draw = _config.__dict__.get("counter_draw", 0)
+    first: Dataset | None = None
+    totals: dict[Hashable, Any] = {}
+    start = 0
+    chunk_size = min(roll_size, 1024)
+    while start < roll_size:
+        n = min(chunk_size, roll_size - start)
+        chunk_args = [_slice_rolls(v, start, start + n, roll_size) for v in args]
+        chunk_kwargs = {
+            k: _slice_rolls(v, start, start + n, roll_size) for k, v in kwargs.items()
+        }
+        chunk = _run_chunk(
+            lambda: func(*chunk_args, **chunk_kwargs),  # noqa: B023
+            n,
+            start,
+            draw,
+        )
+        totals = accumulate(totals, chunk)
+        if first is None:
+            first = chunk
+            per_roll = max(v.size for v in chunk.data_vars.values()) // n
+            chunk_size = max(1, chunk_elements // max(1, per_roll))
+        start += n
+
+    assert first is not None
+    return first, totals
+
+
+class _Accumulator:
+    """Online mean, variance, and histograms along the ``roll`` dimension.
+
+    Mean and variance of chunks are merged with the parallel algorithm by
+    Chan, Golub, and LeVeque.
+    """
+
+    n: int
+    first: Dataset | None
+    mean: dict[Hashable, DataArray]
+    m2: dict[Hashable, DataArray]
+    counts: dict[Hashable, DataArray]
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.first = None
+        self.mean = {}
+        self.m2 = {}
+        self.counts = {}
+
+    def update(self, chunk: Dataset) -> None:
+        if self.first is None:
+            self.first = chunk.drop_vars(
+                [k for k, v in chunk.variables.items() if "roll" in v.dims]
+            )
+        n = chunk.sizes["roll"]
+        total = self.n + n
+        for k, v in chunk.data_vars.items():
+            if "roll" not in v.dims or v.dtype.kind not in "iubf":
+                continue
+            mean = v.mean("roll", dtype=float)
+            m2 = ((v - mean) ** 2).sum("roll")
+            if k in self.mean:
+                delta = mean - self.mean[k]
+                self.mean[k] = self.mean[k] + delta * (n / total)
+                self.m2[k] = self.m2[k] + m2 + delta**2 * (self.n * n / total)
+            else:
+                self.mean[k] = mean
+                self.m2[k] = m2
+
+            if v.dtype.kind in "iu":
+                counts = _bincount(v, "roll", new_dim=k)
+                if k in self.counts:
+                    prev, counts = xarray.align(
+                        self.counts[k], counts, join="outer", fill_value=0
+                    )
+                    counts = prev + counts
+                self.counts[k] = counts
+        self.n = total
+
+    def stderr(
+        self, *, mean: Collection[Hashable], counts: Collection[Hashable]
+    ) -> dict[Hashable, DataArray]:
+        """Standard error of the mean of the variables in `mean` and of the
+        frequency of each value of the variables in `counts`.
+        """
+        for names, valid in ((mean, self.mean), (counts, self.counts)):
+            for k in names:
+                if k not in valid:
+                    raise ValueError(
+                        f"{k!r} is not a variable along the roll dimension with "
+                        "a suitable dtype"
+                    )
+
+        out: dict[Hashable, DataArray] = {}
+        for k in mean:
+            out[f"{k}_mean_stderr"] = (self.m2[k] / self.n / self.n) ** 0.5
+        for k in counts:
+            # Add-one smoothing, so that values observed in all or none of the
+            # rolls so far don't have a standard error of zero
+            freq = (self.counts[k] + 1) / (self.n + 2)
+            out[f"{k}_freq_stderr"] = (freq * (1 - freq) / self.n) ** 0.5
+        return out
+
+    def result(self) -> Dataset:
+        assert self.first is not None
+        out = self.first.copy()
+        for k, mean in self.mean.items():
+            out[f"{k}_mean"] = mean
+            out[f"{k}_var"] = self.m2[k] / self.n
+        for k, counts in self.counts.items():
+            out[f"{k}_counts"] = counts
+        out.attrs["roll_size"] = self.n
+        return out
@@ -41,6 +41,47 @@ def test_value_counts(transpose, normalize):
         assert_equal(expect, actual)
 
 
+@pytest.mark.parametrize(
+    "dtype,lo,hi",
+    [
+        (np.int8, -2, 3),
+        (np.uint16, 0, 40),
+        (np.int64, -(2**40), -(2**40) + 10),
+        (np.int64, 0, 10**9),  # Wide range; not eligible for bincount
+        (bool, 0, 2),
+        (np.float64, 0, 5),
+    ],
+)
+def test_value_counts_fast_path(dtype, lo, hi):
+    """Small-range integers are counted with np.bincount; the result is the same"""
+    rng = np.random.default_rng(0)
+    a = xarray.DataArray(
+        rng.integers(lo, hi, size=(3, 2, 50)).astype(dtype),
+        dims=["x", "y", "roll"],
+        coords={"x": [10, 20, 30]},
+        name="foo",
+        attrs={"foo": "bar"},
+    )
+    # Value that only occurs in one row
+    a[0, 0, 0] = lo + 1
+
+    actual = a.value_counts("roll", new_dim="v")
+    unique_values = np.unique(a.values)
+    expect = xarray.DataArray(
+        [
+            [[(row == v).sum() for v in unique_values] for row in plane]
+            for plane in a.values
+        ],
+        dims=["x", "y", "v"],
+        coords={"x": [10, 20, 30], "v": unique_values},
+        name="foo",
+        attrs={"foo": "bar"},
+    )
+    xarray.testing.assert_identical(actual.drop_vars("v"), expect.drop_vars("v"))
+    assert actual.v.dtype == a.dtype
+    np.testing.assert_array_equal(actual.v, unique_values)
+
+
 def test_display_accessor(monkeypatch):
     html = []
 
@@ -1,9 +1,13 @@
+import inspect
 import warnings
 from types import ModuleType
 
 import pytest
+from xarray import DataArray
+from xarray.testing import assert_identical
 
 from pathfinder2e_stats import Damage, DamageList, DoS, ExpandedDamage, armory, tables
+from pathfinder2e_stats.damage_spec import _split_array_spec
 
 mods = [
     mod
@@ -437,6 +441,42 @@ def test_auto_upgrades():
             assert len(types) == expect, level
 
 
+@pytest.mark.parametrize(
+    "func,kwargs",
+    [
+        pytest.param(getattr(mod, name), kwargs, id=f"{mod.__name__}.{name}{kwargs}")
+        for mod in mods
+        for name in mod.__all__
+        if {"level", "rank"} & set(inspect.signature(getattr(mod, name)).parameters)
+        for kwargs in (
+            [{}, {"dedication": True}]
+            if "dedication" in inspect.signature(getattr(mod, name)).parameters
+            else [{}]
+        )
+    ],
+)
+def test_array_level_rank(func, kwargs):
+    """Armory functions accept a DataArray of levels or ranks and return an
+    array-valued damage spec, identical at every point to the scalar one.
+    """
+    params = inspect.signature(func).parameters
+    name = "level" if "level" in params else "rank"
+    # Start from the default, e.g. the lowest rank of a spell
+    values = list(range(params[name].default, 21 if name == "level" else 11))
+
+    arr = DataArray(values, dims=[name], coords={name: values})
+    original = arr.copy()
+    spec = ExpandedDamage(func(**{name: arr}, **kwargs))
+    # The input array is not modified in place
+    assert_identical(arr, original)
+    split = _split_array_spec(spec)
+    for i, v in enumerate(values):
+        # Some specs don't depend on level, e.g. with dedication=True
+        actual = spec if split is None else split[0][split[1][i].item()]
+        expect = ExpandedDamage(func(**{name: v}, **kwargs))
+        assert actual.simplify() == expect.simplify(), v
+
+
 def test_deprecations_class_features():
     """Functions moved in 0.2.0"""
     with pytest.raises(AttributeError):
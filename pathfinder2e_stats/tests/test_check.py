@@ -1,9 +1,28 @@
+import importlib
+
 import numpy as np
 import pytest
+import xarray
 from xarray import DataArray
-from xarray.testing import assert_equal
-
-from pathfinder2e_stats import DoS, check, map_outcome, outcome_counts, set_config
+from xarray.testing import assert_allclose, assert_equal
+
+from pathfinder2e_stats import (
+    Damage,
+    DoS,
+    check,
+    damage,
+    get_config,
+    map_outcome,
+    outcome_counts,
+    seed,
+    set_config,
+)
+from pathfinder2e_stats.check import (
+    _map_outcome_rules,
+    _natural_to_outcome,
+    _natural_to_outcome_slow,
+    _outcome_probability,
+)
 
 
 def test_DoS_str():
@@ -177,6 +196,62 @@ def test_map_outcome_sequence():
     )
 
 
+@pytest.mark.parametrize("dtype", [np.int8, np.int64])
+@pytest.mark.parametrize("map_", [None, {DoS.success: "hit", 2: "crit"}])
+@pytest.mark.parametrize("primary_target", [False, True])
+def test_map_outcome_lut(dtype, map_, primary_target):
+    """The lookup table produces the same output as applying each rule in turn"""
+    rng = np.random.default_rng(0)
+    outcome = DataArray(
+        rng.integers(-2, 3, size=(100, 3)).astype(dtype), dims=["roll", "x"]
+    )
+    kwargs = {
+        "evasion": DataArray([False, True], dims=["e"]),
+        "incapacitation": DataArray([-1, 0, 1], dims=["x"]),
+        "allow_critical_failure": DataArray([False, True], dims=["acf"]),
+        "allow_failure": True,
+        "allow_critical_success": False,
+        "primary_target": (
+            DataArray(rng.integers(-1, 3, size=100), dims=["roll"])
+            if primary_target
+            else None
+        ),
+    }
+    expect = _map_outcome_rules(outcome, map_, **kwargs)
+    actual = map_outcome(outcome, map_, **kwargs)
+    xarray.testing.assert_identical(actual, expect)
+
+
+@pytest.mark.parametrize("primary_target", [False, True])
+def test_map_outcome_out_of_range(primary_target):
+    """Integers outside of [no_roll, critical_success], e.g. from chaining after an
+    integer map_, are clipped like when applying each rule in turn
+    """
+    x = DataArray([-2, -1, 0, 1, 2, 3, 5, -3])
+    assert_equal(
+        map_outcome(x, evasion=True),
+        DataArray([-2, -1, 0, 2, 2, 2, 2, -1]),
+    )
+
+    rng = np.random.default_rng(0)
+    outcome = DataArray(rng.integers(-10, 11, size=(100, 3)), dims=["roll", "x"])
+    kwargs = {
+        "evasion": DataArray([False, True], dims=["e"]),
+        "incapacitation": DataArray([-1, 0, 1], dims=["x"]),
+        "allow_critical_failure": DataArray([False, True], dims=["acf"]),
+        "primary_target": (
+            DataArray(rng.integers(-1, 3, size=100), dims=["roll"])
+            if primary_target
+            else None
+        ),
+    }
+    expect = _map_outcome_rules(
+        outcome, None, **kwargs, allow_failure=True, allow_critical_success=True
+    )
+    actual = map_outcome(outcome, **kwargs)
+    xarray.testing.assert_identical(actual, expect)
+
+
 def test_check_basic():
     ds = check(DC=7)
     assert ds.bonus == 0
@@ -263,6 +338,29 @@ def test_check_keen():
     assert np.unique(ds.outcome).tolist() == [-1, 0, 1, 2]
 
 
+@pytest.mark.parametrize("compact_dtypes", [False, True])
+def test_natural_to_outcome_lut(compact_dtypes):
+    """The lookup table matches the rules of the game for any bonus and DC"""
+    set_config(compact_dtypes=compact_dtypes)
+    natural = DataArray(np.arange(1, 21), dims=["natural"])
+    bonus = DataArray(np.arange(-50, 51), dims=["bonus"])
+    DC = DataArray([0, 7, 100], dims=["DC"])
+    keen = DataArray([False, True], dims=["keen"])
+    expect = _natural_to_outcome_slow(natural, bonus, DC, keen)
+    actual = _natural_to_outcome(natural, bonus, DC, keen)
+    xarray.testing.assert_identical(actual, expect)
+
+    # Scalar keen
+    expect = _natural_to_outcome_slow(natural, bonus, DC, True)
+    actual = _natural_to_outcome(natural, bonus, DC, True)
+    xarray.testing.assert_identical(actual, expect)
+
+    # Non-integer bonus
+    expect = _natural_to_outcome_slow(natural, bonus + 0.5, 10, False)
+    actual = _natural_to_outcome(natural, bonus + 0.5, 10, False)
+    xarray.testing.assert_identical(actual, expect)
+
+
 def test_check_keen_array_coord():
     keen = DataArray([False, True], dims=["keen"])
     r = check(DC=11, keen=keen, dependent_dims=["keen"])
@@ -482,7 +580,9 @@ def test_perfected_form_with_fortune():
     assert ds.outcome.max() == DoS.critical_success
 
 
-def test_perfected_form_with_hero_point():
+@pytest.mark.parametrize("lazy_rerolls", [False, True])
+def test_perfected_form_with_hero_point(lazy_rerolls):
+    set_config(lazy_rerolls=lazy_rerolls)
     # Don't use HP when Perfected Form is enough to get the outcome you want.
     ds = check(+10, DC=20, perfected_form=True, hero_point=DoS.failure)
     assert ds.outcome.min() == DoS.success
@@ -496,7 +596,71 @@ def test_perfected_form_with_hero_point():
     assert ds.use_hero_point.any()
 
 
-def test_hero_point_with_fortune_array():
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"hero_point": DoS.failure},
+        {"hero_point": DoS.critical_failure, "misfortune": True},
+        {"perfected_form": True},
+        {"perfected_form": True, "hero_point": DoS.success, "keen": True},
+    ],
+)
+def test_lazy_rerolls(kwargs):
+    set_config(roll_size=100_000, lazy_rerolls=True)
+    bonus = DataArray([0, 10], dims=["x"])
+    ds = check(bonus, DC=20, independent_dims=["x"], **kwargs)
+    assert "hp_reroll" not in ds.dims
+    assert ds.natural.dims == ("roll", "x")
+    assert ds.outcome.dims == ("roll", "x")
+
+    expect = check(bonus, DC=20, **kwargs, mode="exact")
+    assert_allclose(outcome_counts(ds), expect.probability, atol=0.01)
+    if "hero_point" in kwargs:
+        assert ds.use_hero_point.mean("roll").values == pytest.approx(
+            expect.use_hero_point.values, abs=0.01
+        )
+        # The hero point is used whenever the first outcome is bad enough
+        assert ((ds.outcome > kwargs["hero_point"]) | ds.use_hero_point).all()
+
+
+def test_lazy_rerolls_draws(monkeypatch):
+    """The hero point is only rerolled where it's used"""
+    dice_mod = importlib.import_module("pathfinder2e_stats.dice")
+    calls = []
+
+    def plain_d20(*args):
+        # The roll_size config option is not tampered with
+        assert get_config()["roll_size"] == 10_000
+        out = orig_plain_d20(*args)
+        calls.append(out.sizes["roll"])
+        return out
+
+    orig_plain_d20 = dice_mod._plain_d20
+    monkeypatch.setattr(dice_mod, "_plain_d20", plain_d20)
+    set_config(roll_size=10_000, lazy_rerolls=True)
+    ds = check(10, DC=20, hero_point=DoS.critical_failure)
+    assert calls == [10_000, int(ds.use_hero_point.sum())]
+    assert 0.04 < calls[1] / 10_000 < 0.06
+
+
+def test_lazy_rerolls_counter_rng():
+    """With counter_rng, the hero point rerolls don't depend on chunking"""
+    set_config(roll_size=3000, counter_rng=True, lazy_rerolls=True)
+    kwargs = {"bonus": 5, "DC": 20, "hero_point": DoS.failure}
+    seed(0)
+    expect = check(**kwargs)
+    seed(0)
+    set_config(threads=3)
+    actual = check(**kwargs)
+    assert_equal(actual, expect)
+    seed(0)
+    counts = check(**kwargs, mode="counts")
+    assert_allclose(counts.probability, _outcome_probability(expect))
+
+
+@pytest.mark.parametrize("lazy_rerolls", [False, True])
+def test_hero_point_with_fortune_array(lazy_rerolls):
+    set_config(lazy_rerolls=lazy_rerolls)
     hero_point = DataArray(
         [-2, -1, 0, 1, 2], dims=["hp"], coords={"hp": [-2, -1, 0, 1, 2]}
     )
@@ -519,8 +683,10 @@ def test_hero_point_with_fortune_array():
     assert ds.use_hero_point.sel(hp=2, f=False).all()
 
 
-def test_perfected_form_with_fortune_array():
-    set_config(roll_size=2000)  # With fortune there's a 1/400 chance of crit fail
+@pytest.mark.parametrize("lazy_rerolls", [False, True])
+def test_perfected_form_with_fortune_array(lazy_rerolls):
+    # With fortune there's a 1/400 chance of crit fail
+    set_config(roll_size=2000, lazy_rerolls=lazy_rerolls)
     pf = DataArray([False, True], dims=["pf"])
     fortune = DataArray([False, True], dims=["f"])
     ds = check(
@@ -647,3 +813,243 @@ def test_outcome_counts_extra_dims():
 
     oc2 = outcome_counts(c, dim="foo", new_dim="baz")
     assert oc2.dims == ("roll", "bar", "baz")
+
+
+def test_check_exact():
+    ds = check(DC=7, mode="exact")
+    assert list(ds) == ["bonus", "DC", "probability"]
+    assert ds.sizes == {"outcome": 4}
+    assert ds.outcome.values.tolist() == [
+        "Critical success",
+        "Success",
+        "Failure",
+        "Critical failure",
+    ]
+    np.testing.assert_allclose(ds.probability, [0.2, 0.5, 0.25, 0.05])
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"bonus": 10, "DC": 25},
+        {"bonus": 10, "DC": 30},
+        {"bonus": 10, "DC": 0},
+        {"bonus": 10, "DC": 25, "keen": True},
+        {"bonus": 5, "DC": 20, "fortune": True},
+        {"bonus": 5, "DC": 20, "misfortune": True},
+        {"bonus": 5, "DC": 20, "fortune": True, "misfortune": True},
+        {"bonus": 5, "DC": 20, "hero_point": DoS.failure},
+        {"bonus": 5, "DC": 20, "hero_point": DoS.failure, "misfortune": True},
+        {"bonus": 5, "DC": 20, "hero_point": DoS.failure, "fortune": True},
+        {"bonus": 10, "DC": 20, "perfected_form": True},
+        {"bonus": 10, "DC": 20, "perfected_form": True, "hero_point": DoS.success},
+        {"bonus": 10, "DC": 20, "perfected_form": True, "fortune": True},
+        {"bonus": 10, "DC": 20, "evasion": True},
+        {"bonus": 10, "DC": 20, "incapacitation": True},
+        {"bonus": 10, "DC": 20, "incapacitation": -1},
+        {"bonus": 10, "DC": 20, "allow_critical_failure": False},
+        {"bonus": 10, "DC": 20, "allow_failure": False},
+        {"bonus": 10, "DC": 20, "allow_critical_success": False},
+    ],
+)
+def test_check_exact_vs_roll(kwargs):
+    set_config(roll_size=100_000)
+    expect = outcome_counts(check(**kwargs))
+    actual = outcome_counts(check(**kwargs, mode="exact"))
+    actual = actual.sel(outcome=expect.outcome)
+    np.testing.assert_allclose(actual, expect, atol=0.005)
+    assert actual.sum() == pytest.approx(1)
+    assert expect.sum() == pytest.approx(1)
+
+
+def test_check_exact_hero_point():
+    ds = check(5, DC=20, hero_point=DoS.failure, mode="exact")
+    assert ds.use_hero_point.item() == pytest.approx(0.7)
+
+    ds = check(5, DC=20, hero_point=DoS.failure, fortune=True, mode="exact")
+    assert ds.use_hero_point.item() == 0
+
+
+def test_check_exact_map_outcome():
+    ds = check(DC=7, evasion=True, allow_critical_failure=False, mode="exact")
+    assert ds.evasion.item() is True
+    np.testing.assert_allclose(ds.original_probability, [0.2, 0.5, 0.25, 0.05])
+    np.testing.assert_allclose(ds.probability, [0.7, 0, 0.3, 0])
+
+    assert_equal(map_outcome(ds), ds)
+    assert_equal(
+        map_outcome(check(DC=7, mode="exact"), evasion=True).probability,
+        check(DC=7, evasion=True, mode="exact").probability,
+    )
+    with pytest.raises(ValueError, match="Bespoke mappings"):
+        map_outcome(ds, {DoS.success: 1})
+
+
+def test_check_exact_array_input():
+    bonus = DataArray([3, 5], dims=["PC"], coords={"PC": ["Alice", "Bob"]})
+    DC = DataArray([15, 16, 17], dims=["monster"])
+    fortune = DataArray([False, True], dims=["f"])
+    ds = check(bonus, DC=DC, fortune=fortune, mode="exact")
+    assert ds.probability.sizes == {"PC": 2, "monster": 3, "f": 2, "outcome": 4}
+    np.testing.assert_allclose(ds.probability.sum("outcome"), 1)
+    for pc in range(2):
+        for monster in range(3):
+            for f in range(2):
+                expect = check(
+                    bonus.values[pc],
+                    DC=DC.values[monster],
+                    fortune=bool(fortune.values[f]),
+                    mode="exact",
+                ).probability
+                actual = ds.probability.isel(PC=pc, monster=monster, f=f, drop=True)
+                assert_equal(actual, expect)
+
+
+def test_check_exact_primary_target():
+    pt = check(7, DC=18, mode="exact")
+    p_hit = pt.probability.sel(outcome=["Critical success", "Success"]).sum().item()
+    ds = check(5, DC=17, primary_target=pt, mode="exact")
+    assert_equal(ds.primary_target, pt.probability)
+    orig = ds.original_probability
+    np.testing.assert_allclose(
+        ds.probability,
+        [
+            orig.sel(outcome="Critical success"),
+            orig.sel(outcome="Success") * (1 - p_hit),
+            orig.sel(outcome="Failure") + orig.sel(outcome="Success") * p_hit,
+            orig.sel(outcome="Critical failure"),
+        ],
+    )
+
+    # Rolled primary target
+    set_config(roll_size=100_000)
+    ds2 = check(5, DC=17, primary_target=check(7, DC=18), mode="exact")
+    np.testing.assert_allclose(ds2.probability, ds.probability, atol=0.005)
+
+
+def test_check_exact_outcome_counts():
+    ds = check(DC=7, mode="exact")
+    oc = outcome_counts(ds, new_dim="foo")
+    assert oc.name == "outcome"
+    assert oc.dims == ("foo",)
+    np.testing.assert_allclose(oc, [0.2, 0.5, 0.25, 0.05])
+    with pytest.raises(ValueError, match="normalize=True"):
+        outcome_counts(ds, normalize=False)
+
+
+def test_check_bad_mode():
+    with pytest.raises(ValueError, match="mode"):
+        check(DC=7, mode="foo")
+
+
+def test_check_compact_dtypes():
+    set_config(compact_dtypes=True)
+    actual = check(
+        DataArray([5, 10], dims=["x"]),
+        DC=20,
+        independent_dims=["x"],
+        evasion=True,
+        incapacitation=True,
+        hero_point=DoS.failure,
+    )
+    assert actual.natural.dtype == np.int8
+    assert actual.original_outcome.dtype == np.int8
+    assert actual.outcome.dtype == np.int8
+    assert actual.outcome.min() >= DoS.critical_failure
+    assert actual.outcome.max() <= DoS.critical_success
+    assert outcome_counts(actual).sum("outcome").values.tolist() == [1, 1]
+
+
+def test_check_stratified():
+    """With stratified sampling, the outcome frequencies are exact"""
+    set_config(stratified_d20=True)
+    bonus = DataArray([0, 5, 10, 15], dims=["x"])
+    actual = outcome_counts(check(bonus, DC=20, independent_dims=["x"]))
+    expect = check(bonus, DC=20, mode="exact").probability
+    np.testing.assert_allclose(actual.transpose(*expect.dims), expect, atol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"bonus": 10, "DC": 20},
+        {"bonus": 5, "DC": 20, "hero_point": DoS.failure, "misfortune": True},
+        {"bonus": 10, "DC": 20, "perfected_form": True, "evasion": True},
+    ],
+)
+def test_check_counts_vs_roll(kwargs):
+    """With counter_rng, counts are identical to counting the rolled outcomes"""
+    set_config(counter_rng=True, roll_size=5000)
+    seed(0)
+    rolled = check(**kwargs)
+    seed(0)
+    actual = check(**kwargs, mode="counts")
+    assert_allclose(actual.probability, _outcome_probability(rolled))
+    if "original_outcome" in rolled:
+        assert_allclose(
+            actual.original_probability,
+            _outcome_probability(rolled.original_outcome),
+        )
+    if "use_hero_point" in rolled:
+        assert actual.use_hero_point == pytest.approx(rolled.use_hero_point.mean())
+    for name, v in actual.variables.items():
+        assert "roll" not in v.dims, name
+
+
+def test_check_counts_vs_exact():
+    set_config(roll_size=100_000)
+    bonus = DataArray([5, 10], dims=["x"])
+    fortune = DataArray([False, True], dims=["f"])
+    kwargs = {"DC": 20, "fortune": fortune, "hero_point": DoS.failure, "evasion": True}
+    expect = check(bonus, **kwargs, mode="exact")
+    actual = check(
+        bonus, **kwargs, independent_dims=["x"], dependent_dims=["f"], mode="counts"
+    )
+    assert list(actual.data_vars) == list(expect.data_vars)
+    assert actual.sizes == expect.sizes
+    assert_allclose(actual, expect, atol=0.005)
+    np.testing.assert_allclose(outcome_counts(actual).sum("outcome"), 1)
+
+
+def test_check_counts_chunks(monkeypatch):
+    """The rolls are processed in chunks"""
+    # Note: pathfinder2e_stats.check is the function, not the module
+    check_mod = importlib.import_module("pathfinder2e_stats.check")
+    monkeypatch.setattr(check_mod, "_COUNTS_CHUNK_ELEMENTS", 1000)
+    set_config(counter_rng=True, roll_size=5000)
+    calls = []
+    orig_accumulate = check_mod._accumulate_counts
+
+    def accumulate(totals, chunk):
+        calls.append(chunk.sizes["roll"])
+        return orig_accumulate(totals, chunk)
+
+    monkeypatch.setattr(check_mod, "_accumulate_counts", accumulate)
+    bonus = DataArray([0, 5, 10, 15], dims=["x"])
+    seed(0)
+    actual = check(bonus, DC=20, independent_dims=["x"], mode="counts")
+    # First chunk is 1024 rolls x 4 points; the others are 1000 / 4 rolls
+    assert calls == [1024] + [250] * 15 + [226]
+    seed(0)
+    expect = _outcome_probability(check(bonus, DC=20, independent_dims=["x"]))
+    assert_allclose(actual.probability, expect)
+
+
+def test_check_counts_primary_target():
+    set_config(counter_rng=True, roll_size=3000)
+    seed(0)
+    pt = check(7, DC=18)
+    expect = _outcome_probability(check(5, DC=17, primary_target=pt))
+    seed(0)
+    check(7, DC=18)
+    actual = check(5, DC=17, primary_target=pt, mode="counts")
+    assert_allclose(actual.probability, expect)
+
+
+def test_check_counts_damage_exact():
+    """The output of mode="counts" can be fed to damage(mode="exact")"""
+    set_config(roll_size=100_000)
+    spec = Damage("fire", 2, 6)
+    expect = damage(check(10, DC=20, mode="exact"), spec, mode="exact")
+    actual = damage(check(10, DC=20, mode="counts"), spec, mode="exact")
+    np.testing.assert_allclose(actual.total_damage, expect.total_damage, atol=0.005)
@@ -1,9 +1,21 @@
 import multiprocessing
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import numpy as np
 import pytest
+from xarray import DataArray
+from xarray.testing import assert_equal
 
-from pathfinder2e_stats import get_config, roll, seed, set_config
+from pathfinder2e_stats import (
+    Damage,
+    check,
+    d20,
+    damage,
+    get_config,
+    roll,
+    seed,
+    set_config,
+)
 
 
 def assert_seed0():
@@ -63,6 +75,15 @@ def test_get_config():
         "check_independent_dims": set(),
         "damage_dependent_dims": set(),
         "damage_independent_dims": set(),
+        "compact_dtypes": False,
+        "dice_sampler": "dice",
+        "stratified_d20": False,
+        "counter_rng": False,
+        "roll_offset": 0,
+        "threads": 1,
+        "backend": "numpy",
+        "dask_chunk_size": 100_000,
+        "lazy_rerolls": False,
     }
 
 
@@ -101,3 +122,64 @@ def test_thread_local_config():
         future = executor.submit(set_config, roll_size=789)
         future.result()
         assert get_config()["roll_size"] == 456
+
+
+def counter_rng_worker(roll_offset, roll_size):
+    seed(123)
+    set_config(counter_rng=True, roll_offset=roll_offset, roll_size=roll_size)
+    bonus = DataArray([5, 10, 15], dims=["target"])
+    return damage(
+        check(bonus, DC=20, independent_dims=["target"]),
+        Damage("fire", 2, 6, 3),
+        independent_dims=["target"],
+    ).total_damage
+
+
+def test_counter_rng():
+    set_config(counter_rng=True)
+    seed(0)
+    a = roll(1, 100)
+    b = roll(1, 100)
+    assert not (a == b).all()
+    seed(0)
+    assert_equal(roll(1, 100), a)
+    assert_equal(roll(1, 100), b)
+    assert 1 <= a.min() <= a.max() <= 100
+    # Counter-based generator doesn't consume the global one
+    set_config(counter_rng=False)
+    assert_seed0()
+
+
+@pytest.mark.parametrize("sampler", ["dice", "cdf"])
+@pytest.mark.parametrize("stratified_d20", [False, True])
+def test_counter_rng_chunks(sampler, stratified_d20):
+    set_config(dice_sampler=sampler, stratified_d20=stratified_d20)
+    expect = counter_rng_worker(0, 1000)
+    chunks = [counter_rng_worker(start, 333) for start in (0, 333, 666)]
+    chunks.append(counter_rng_worker(999, 1))
+    actual = np.concatenate([chunk.values for chunk in chunks])
+    np.testing.assert_array_equal(actual, expect.values)
+
+
+def test_counter_rng_stratified():
+    set_config(counter_rng=True, stratified_d20=True, roll_size=40, roll_offset=10)
+    a = d20(dims={"x": 2})
+    for i in range(2):
+        np.testing.assert_array_equal(np.sort(a[10:30, i].values), np.arange(1, 21))
+
+
+@pytest.mark.thread_unsafe(reason="threading test")
+def test_counter_rng_multiprocessing():
+    expect = counter_rng_worker(0, 1000)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(2, mp_context=ctx) as executor:
+        futures = [
+            executor.submit(counter_rng_worker, start, 500) for start in (0, 500)
+        ]
+        actual = np.concatenate([f.result().values for f in futures])
+    np.testing.assert_array_equal(actual, expect.values)
+
+
+def test_roll_offset_validation():
+    with pytest.raises(ValueError, match="roll_offset"):
+        set_config(roll_offset=-1)
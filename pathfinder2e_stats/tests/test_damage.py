@@ -1,10 +1,31 @@
+import tracemalloc
+
 import numpy as np
 import pytest
 import xarray
 from xarray import DataArray
-from xarray.testing import assert_equal
-
-from pathfinder2e_stats import Damage, DoS, check, damage, set_config
+from xarray.testing import assert_allclose, assert_equal
+
+from pathfinder2e_stats import (
+    Damage,
+    DoS,
+    armory,
+    check,
+    damage,
+    damage_many,
+    damage_pmf,
+    seed,
+    set_config,
+    tables,
+)
+from pathfinder2e_stats.check import _outcome_probability
+from pathfinder2e_stats.config import _config
+from pathfinder2e_stats.damage import (
+    _compile_damage,
+    _persistent_pmf,
+    _roll_damage,
+)
+from pathfinder2e_stats.damage_spec import ExpandedDamage, _split_array_spec
 
 
 def test_damage_simple():
@@ -641,3 +662,766 @@ def test_null_damage():
     assert actual.total_damage.shape == (1000,)
     assert actual.total_damage.dtype.kind == "i"
     assert (actual.total_damage == 0).all()
+
+
+def test_damage_pmf():
+    actual = damage_pmf(
+        Damage("fire", 1, 4, basic_save=True) + Damage("piercing", 1, 6, fatal=10)
+    )
+    assert actual.dims == ("outcome", "damage_type", "damage")
+    assert actual.outcome.values.tolist() == [
+        "Critical success",
+        "Success",
+        "Failure",
+        "Critical failure",
+    ]
+    assert actual.damage_type.values.tolist() == ["fire", "piercing"]
+    np.testing.assert_allclose(actual.sum("damage"), 1)
+
+    # Halved damage is rounded down, but can't be reduced below 1
+    fire = actual.sel(damage_type="fire")
+    assert fire.sel(outcome="Success").values[:3].tolist() == [0, 0.75, 0.25]
+    # Doubled damage can only be even
+    np.testing.assert_allclose(
+        fire.sel(outcome="Critical failure").values[:9],
+        [0, 0, 0.25, 0, 0.25, 0, 0.25, 0, 0.25],
+    )
+    # No damage of a type for an outcome
+    assert fire.sel(outcome="Critical success", damage=0) == 1
+
+    # Fatal: the base dice are upgraded, doubled, and one extra die is added
+    piercing = actual.sel(damage_type="piercing", outcome="Critical success")
+    assert piercing.damage[piercing > 0].min() == 2 + 1
+    assert piercing.damage[piercing > 0].max() == 20 + 10
+
+
+def test_damage_pmf_same_roll():
+    """Damage that differs only by multiplier is rolled once"""
+    actual = damage_pmf(
+        {DoS.success: [Damage("fire", 1, 4), Damage("fire", 1, 4, 0, 2)]}
+    )
+    pmf = actual.sel(outcome="Success", damage_type="fire")
+    assert pmf.damage[pmf > 0].values.tolist() == [3, 6, 9, 12]
+
+
+@pytest.mark.parametrize(
+    "spec,kwargs",
+    [
+        (Damage("slashing", 2, 6, 3, deadly=8), {}),
+        (Damage("fire", 6, 6, basic_save=True), {"weaknesses": {"fire": 5}}),
+        (
+            Damage("fire", 2, 6, 2)
+            + Damage("fire", 0, 0, 3, splash=True)
+            + Damage("cold", 1, 8),
+            {
+                "weaknesses": {"fire": 2},
+                "resistances": {"cold": 3},
+                "splash_damage_targets": 3,
+            },
+        ),
+        (
+            Damage("fire", 1, 8) + Damage("acid", 1, 4, splash=True),
+            {"immunities": ["fire"], "resistances": {"acid": 1}},
+        ),
+    ],
+)
+def test_damage_exact_vs_roll(spec, kwargs):
+    set_config(roll_size=100_000)
+    bonus = DataArray([5, 10, 15], dims=["target"])
+    exact = damage(check(bonus, DC=20, mode="exact"), spec, mode="exact", **kwargs)
+    rolled = damage(
+        check(bonus, DC=20, independent_dims=["target"]),
+        spec,
+        independent_dims=["target"],
+        **kwargs,
+    )
+    assert exact.total_damage.dims == ("target", "damage")
+    np.testing.assert_allclose(exact.total_damage.sum("damage"), 1)
+
+    for k in ("direct_damage", "splash_damage", "total_damage"):
+        assert (k in exact) == (k in rolled)
+        if k not in exact:
+            continue
+        mean = (exact[k] * exact.damage).sum("damage")
+        xarray.testing.assert_allclose(
+            mean.transpose(*rolled[k].mean("roll").dims),
+            rolled[k].mean("roll"),
+            rtol=0.03,
+            atol=0.05,
+        )
+    hist = (
+        rolled.total_damage.expand_dims(damage=exact.damage.size) == exact.damage
+    ).mean("roll")
+    xarray.testing.assert_allclose(
+        hist.transpose(*exact.total_damage.dims), exact.total_damage, atol=0.01
+    )
+
+
+@pytest.mark.parametrize(
+    "spec,kwargs",
+    [
+        (Damage("slashing", 2, 6, 3, deadly=8), {}),
+        (
+            Damage("fire", 2, 6, 2)
+            + Damage("fire", 0, 0, 3, splash=True)
+            + Damage("cold", 1, 8),
+            {
+                "weaknesses": {"fire": 2},
+                "resistances": {"cold": 3},
+                "splash_damage_targets": 3,
+            },
+        ),
+        (
+            Damage("piercing", 1, 8) + Damage("bleed", 1, 6, persistent=True),
+            {"resistances": {"bleed": 2}},
+        ),
+        (
+            Damage("fire", 1, 8, persistent=True)
+            + Damage("acid", 0, 0, 2, persistent=True),
+            {
+                "persistent_damage_DC": {"fire": 10},
+                "persistent_damage_rounds": 5,
+                "immunities": ["acid"],
+            },
+        ),
+    ],
+)
+def test_damage_mean_vs_roll(spec, kwargs):
+    set_config(roll_size=100_000)
+    bonus = DataArray([5, 10, 15], dims=["target"])
+    mean = damage(check(bonus, DC=20, mode="exact"), spec, mode="mean", **kwargs)
+    rolled = damage(
+        check(bonus, DC=20, independent_dims=["target"]),
+        spec,
+        independent_dims=["target"],
+        **kwargs,
+    )
+    assert "roll" not in mean.dims
+    assert "persistent_damage_check" not in mean
+
+    for k in ("direct_damage", "splash_damage", "total_damage"):
+        assert (k in mean) == (k in rolled)
+        if k in mean:
+            xarray.testing.assert_allclose(
+                mean[k], rolled[k].mean("roll"), rtol=0.03, atol=0.05
+            )
+
+    if "persistent_damage" in rolled:
+        rolled = rolled.sel(damage_type=mean.damage_type)
+        assert mean.persistent_damage.dims == ("target", "damage_type")
+        xarray.testing.assert_allclose(
+            mean.persistent_damage,
+            rolled.persistent_damage.where(rolled.outcome >= 1)
+            .mean(["roll", "persistent_round"])
+            .fillna(0)
+            * (rolled.outcome >= 1).mean("roll"),
+            rtol=0.03,
+            atol=0.05,
+        )
+        xarray.testing.assert_allclose(
+            mean.apply_persistent_damage,
+            rolled.apply_persistent_damage.mean(["roll", "target"]),
+            atol=0.01,
+        )
+        assert_equal(mean.persistent_damage_DC, rolled.persistent_damage_DC)
+
+
+def test_damage_mean_vs_exact():
+    spec = (
+        Damage("fire", 2, 6, 2, basic_save=True)
+        + Damage("fire", 1, 4, splash=True)
+        + Damage("cold", 1, 8, 1)
+    )
+    kwargs = {
+        "resistances": {"fire": 3},
+        "weaknesses": {"cold": 2},
+        "splash_damage_targets": 4,
+    }
+    c = check(DataArray([5, 10], dims=["target"]), DC=20, mode="exact")
+    mean = damage(c, spec, mode="mean", **kwargs)
+    exact = damage(c, spec, mode="exact", **kwargs)
+    for k in ("direct_damage", "splash_damage", "total_damage"):
+        xarray.testing.assert_allclose(
+            mean[k], (exact[k] * exact.damage).sum("damage").transpose(*mean[k].dims)
+        )
+
+
+def test_damage_mean_persistent_closed_form():
+    actual = damage(
+        check(100, DC=10, mode="exact"),
+        Damage("fire", 0, 0, 1, persistent=True),
+        persistent_damage_DC=15,
+        persistent_damage_rounds=4,
+        mode="mean",
+    )
+    # The flat check succeeds on a natural 15 or higher
+    np.testing.assert_allclose(
+        actual.apply_persistent_damage.squeeze(), [1, 0.7, 0.49, 0.343]
+    )
+    # Critical success on a natural 2-20 doubles the damage
+    np.testing.assert_allclose(actual.persistent_damage.squeeze(), 0.95 * 2 + 0.05)
+    np.testing.assert_allclose(
+        actual.total_damage, (0.95 * 2 + 0.05) * (1 + 0.7 + 0.49 + 0.343)
+    )
+
+
+def test_damage_mean_null():
+    actual = damage(check(6, DC=15), {}, mode="mean")
+    assert actual.damage_type.shape == (0,)
+    assert "roll" not in actual.dims
+    assert actual.total_damage.item() == 0
+
+
+def test_damage_exact_from_rolled_check():
+    c = check(10, DC=20)
+    actual = damage(c, Damage("fire", 1, 6), mode="exact")
+    assert "roll" not in actual.dims
+    assert "natural" not in actual
+    assert "outcome" not in actual.data_vars
+    p = actual.probability
+    assert p.sel(outcome="Success").item() == pytest.approx(
+        (c.outcome == DoS.success).mean().item()
+    )
+    assert actual.total_damage.sel(damage=0) == pytest.approx(
+        p.sel(outcome=["Failure", "Critical failure"]).sum()
+    )
+
+
+def test_damage_exact_weaknesses_array():
+    weaknesses = DataArray(
+        [[0, 5]], dims=["damage_type", "target"], coords={"damage_type": ["fire"]}
+    )
+    actual = damage(
+        check(20, DC=10, mode="exact"),
+        Damage("fire", 1, 6),
+        weaknesses=weaknesses,
+        mode="exact",
+    )
+    assert actual.total_damage.dims == ("target", "damage")
+    assert actual.direct_damage.dims == ("target", "damage_type", "damage")
+    mean = (actual.total_damage * actual.damage).sum("damage").values
+    # Critical success on 2-20: 2d6 -> 7 on average; success on a natural 1
+    np.testing.assert_allclose(mean, [0.95 * 7 + 0.05 * 3.5, 0.95 * 12 + 0.05 * 8.5])
+
+
+def test_damage_exact_null():
+    actual = damage(check(6, DC=15, mode="exact"), {}, mode="exact")
+    assert actual.damage_type.shape == (0,)
+    assert "direct_damage" not in actual
+    assert actual.total_damage.values.tolist() == [1.0]
+
+
+@pytest.mark.parametrize(
+    "spec,kwargs",
+    [
+        (
+            Damage("piercing", 1, 8) + Damage("bleed", 1, 6, persistent=True),
+            {"resistances": {"bleed": 2}},
+        ),
+        (
+            Damage("fire", 1, 8, persistent=True)
+            + Damage("acid", 1, 4, persistent=True)
+            + Damage("acid", 0, 0, 1, splash=True),
+            {
+                "persistent_damage_DC": {"fire": 10},
+                "persistent_damage_rounds": 5,
+                "weaknesses": {"acid": 2},
+            },
+        ),
+    ],
+)
+def test_damage_exact_persistent_vs_roll(spec, kwargs):
+    set_config(roll_size=100_000)
+    exact = damage(check(10, DC=20, mode="exact"), spec, mode="exact", **kwargs)
+    rolled = damage(check(10, DC=20), spec, **kwargs)
+    rolled = rolled.sel(damage_type=exact.damage_type)
+    assert exact.persistent_damage.dims == ("damage_type", "damage")
+    np.testing.assert_allclose(exact.persistent_damage.sum("damage"), 1)
+    np.testing.assert_allclose(exact.total_damage.sum("damage"), 1)
+
+    xarray.testing.assert_allclose(
+        exact.apply_persistent_damage,
+        rolled.apply_persistent_damage.mean("roll"),
+        atol=0.01,
+    )
+    persistent = (rolled.persistent_damage * rolled.apply_persistent_damage).sum(
+        "persistent_round"
+    )
+    for k, v in (
+        ("persistent_damage", persistent),
+        ("total_damage", rolled.total_damage),
+    ):
+        mean = (exact[k] * exact.damage).sum("damage")
+        xarray.testing.assert_allclose(mean, v.mean("roll"), rtol=0.03, atol=0.05)
+        hist = (v.expand_dims(damage=exact.damage.size) == exact.damage).mean("roll")
+        xarray.testing.assert_allclose(
+            hist.transpose(*exact[k].dims), exact[k], atol=0.01
+        )
+
+
+def test_damage_exact_persistent_markov():
+    actual = damage(
+        check(100, DC=10, allow_critical_success=False, mode="exact"),
+        Damage("fire", 0, 0, 1, persistent=True),
+        persistent_damage_DC=15,
+        persistent_damage_rounds=4,
+        mode="exact",
+    )
+    # The flat check succeeds on a natural 15 or higher
+    np.testing.assert_allclose(
+        actual.persistent_damage.sel(damage_type="fire"),
+        [0, 0.3, 0.7 * 0.3, 0.7**2 * 0.3, 0.7**3],
+    )
+    np.testing.assert_allclose(
+        actual.apply_persistent_damage.sel(damage_type="fire"),
+        [1, 0.7, 0.7**2, 0.7**3],
+    )
+    assert_equal(
+        actual.total_damage, actual.persistent_damage.sel(damage_type="fire", drop=True)
+    )
+
+
+@pytest.mark.parametrize("rounds", [0, 1, 2, 3, 10, 33])
+@pytest.mark.parametrize("p_continue", [0, 0.3, 1])
+@pytest.mark.parametrize("size", [1, 2, 9])
+def test_persistent_pmf(rounds, p_continue, size):
+    """_persistent_pmf matches the naive round-by-round convolution"""
+    pmf = np.random.default_rng(0).random(size)
+    pmf /= pmf.sum()
+    expect = np.ones(1)
+    for _ in range(rounds):
+        expect = expect * p_continue
+        expect[0] += 1 - p_continue
+        expect = np.convolve(pmf, expect)
+    actual = _persistent_pmf(pmf, p_continue, rounds)
+    assert actual.shape == expect.shape
+    np.testing.assert_allclose(actual, expect, atol=1e-14)
+    assert (actual >= 0).all()
+
+
+def test_damage_exact_persistent_many_rounds():
+    actual = damage(
+        check(10, DC=20, mode="exact"),
+        Damage("fire", 1, 6, persistent=True),
+        persistent_damage_rounds=1000,
+        mode="exact",
+    )
+    mean = damage(
+        check(10, DC=20, mode="exact"),
+        Damage("fire", 1, 6, persistent=True),
+        persistent_damage_rounds=1000,
+        mode="mean",
+    )
+    np.testing.assert_allclose(actual.total_damage.sum(), 1)
+    np.testing.assert_allclose(
+        (actual.total_damage * actual.damage).sum(), mean.total_damage
+    )
+
+
+@pytest.mark.parametrize(
+    "spec,kwargs",
+    [
+        (Damage("slashing", 2, 6, 3, deadly=8), {}),
+        (
+            Damage("fire", 2, 6, 2)
+            + Damage("fire", 1, 4, persistent=True)
+            + Damage("acid", 0, 0, 3, splash=True),
+            {"weaknesses": {"fire": 2}, "resistances": {"acid": 1}},
+        ),
+    ],
+)
+def test_damage_counts_vs_roll(spec, kwargs):
+    """With counter_rng, counts are identical to the histogram of rolled damage"""
+    set_config(counter_rng=True, roll_size=5000)
+    bonus = DataArray([5, 10, 15], dims=["target"])
+    seed(0)
+    c = check(bonus, DC=20, independent_dims=["target"])
+    state = _config.__dict__.copy()
+    rolled = damage(c, spec, independent_dims=["target"], **kwargs)
+    _config.__dict__.update(state)
+    actual = damage(c, spec, independent_dims=["target"], mode="counts", **kwargs)
+    for name, v in actual.variables.items():
+        assert "roll" not in v.dims, name
+    assert "persistent_damage_check" not in actual
+    assert_allclose(actual.probability, _outcome_probability(c))
+
+    expect = {
+        k: rolled[k]
+        for k in ("direct_damage", "splash_damage", "total_damage")
+        if k in rolled
+    }
+    if "persistent_damage" in rolled:
+        expect["persistent_damage"] = (
+            rolled.persistent_damage * rolled.apply_persistent_damage
+        ).sum("persistent_round")
+        assert_allclose(
+            actual.apply_persistent_damage,
+            rolled.apply_persistent_damage.mean("roll"),
+        )
+    for k, v in expect.items():
+        hist = (v.expand_dims(damage=actual.damage.size) == actual.damage).mean("roll")
+        assert_allclose(hist.transpose(*actual[k].dims), actual[k])
+        np.testing.assert_allclose(actual[k].sum("damage"), 1)
+
+
+def test_damage_counts_vs_exact():
+    set_config(roll_size=100_000)
+    spec = (
+        Damage("fire", 2, 6, 2)
+        + Damage("fire", 1, 6, persistent=True)
+        + Damage("acid", 0, 0, 3, splash=True)
+    )
+    expect = damage(check(10, DC=20, mode="exact"), spec, mode="exact")
+    actual = damage(check(10, DC=20), spec, mode="counts")
+    assert set(actual.data_vars) == set(expect.data_vars)
+    for k in (
+        "probability",
+        "direct_damage",
+        "splash_damage",
+        "persistent_damage",
+        "total_damage",
+        "apply_persistent_damage",
+    ):
+        a, e = xarray.align(actual[k], expect[k], join="outer", fill_value=0)
+        assert_allclose(a, e.transpose(*a.dims), atol=0.01)
+
+
+MANY_SPECS = {
+    "a": Damage("fire", 2, 6, 2) + Damage("fire", 1, 6, persistent=True),
+    "b": Damage("fire", 2, 6, 2) + Damage("acid", 0, 0, 3, splash=True),
+}
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_damage_many_roll(threads):
+    set_config(roll_size=100_000, threads=threads)
+    actual = damage_many(check(10, DC=20), MANY_SPECS, resistances={"acid": 1})
+    assert actual.spec.values.tolist() == ["a", "b"]
+    assert actual.damage_type.values.tolist() == ["acid", "fire"]
+    assert actual.direct_damage.dims == ("roll", "spec", "damage_type")
+    assert actual.total_damage.dims == ("roll", "spec")
+    assert list(actual.attrs["damage_spec"]) == ["a", "b"]
+
+    # 2d6+2 fire is rolled once and shared
+    fire = actual.direct_damage.sel(damage_type="fire")
+    assert_equal(fire.sel(spec="a", drop=True), fire.sel(spec="b", drop=True))
+    # Damage types and components that a spec doesn't deal are zero
+    assert (actual.direct_damage.sel(spec="a", damage_type="acid") == 0).all()
+    assert (actual.persistent_damage.sel(spec="b") == 0).all()
+    assert (actual.splash_damage.sel(spec="a") == 0).all()
+
+    for name, spec in MANY_SPECS.items():
+        expect = damage(
+            check(10, DC=20, mode="exact"),
+            spec,
+            resistances={"acid": 1},
+            mode="mean",
+        )
+        np.testing.assert_allclose(
+            actual.total_damage.sel(spec=name).mean(),
+            expect.total_damage,
+            rtol=0.02,
+        )
+
+
+@pytest.mark.parametrize("mode", ["exact", "mean"])
+def test_damage_many_no_roll(mode):
+    outcome = check(10, DC=20, mode="exact")
+    actual = damage_many(outcome, MANY_SPECS, mode=mode)
+    assert actual.spec.values.tolist() == ["a", "b"]
+    assert "spec" not in actual.probability.dims
+    for name, spec in MANY_SPECS.items():
+        expect = damage(outcome, spec, mode=mode)
+        for k in ("direct_damage", "splash_damage", "persistent_damage"):
+            if k in expect:
+                a, e = xarray.align(
+                    actual[k].sel(spec=name, drop=True),
+                    expect[k],
+                    join="right",
+                    fill_value=0,
+                )
+                assert_allclose(a, e.transpose(*a.dims))
+        a, e = xarray.align(
+            actual.total_damage.sel(spec=name, drop=True),
+            expect.total_damage,
+            join="outer",
+            fill_value=0,
+        )
+        assert_allclose(a, e)
+
+    if mode == "exact":
+        for k in ("direct_damage", "splash_damage", "persistent_damage"):
+            np.testing.assert_allclose(actual[k].sum("damage"), 1)
+        # Damage types that a spec doesn't deal have zero damage
+        assert actual.persistent_damage.sel(spec="b", damage=0).values.tolist() == [
+            1,
+            1,
+        ]
+    else:
+        assert (actual.persistent_damage.sel(spec="b") == 0).all()
+
+
+def test_damage_many_counts_vs_exact():
+    set_config(roll_size=100_000)
+    expect = damage_many(check(10, DC=20, mode="exact"), MANY_SPECS, mode="exact")
+    actual = damage_many(check(10, DC=20), MANY_SPECS, mode="counts")
+    for k in ("direct_damage", "splash_damage", "persistent_damage", "total_damage"):
+        a, e = xarray.align(actual[k], expect[k], join="outer", fill_value=0)
+        assert_allclose(a, e.transpose(*a.dims), atol=0.01)
+
+
+def test_damage_many_errors():
+    with pytest.raises(ValueError, match="empty"):
+        damage_many(check(6, DC=15), {})
+    with pytest.raises(ValueError, match="mode"):
+        damage_many(check(6, DC=15), MANY_SPECS, mode="foo")
+    with pytest.raises(ValueError, match="spec"):
+        damage_many(check(6, DC=15).expand_dims(spec=2), MANY_SPECS)
+
+
+def test_damage_array_spec():
+    set_config(roll_size=100_000)
+    level = DataArray([1, 2, 3, 4], dims=["level"], coords={"level": [1, 2, 3, 4]})
+    dice = DataArray([1, 1, 2, 2], dims=["level"], coords={"level": [1, 2, 3, 4]})
+    spec = Damage("slashing", dice, 8, 1, deadly=8) + Damage("fire", 0, 0, level)
+    outcome = check(level + 10, DC=20, dependent_dims=["level"])
+    actual = damage(outcome, spec, dependent_dims=["level"])
+    assert actual.direct_damage.dims == ("roll", "level", "damage_type")
+    assert actual.total_damage.dims == ("roll", "level")
+    assert actual.attrs["damage_spec"]["Success"] == (
+        "[1..2]d8+1 slashing plus [1..4] fire"
+    )
+    # Identical damage is rolled once; level is a dependent dimension
+    slashing = actual.direct_damage.sel(damage_type="slashing").where(
+        (actual.outcome == 1).all("level")
+    )
+    assert_equal(
+        slashing.sel(level=[1, 3]),
+        slashing.sel(level=[2, 4]).assign_coords(level=[1, 3]),
+    )
+
+    expect = xarray.concat(
+        [
+            damage(
+                check(i + 10, DC=20, mode="exact"),
+                Damage("slashing", int(dice[i - 1]), 8, 1, deadly=8)
+                + Damage("fire", 0, 0, i),
+                mode="mean",
+            ).total_damage
+            for i in range(1, 5)
+        ],
+        dim=level,
+    )
+    mean = damage(check(level + 10, DC=20, mode="exact"), spec, mode="mean")
+    assert_allclose(mean.total_damage, expect)
+    np.testing.assert_allclose(actual.total_damage.mean("roll"), expect, rtol=0.02)
+
+
+@pytest.mark.parametrize("mode", ["roll", "mean"])
+def test_damage_array_spec_zero_points(mode):
+    """Array-valued dice and faces may be both zero at some points, where the
+    damage deals no damage at all and no trait adds extra dice.
+    """
+    dice = DataArray([0, 1, 2], dims=["x"])
+    spec = Damage("fire", dice, (dice > 0) * 6, deadly=8) + Damage("cold", 0, 0, dice)
+    outcome = check(10, DC=15, mode="roll" if mode == "roll" else "exact")
+    actual = damage(outcome, spec, independent_dims=["x"], mode=mode)
+    assert (actual.total_damage.sel(x=0) == 0).all()
+    assert (actual.total_damage.sel(x=[1, 2]) > 0).any()
+
+
+def test_damage_array_spec_zeros():
+    """Array-valued damage deals no damage where it's all zeros, e.g. property
+    runes before they become available
+    """
+    level = DataArray([1, 8, 10], dims=["level"], coords={"level": [1, 8, 10]})
+    spec = armory.runes.auto(level=level)
+    outcome = check(10, DC=15)
+    actual = damage(outcome, spec, independent_dims=["level"])
+    assert (actual.total_damage.sel(level=1) == 0).all()
+    assert actual.attrs["damage_spec"]["Success"] == (
+        "[0..1]d[0..6] fire plus [0..1]d[0..6] electricity plus 0d0 acid"
+    )
+
+    mean = damage(check(10, DC=15, mode="exact"), spec, mode="mean").total_damage
+    expect = [
+        damage(
+            check(10, DC=15, mode="exact"), armory.runes.auto(level=i), mode="mean"
+        ).total_damage.item()
+        for i in (8, 10)
+    ]
+    assert mean.values.tolist() == pytest.approx([0, *expect])
+
+
+def test_damage_array_spec_levels():
+    """End-to-end: a striking longsword with the best available property runes
+    at every level from 1 to 20
+    """
+    set_config(roll_size=20_000)
+    PC = tables.PC
+    spec = Damage("slashing", PC.weapon_dice.striking_rune, 8, 4) + armory.runes.auto(
+        PC.level
+    )
+    outcome = check(PC.level + 12, DC=PC.level + 16, dependent_dims=["level"])
+    actual = damage(outcome, spec, dependent_dims=["level"])
+    assert actual.total_damage.dims == ("roll", "level")
+    assert actual.total_damage.sizes["level"] == 20
+
+    expect = [
+        damage(
+            check(12, DC=16, mode="exact"),
+            Damage("slashing", int(PC.weapon_dice.striking_rune.sel(level=i)), 8, 4)
+            + armory.runes.auto(i),
+            mode="mean",
+        ).total_damage.item()
+        for i in range(1, 21)
+    ]
+    mean = actual.total_damage.mean("roll").values.tolist()
+    assert mean == pytest.approx(expect, rel=0.05)
+
+
+@pytest.mark.parametrize("dims", ["independent_dims", "dependent_dims"])
+def test_damage_array_spec_memory(dims):
+    """Array-valued damage doesn't evaluate every distinct spec at every point,
+    so peak memory usage is proportional to the size of the output and not to
+    the number of points times the number of distinct specs.
+    """
+    set_config(roll_size=5000)
+    PC = tables.PC
+    spec = (
+        Damage(
+            "slashing",
+            PC.weapon_dice.striking_rune,
+            8,
+            4 + PC.weapon_specialization.champion,
+            deadly=8,
+        )
+        + Damage("fire", 1, 6)
+        + Damage("fire", 0, 0, PC.level // 4, persistent=True)
+    )
+    specs, _ = _split_array_spec(ExpandedDamage(spec))
+    assert len(specs) == 10
+    outcome = check(PC.level + 12, DC=PC.level + 16, **{dims: ["level"]})
+
+    tracemalloc.start()
+    try:
+        actual = damage(outcome, spec, **{dims: ["level"]})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert actual.total_damage.dims == ("roll", "level")
+    assert peak < 5 * actual.nbytes
+
+
+@pytest.mark.parametrize("mode", ["roll", "counts"])
+def test_damage_array_spec_dims(mode):
+    dice = DataArray([1, 2], dims=["x"])
+    spec = Damage("fire", dice, 6)
+    with pytest.raises(ValueError, match="must be listed"):
+        damage(check(10, DC=20), spec, mode=mode)
+    actual = damage(check(10, DC=20), spec, independent_dims=["x"], mode=mode)
+    assert actual.total_damage.sizes["x"] == 2
+    if mode == "roll":
+        assert actual.total_damage.max("roll").values.tolist() == [12, 24]
+
+
+def test_damage_array_spec_unsupported():
+    spec = Damage("fire", DataArray([1, 2], dims=["x"]), 6)
+    with pytest.raises(TypeError, match="array-valued"):
+        damage_pmf(spec)
+    with pytest.raises(TypeError, match="array-valued"):
+        damage_many(check(10, DC=20), {"a": spec})
+
+
+def test_damage_bad_mode():
+    with pytest.raises(ValueError, match="mode"):
+        damage(check(6, DC=15), Damage("fire", 1, 6), mode="foo")
+    with pytest.raises(ValueError, match="mode='exact'"):
+        damage(check(6, DC=15, mode="exact"), Damage("fire", 1, 6))
+    with pytest.raises(ValueError, match="mode='mean'"):
+        damage(check(6, DC=15, mode="exact"), Damage("fire", 1, 6))
+
+
+def test_roll_damage_by_outcome():
+    """_roll_damage picks the damage of each outcome, and 0 for outcomes that
+    don't deal damage, including no_roll.
+    """
+    outcome = DataArray(
+        [[-2, -1, 0, 1, 2], [2, 1, 0, -1, -2]], dims=["x", "roll"]
+    ).transpose()
+    spec = ExpandedDamage(Damage("fire", 1, 6, 10) + Damage("cold", 0, 0, 1))
+    set_config(roll_size=5)
+    seed(0)
+    program, damage_types = _compile_damage(spec)
+    actual = _roll_damage(
+        outcome, program, damage_types, {"x": 2}, dtype=np.dtype(np.int64)
+    )
+    assert actual.dims == ("roll", "x", "damage_type")
+    assert sorted(actual.damage_type.values.tolist()) == ["cold", "fire"]
+
+    expect_cold = [[0, 2], [0, 1], [0, 0], [1, 0], [2, 0]]
+    np.testing.assert_array_equal(actual.sel(damage_type="cold"), expect_cold)
+    fire = actual.sel(damage_type="fire")
+    assert (fire.values[outcome.values <= 0] == 0).all()
+    assert fire.values[outcome.values == 1].min() >= 11
+    assert fire.values[outcome.values == 2].min() >= 22
+    assert (fire.values[outcome.values == 2] % 2 == 0).all()
+
+
+def test_compile_damage():
+    spec = ExpandedDamage(
+        Damage("slashing", 2, 6, 3, deadly=8)
+        + Damage("fire", 1, 6, persistent=True)
+        + Damage("acid", 0, 0, 1, splash=True)
+    )
+    program, damage_types = _compile_damage(spec)
+    assert damage_types == ["acid", "fire", "slashing"]
+    assert program.tolist() == [
+        # group, dice, faces, bonus, multiplier, dos, damage_type, component, spec
+        (0, 2, 6, 3, 2.0, 2, 2, 0, 0),
+        (1, 1, 8, 0, 1.0, 2, 2, 0, 0),
+        (2, 1, 6, 0, 2.0, 2, 1, 2, 0),
+        (3, 0, 0, 1, 1.0, 2, 0, 1, 0),
+        (0, 2, 6, 3, 1.0, 1, 2, 0, 0),
+        (2, 1, 6, 0, 1.0, 1, 1, 2, 0),
+        (3, 0, 0, 1, 1.0, 1, 0, 1, 0),
+        # Splash damage on a miss is direct damage to the main target only
+        (4, 0, 0, 1, 1.0, 0, 0, 0, 0),
+    ]
+
+
+def test_compile_damage_many():
+    a = ExpandedDamage(Damage("slashing", 1, 8, 4) + Damage("fire", 1, 6))
+    b = ExpandedDamage(Damage("slashing", 1, 8, 4) + Damage("electricity", 1, 6))
+    program, damage_types = _compile_damage(a, b)
+    assert damage_types == ["electricity", "fire", "slashing"]
+    assert program[["group", "damage_type", "spec"]].tolist() == [
+        # 1d8+4 slashing is shared; 1d6 fire and 1d6 electricity are not
+        (0, 2, 0),
+        (1, 1, 0),
+        (0, 2, 0),
+        (1, 1, 0),
+        (0, 2, 1),
+        (2, 0, 1),
+        (0, 2, 1),
+        (2, 0, 1),
+    ]
+
+
+def test_damage_compact_dtypes():
+    spec = (
+        Damage("fire", 12, 6, 10, basic_save=True)
+        + Damage("fire", 1, 4, persistent=True)
+        + Damage("acid", 0, 0, 1, splash=True)
+    )
+    kwargs = {"weaknesses": {"fire": 10}, "splash_damage_targets": 5}
+    set_config(roll_size=100_000)
+    expect = damage(check(10, DC=20), spec, **kwargs)
+    set_config(compact_dtypes=True)
+    actual = damage(check(10, DC=20), spec, **kwargs)
+    for k in ("direct_damage", "splash_damage", "persistent_damage", "total_damage"):
+        assert expect[k].dtype == np.int64
+        assert actual[k].dtype == np.int16
+        assert actual[k].min() >= 0
+        np.testing.assert_allclose(actual[k].mean(), expect[k].mean(), rtol=0.02)
+    assert actual.total_damage.max() > 127
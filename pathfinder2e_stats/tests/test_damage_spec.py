@@ -1,8 +1,11 @@
 from textwrap import dedent
 
 import pytest
+from xarray import DataArray
+from xarray.testing import assert_equal
 
 from pathfinder2e_stats import Damage, DoS, ExpandedDamage
+from pathfinder2e_stats.damage_spec import _split_array_spec
 
 
 def test_damage_type_validation():
@@ -662,3 +665,160 @@ def test_damage_hash():
         Damage("fire", 1, 8, boost=12),
     ]
     assert len(set(d + d)) == len(d)
+
+
+def test_array_damage_validation():
+    dice = DataArray([1, 2, 3], dims=["level"])
+    Damage("fire", dice, 6, dice)
+    Damage("fire", 1, dice * 2 + 4)
+    Damage("fire", 0, 0, dice)
+    with pytest.raises(TypeError, match="dice"):
+        Damage("fire", dice.astype(float), 6)
+    with pytest.raises(ValueError, match="dice"):
+        Damage("fire", -dice, 6)
+    with pytest.raises(ValueError, match="faces"):
+        Damage("fire", 1, dice)
+    # No damage at all where dice, faces, and bonus are all zero
+    Damage("fire", dice - 1, (dice > 1) * 6)
+    with pytest.raises(ValueError, match="dice and faces"):
+        Damage("fire", dice, 0)
+
+
+def test_array_damage_eq_hash():
+    dice = DataArray([1, 2, 3], dims=["level"])
+    a = Damage("fire", dice, 6)
+    b = Damage("fire", dice.copy(), 6)
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a != Damage("fire", dice + 1, 6)
+    assert a != Damage("fire", dice.rename(level="x"), 6)
+    assert a != Damage("fire", dice, 8)
+    assert Damage("fire", dice * 0 + 1, 6) != Damage("fire", 1, 6)
+    assert len({a, b, Damage("fire", 1, 6)}) == 2
+
+    # Containers of array-valued damage can be compared too
+    assert a + Damage("cold", 1, 4) == b + Damage("cold", 1, 4)
+    assert b in a + Damage("cold", 1, 4)
+    assert a.expand() == b.expand()
+    assert a.expand() != Damage("fire", dice + 1, 6).expand()
+
+
+def test_array_damage_repr():
+    dice = DataArray([1, 2, 3], dims=["level"])
+    assert repr(Damage("fire", dice, 6, dice + 1)) == "**Damage** [1..3]d6+[2..4] fire"
+    assert repr(Damage("fire", dice * 0 + 2, 6)) == "**Damage** 2d6 fire"
+    assert repr(Damage("fire", 0, 0, dice)) == "**Damage** [1..3] fire"
+
+
+def test_array_damage_expand():
+    dice = DataArray([1, 2, 3], dims=["level"])
+    crit, hit = Damage("slashing", dice, 8, deadly=10).expand().values()
+    assert crit[0].multiplier == 2
+    assert crit[0].dice is dice
+    assert crit[1].dice.values.tolist() == [1, 1, 2]
+    assert hit[0].dice is dice
+
+    spec = Damage("fire", dice, 6, basic_save=True).expand()
+    assert spec[DoS.success][0].multiplier == 0.5
+
+    spec = Damage("fire", 0, 0, dice, basic_save=True).expand()
+    assert spec[DoS.success][0].bonus.values.tolist() == [1, 1, 1]
+    assert spec[DoS.critical_failure][0].bonus.values.tolist() == [2, 4, 6]
+    spec = Damage("fire", 0, 0, dice - 1, basic_save=True).expand()
+    assert spec[DoS.success][0].bonus.values.tolist() == [0, 1, 1]
+    with pytest.raises(ValueError, match="non-negative"):
+        Damage("fire", 0, 0, -dice, basic_save=True).expand()
+
+
+@pytest.mark.parametrize(
+    "func",
+    [
+        lambda d: d.copy(deadly=10).expand(),
+        lambda d: d.copy(fatal=12).expand(),
+        lambda d: d.copy(scatter=True, fatal=12).expand(),
+        lambda d: d.copy(two_hands=12).hands(2),
+        lambda d: d.copy(boost=10).apply_boost(True),
+        lambda d: d.reduce_die(),
+        lambda d: d.increase_die(),
+        lambda d: d.vicious_swing(),
+        lambda d: d.copy(deadly=10).vicious_swing(2),
+        lambda d: d.copy(deadly=10, scatter=True, fatal=12).vicious_swing(),
+    ],
+    ids=[
+        "deadly",
+        "fatal",
+        "scatter",
+        "two_hands",
+        "boost",
+        "reduce_die",
+        "increase_die",
+        "vicious_swing",
+        "vicious_swing_deadly",
+        "vicious_swing_scatter",
+    ],
+)
+def test_array_damage_zeros(func):
+    """Traits and methods don't add extra dice where array-valued damage is
+    all zeros
+    """
+    dice = DataArray([0, 1, 2], dims=["level"])
+    spec = ExpandedDamage(func(Damage("fire", dice, (dice > 0) * 8)))
+    specs, index = _split_array_spec(spec)
+    index = index.values.tolist()
+    assert specs[index[0]] == ExpandedDamage({})
+    for n in (1, 2):
+        expect = ExpandedDamage(func(Damage("fire", n, 8)))
+        assert specs[index[n]].simplify() == expect.simplify()
+
+
+def test_array_damage_simplify():
+    dice = DataArray([1, 2, 3], dims=["level"])
+    faces = DataArray([4, 6, 8], dims=["level"])
+    actual = (
+        Damage("fire", 0, 0, 1)
+        + Damage("fire", dice, faces)
+        + Damage("fire", dice, 6, 1)
+        + Damage("fire", 1, 6)
+        + Damage("fire", 1, faces)
+    )
+    assert len(actual) == 2
+    assert actual[0].faces == 6
+    assert actual[0].dice.values.tolist() == [2, 3, 4]
+    # Flat damage is added to the last plain dice
+    assert actual[0].bonus == 2
+    # Array-valued faces are sorted last and are only combined with each other
+    assert actual[1].faces is faces
+    assert actual[1].dice.values.tolist() == [2, 3, 4]
+    assert actual[1].bonus == 0
+
+
+def test_split_array_spec():
+    assert _split_array_spec(ExpandedDamage(Damage("fire", 1, 6))) is None
+
+    dice = DataArray([1, 1, 2, 2], dims=["level"], coords={"level": [1, 2, 3, 4]})
+    bonus = DataArray([0, 1], dims=["x"])
+    spec = ExpandedDamage(Damage("fire", dice, 6, bonus) + Damage("cold", 1, 4))
+    specs, index = _split_array_spec(spec)
+    assert [s.to_dict_of_str()["Success"] for s in specs] == [
+        "1d6 fire plus 1d4 cold",
+        "1d6+1 fire plus 1d4 cold",
+        "2d6 fire plus 1d4 cold",
+        "2d6+1 fire plus 1d4 cold",
+    ]
+    assert_equal(
+        index,
+        DataArray(
+            [[0, 1], [0, 1], [2, 3], [2, 3]],
+            dims=["level", "x"],
+            coords={"level": [1, 2, 3, 4]},
+        ),
+    )
+
+    # Array-valued damage which is all zeros is dropped
+    flag = DataArray([0, 1], dims=["x"])
+    spec = ExpandedDamage(Damage("fire", 1, 6) + Damage("cold", flag, flag * 4))
+    specs, index = _split_array_spec(spec)
+    assert [s.to_dict_of_str()["Success"] for s in specs] == [
+        "1d6 fire",
+        "1d6 fire plus 1d4 cold",
+    ]
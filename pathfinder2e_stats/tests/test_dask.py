@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+from xarray import DataArray
+from xarray.testing import assert_identical
+
+from pathfinder2e_stats import (
+    Damage,
+    Session,
+    check,
+    d20,
+    damage,
+    map_outcome,
+    outcome_counts,
+    roll,
+    seed,
+    set_config,
+)
+
+da = pytest.importorskip("dask.array")
+
+
+def simulate():
+    bonus = DataArray([0, 10], dims=["x"])
+    outcome = check(
+        bonus,
+        DC=15,
+        fortune=True,
+        allow_critical_failure=DataArray([True, False], dims=["x"]),
+        independent_dims=["x"],
+    )
+    return damage(
+        outcome,
+        Damage("fire", 2, 6, 3) + Damage("fire", 1, 4, persistent=True),
+        independent_dims=["x"],
+    )
+
+
+def assert_lazy(obj):
+    for k, v in obj.variables.items():
+        if "roll" in v.dims:
+            assert isinstance(v.data, da.Array), k
+
+
+def test_roll():
+    set_config(backend="dask", dask_chunk_size=300)
+    actual = roll(2, 6, dims={"x": 3})
+    assert isinstance(actual.data, da.Array)
+    assert actual.name is None
+    assert actual.chunks == ((300, 300, 300, 100), (3,))
+    values = actual.values
+    assert values.min() >= 2
+    assert values.max() <= 12
+    # Each chunk has its own seed
+    assert not (values[:300] == values[300:600]).all()
+    # Rolls are defined when the graph is built, not when it's computed
+    np.testing.assert_array_equal(actual.values, values)
+
+
+@pytest.mark.parametrize("stratified_d20", [False, True])
+def test_d20(stratified_d20):
+    set_config(backend="dask", dask_chunk_size=200, stratified_d20=stratified_d20)
+    actual = d20(fortune=DataArray([False, True], dims=["fortune"]))
+    assert isinstance(actual.data, da.Array)
+    values = actual.transpose("roll", "fortune").values
+    assert values.min() == 1
+    assert values.max() == 20
+    assert values[:, 1].mean() > values[:, 0].mean()
+    if stratified_d20:
+        np.testing.assert_array_equal(np.sort(values[:20, 0]), np.arange(1, 21))
+
+
+def test_seed():
+    set_config(backend="dask", dask_chunk_size=300)
+    seed(1)
+    a = simulate()
+    seed(1)
+    b = simulate()
+    c = simulate()
+    assert_identical(a.compute(), b.compute())
+    assert not (a.total_damage == c.total_damage).all()
+
+
+@pytest.mark.parametrize("scheduler", ["sync", "threads"])
+@pytest.mark.parametrize("compact_dtypes", [False, True])
+@pytest.mark.parametrize("stratified_d20", [False, True])
+def test_counter_rng(scheduler, compact_dtypes, stratified_d20):
+    """With counter_rng, the dask and numpy backends produce identical results"""
+    set_config(
+        counter_rng=True,
+        compact_dtypes=compact_dtypes,
+        stratified_d20=stratified_d20,
+    )
+    seed(0)
+    expect = simulate()
+    expect_counts = outcome_counts(expect)
+    expect_map = map_outcome(expect.outcome, evasion=True)
+    expect_next = roll(1, 6)
+
+    set_config(backend="dask", dask_chunk_size=300)
+    seed(0)
+    actual = simulate()
+    actual_counts = outcome_counts(actual)
+    actual_map = map_outcome(actual.outcome, evasion=True)
+    assert_lazy(actual)
+    assert isinstance(actual_map.data, da.Array)
+    assert_identical(actual.compute(scheduler=scheduler), expect)
+    assert_identical(actual_counts, expect_counts)
+    assert_identical(actual_map.compute(scheduler=scheduler), expect_map)
+    # Draw counter advances like the numpy backend
+    assert_identical(roll(1, 6).compute(), expect_next)
+
+
+def test_outcome_counts():
+    set_config(backend="dask", dask_chunk_size=300)
+    outcome = check(10, DC=15).outcome
+    expect = outcome_counts(outcome.compute())
+    assert_identical(outcome_counts(outcome), expect)
+    expect = outcome_counts(outcome.compute(), normalize=False)
+    assert_identical(outcome_counts(outcome, normalize=False), expect)
+
+
+def test_threads_and_session_ignored():
+    set_config(backend="dask", threads=4)
+    assert_lazy(simulate())
+    with Session(seed=0):
+        actual = simulate()
+    assert isinstance(actual.total_damage.data, np.ndarray)
+
+
+def test_validation():
+    with pytest.raises(ValueError, match="backend"):
+        set_config(backend="cupy")
+    with pytest.raises(ValueError, match="dask_chunk_size"):
+        set_config(dask_chunk_size=0)
@@ -3,7 +3,8 @@ import pytest
 from xarray import DataArray
 from xarray.testing import assert_equal
 
-from pathfinder2e_stats import d20, roll, seed
+from pathfinder2e_stats import d20, roll, seed, set_config
+from pathfinder2e_stats.dice import _dice_pmf
 
 
 def test_roll():
@@ -114,3 +115,101 @@ def test_d20_fortune_array():
     assert 0.45 < (r.sel(f=True, m=True) > 10).mean() < 0.55
     assert 0.7 < (r.sel(f=True, m=False) > 10).mean() < 0.8
     assert 0.2 < (r.sel(f=False, m=True) > 10).mean() < 0.3
+
+
+@pytest.mark.parametrize(
+    "dice,faces,bonus", [(1, 6, 0), (2, 8, 4), (3, 4, -5), (0, 6, 2), (0, 6, -2)]
+)
+def test_dice_pmf(dice, faces, bonus):
+    pmf = _dice_pmf(dice, faces, bonus)
+    assert pmf.sum() == pytest.approx(1)
+
+    set_config(roll_size=100_000)
+    rolled = roll(dice, faces, bonus).values
+    actual = np.bincount(rolled, minlength=pmf.size) / rolled.size
+    np.testing.assert_allclose(actual, pmf, atol=0.01)
+
+
+@pytest.mark.parametrize(
+    "s,dtype",
+    [("1d6", "int8"), ("10d12", "int8"), ("10d12+10", "int16"), ("3d4-200", "int16")],
+)
+def test_roll_compact_dtypes(s, dtype):
+    assert roll(s).dtype == np.int64
+    set_config(compact_dtypes=True)
+    actual = roll(s)
+    assert actual.dtype == dtype
+    assert actual.min() >= 0
+    assert d20(fortune=True).dtype == np.int8
+
+
+@pytest.mark.parametrize(
+    "dice,faces,bonus", [(2, 6, 0), (10, 12, 3), (3, 4, -8), (1, 20, 0), (0, 6, 2)]
+)
+def test_roll_cdf_sampler(dice, faces, bonus):
+    set_config(roll_size=100_000, dice_sampler="cdf")
+    actual = roll(dice, faces, bonus, dims={"x": 2})
+    assert actual.dims == ("roll", "x")
+    assert actual.dtype == np.int64
+    pmf = _dice_pmf(dice, faces, bonus)
+    assert actual.min() >= np.flatnonzero(pmf)[0]
+    assert actual.max() <= pmf.size - 1
+    for i in range(2):
+        hist = (
+            np.bincount(actual[:, i].values, minlength=pmf.size) / actual.sizes["roll"]
+        )
+        np.testing.assert_allclose(hist, pmf, atol=0.01)
+
+    # The two columns are independent
+    assert (actual[:, 0] != actual[:, 1]).any() or dice == 0
+
+
+def test_roll_cdf_sampler_compact_dtypes():
+    set_config(dice_sampler="cdf", compact_dtypes=True)
+    assert roll("10d12").dtype == np.int8
+    assert roll("20d12").dtype == np.int16
+
+
+def test_roll_cdf_sampler_seed():
+    set_config(dice_sampler="cdf")
+    seed(1)
+    a = roll("6d6")
+    seed(1)
+    b = roll("6d6")
+    assert_equal(a, b)
+
+
+def test_bad_dice_sampler():
+    with pytest.raises(ValueError, match="dice_sampler"):
+        set_config(dice_sampler="foo")
+
+
+@pytest.mark.parametrize("roll_size", [1000, 1010])
+def test_d20_stratified(roll_size):
+    set_config(roll_size=roll_size, stratified_d20=True)
+    actual = d20(dims={"x": 3, "y": 2})
+    assert actual.dims == ("roll", "x", "y")
+    assert actual.shape == (roll_size, 3, 2)
+    assert actual.dtype == np.int64
+    assert actual.min() == 1
+    assert actual.max() == 20
+
+    # Every block of 20 rolls contains every face exactly once
+    blocks = actual.values[:1000].reshape(50, 20, 6)
+    assert (np.sort(blocks, axis=1) == np.arange(1, 21)[:, None]).all()
+    # Independent along the other dimensions
+    assert (actual[:, 0, 0] != actual[:, 1, 0]).any()
+    assert (actual[:, 0, 0] != actual[:, 0, 1]).any()
+    # Shuffled
+    assert (actual[:20, 0, 0] != np.arange(1, 21)).any()
+
+
+def test_d20_stratified_fortune():
+    set_config(roll_size=100_000, stratified_d20=True)
+    actual = d20(fortune=True)
+    np.testing.assert_allclose(actual.mean(), 13.825, atol=0.05)
+
+
+def test_d20_stratified_compact_dtypes():
+    set_config(stratified_d20=True, compact_dtypes=True)
+    assert d20().dtype == np.int8
@@ -0,0 +1,179 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from xarray import DataArray
+from xarray.testing import assert_identical
+
+from pathfinder2e_stats import (
+    Damage,
+    Session,
+    check,
+    damage,
+    get_config,
+    seed,
+    set_config,
+    sweep,
+)
+
+
+def simulate():
+    level = DataArray(np.arange(5), dims=["level"])
+    outcome = check(
+        level + 10,
+        DC=level + 15,
+        fortune=DataArray([False, True], dims=["fortune"]),
+        independent_dims=["level"],
+        dependent_dims=["fortune"],
+    )
+    return damage(
+        outcome,
+        Damage("fire", 2, 6, 3) + Damage("fire", 1, 4, persistent=True),
+        independent_dims=["level"],
+        dependent_dims=["fortune"],
+    )
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+@pytest.mark.parametrize("threads", [2, 3, 7])
+@pytest.mark.parametrize("stratified_d20", [False, True])
+def test_threads_counter_rng(threads, stratified_d20):
+    set_config(counter_rng=True, stratified_d20=stratified_d20)
+    seed(0)
+    expect = simulate()
+    expect_next = simulate()
+    set_config(threads=threads)
+    seed(0)
+    assert_identical(simulate(), expect)
+    # The draw counter advances as in a single-threaded call
+    assert_identical(simulate(), expect_next)
+    assert get_config()["roll_size"] == 1000
+    assert get_config()["threads"] == threads
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+def test_threads():
+    set_config(threads=4, compact_dtypes=True)
+    a = simulate()
+    b = simulate()
+    assert a.sizes == {
+        "roll": 1000,
+        "level": 5,
+        "fortune": 2,
+        "damage_type": 1,
+        "persistent_round": 3,
+    }
+    # Config is inherited by the worker threads
+    assert a.outcome.dtype == np.int8
+    assert not (a.outcome == b.outcome).all()
+    # The random streams of the threads are independent
+    chunks = [a.outcome.isel(roll=slice(i, i + 250)).values for i in (0, 250)]
+    assert not (chunks[0] == chunks[1]).all()
+
+    seed(1)
+    c = simulate()
+    seed(1)
+    assert_identical(simulate(), c)
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+def test_threads_more_than_rolls():
+    set_config(threads=8, roll_size=3)
+    assert check(10, DC=15).sizes["roll"] == 3
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+def test_threads_exact_mode():
+    expect = damage(check(10, DC=15, mode="exact"), Damage("fire", 1, 6), mode="exact")
+    set_config(threads=4)
+    actual = damage(check(10, DC=15, mode="exact"), Damage("fire", 1, 6), mode="exact")
+    assert_identical(actual, expect)
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+def test_threads_session():
+    session = Session(seed=0)
+    with session:
+        expect = simulate()
+    set_config(threads=4)
+    with session:
+        actual = simulate()
+    assert_identical(actual, expect)
+
+
+def test_threads_validation():
+    with pytest.raises(ValueError, match="threads"):
+        set_config(threads=0)
+
+
+def sweep_func(level, dice, rune="none"):
+    outcome = check(level + 9, DC=level + 17)
+    spec = Damage("slashing", dice, 8, 4)
+    if rune == "flaming":
+        spec += Damage("fire", 1, 6)
+    out = damage(outcome, spec)
+    return out.assign(roll_size=get_config()["roll_size"])
+
+
+@pytest.mark.thread_unsafe(reason="spawns processes")
+def test_sweep_processes():
+    set_config(roll_size=200)
+    seed(1)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(2, mp_context=ctx) as executor:
+        actual = sweep(
+            sweep_func,
+            level=[1, 5, 10],
+            dice=[1, 2],
+            rune=["none", "flaming"],
+            executor=executor,
+        )
+    assert actual.total_damage.dims == ("level", "dice", "rune", "roll")
+    assert actual.level.values.tolist() == [1, 5, 10]
+    assert actual.rune.values.tolist() == ["none", "flaming"]
+    # Config is inherited by the workers
+    assert (actual.roll_size == 200).all()
+
+    # Reproducible regardless of the executor
+    seed(1)
+    with ThreadPoolExecutor(3) as executor:
+        expect = sweep(
+            sweep_func,
+            level=[1, 5, 10],
+            dice=[1, 2],
+            rune=["none", "flaming"],
+            executor=executor,
+        )
+    assert_identical(actual, expect)
+    # Caller's config and seed are untouched
+    assert get_config()["roll_size"] == 200
+
+
+@pytest.mark.thread_unsafe(reason="spawns threads")
+def test_sweep_results():
+    with ThreadPoolExecutor(2) as executor:
+        actual = sweep(sweep_func, level=[1, 10], dice=[1, 2], executor=executor)
+    # Independent seeds for each point
+    a = actual.total_damage.sel(level=1, dice=1)
+    b = actual.total_damage.sel(level=10, dice=1)
+    assert not (a == b).all()
+    # Higher dice, more damage
+    mean = actual.total_damage.mean("roll")
+    assert (mean.sel(dice=2) > mean.sel(dice=1)).all()
+
+    with ThreadPoolExecutor(2) as executor:
+        actual = sweep(lambda x: DataArray(x * 2), x=[1, 2, 3], executor=executor)
+    assert_identical(
+        actual,
+        DataArray([2, 4, 6], dims=["x"], coords={"x": [1, 2, 3]}).to_dataset(
+            name="value"
+        ),
+    )
+
+
+def test_sweep_empty():
+    with pytest.raises(ValueError, match="at least one value"):
+        sweep(sweep_func, level=[], dice=[1])
+    with pytest.raises(TypeError, match="at least one axis"):
+        sweep(sweep_func)
@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+import xarray
+from xarray.testing import assert_equal
+
+from pathfinder2e_stats import (
+    Damage,
+    Session,
+    check,
+    d20,
+    damage,
+    get_config,
+    paired_difference,
+    roll,
+    set_config,
+)
+
+
+def test_replay():
+    session = Session(seed=1)
+    with session:
+        a1 = roll(2, 6)
+        b1 = d20()
+    with session:
+        a2 = roll(2, 6)
+        b2 = d20()
+    assert_equal(a1, a2)
+    assert_equal(b1, b2)
+    assert not (a1 == roll(2, 6)).all()
+
+
+def test_seed():
+    with Session(seed=1):
+        a = roll(1, 6)
+    with Session(seed=1):
+        b = roll(1, 6)
+    with Session(seed=2):
+        c = roll(1, 6)
+    assert_equal(a, b)
+    assert not (a == c).all()
+
+
+def test_match_by_faces_and_order():
+    session = Session(seed=1)
+    with session:
+        a6 = roll(1, 6)
+        a8 = roll(1, 8)
+        b6 = roll(1, 6)
+    with session:
+        # Different call order across dice sizes doesn't matter
+        a8b = roll(1, 8)
+        a6b = roll(1, 6)
+        b6b = roll(1, 6)
+    assert_equal(a6, a6b)
+    assert_equal(a8, a8b)
+    assert_equal(b6, b6b)
+    assert not (a6 == b6).all()
+
+
+def test_more_dice():
+    session = Session(seed=1)
+    with session:
+        a = roll(1, 6, dims={"x": 2})
+    with session:
+        b = roll(1, 6, dims={"x": 3, "y": 2})
+    with session:
+        c = roll(1, 6, dims={"x": 3, "y": 2})
+    with session:
+        d = roll(1, 6)
+    assert_equal(b.isel(x=slice(2), y=0), a)
+    assert_equal(b, c)
+    assert_equal(d, a.isel(x=0, drop=True))
+
+
+def test_fortune():
+    session = Session(seed=1)
+    with session:
+        a = d20()
+    with session:
+        b = d20(fortune=True)
+    assert (b >= a).all()
+    assert (b > a).any()
+
+
+def test_stratified_ignored():
+    set_config(stratified_d20=True)
+    session = Session(seed=1)
+    with session:
+        a = d20()
+    with session:
+        b = roll(1, 20)
+    assert_equal(a, b)
+
+
+def test_roll_size():
+    session = Session(seed=1)
+    with session:
+        a = roll(1, 6)
+    set_config(roll_size=1500)
+    with session:
+        b = roll(1, 6)
+    set_config(roll_size=500)
+    with session:
+        c = roll(1, 6)
+    assert b.sizes["roll"] == 1500
+    assert_equal(b.isel(roll=slice(1000)), a)
+    assert_equal(c, a.isel(roll=slice(500)))
+
+
+def test_no_nesting():
+    session = Session()
+    with session, pytest.raises(RuntimeError, match="nested"), Session():
+        pass
+    # Session is released at exit
+    with session:
+        pass
+    assert "session" not in get_config()
+
+
+def test_paired_difference():
+    a = xarray.DataArray([1, 2, 3, 4], dims=["roll"])
+    b = xarray.DataArray([2, 4, 4, 6], dims=["roll"])
+    actual = paired_difference(a, b, confidence=0.9)
+    assert actual.difference == 1.5
+    np.testing.assert_allclose(actual.stderr, (1 / 3) ** 0.5 / 2)
+    np.testing.assert_allclose(
+        actual.ci_high - actual.difference, actual.stderr * 1.6448536, rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        actual.difference - actual.ci_low, actual.stderr * 1.6448536, rtol=1e-6
+    )
+    assert actual.attrs["confidence"] == 0.9
+
+
+def test_compare():
+    spec = Damage("slashing", 1, 8, 4)
+    session = Session(seed=0)
+    actual = session.compare(
+        {
+            "base": lambda: damage(check(8, DC=17), spec).total_damage,
+            "fortune": lambda: damage(check(8, DC=17, fortune=True), spec).total_damage,
+            "misfortune": lambda: (
+                damage(check(8, DC=17, misfortune=True), spec).total_damage
+            ),
+        },
+        baseline="base",
+    )
+    assert list(actual.data_vars) == [
+        "mean",
+        "difference",
+        "stderr",
+        "ci_low",
+        "ci_high",
+    ]
+    assert list(actual.variant.values) == ["base", "fortune", "misfortune"]
+    assert actual.attrs["baseline"] == "base"
+    assert actual.difference.sel(variant="base") == 0
+    assert actual.stderr.sel(variant="base") == 0
+    assert actual.difference.sel(variant="fortune") > 0
+    assert actual.difference.sel(variant="misfortune") < 0
+    # Common random numbers reduce the variance of the difference
+    fortune = actual.sel(variant="fortune")
+    independent = np.sqrt(2 * 30 / 1000)
+    assert fortune.stderr < independent
+    assert fortune.ci_low < fortune.difference < fortune.ci_high
@@ -0,0 +1,199 @@
+import numpy as np
+import pytest
+import xarray
+from xarray import DataArray
+from xarray.testing import assert_allclose, assert_equal
+
+from pathfinder2e_stats import (
+    Damage,
+    check,
+    converge,
+    damage,
+    get_config,
+    roll,
+    seed,
+    set_config,
+    stream,
+)
+
+
+def test_stream():
+    chunks = []
+
+    def func():
+        out = damage(
+            check(
+                DataArray([5, 10], dims=["target"]), DC=20, dependent_dims=["target"]
+            ),
+            Damage("fire", 2, 6, 3) + Damage("acid", 1, 4, splash=True),
+            dependent_dims=["target"],
+        )
+        out["hit"] = out.outcome >= 1
+        out["half"] = out.total_damage / 2
+        chunks.append(out)
+        return out
+
+    actual = stream(func, 2500, chunk_size=1000)
+    assert [c.sizes["roll"] for c in chunks] == [1000, 1000, 500]
+    assert get_config()["roll_size"] == 1000
+    assert actual.attrs["roll_size"] == 2500
+    assert actual.attrs["damage_spec"] == chunks[0].attrs["damage_spec"]
+    assert "roll" not in actual.dims
+
+    expect = xarray.concat(chunks, dim="roll", data_vars="minimal")
+    assert_equal(actual.bonus, expect.bonus)
+    assert_equal(actual.DC, expect.DC)
+    for k in ("natural", "outcome", "direct_damage", "total_damage", "hit", "half"):
+        assert_allclose(actual[f"{k}_mean"], expect[k].mean("roll"))
+        assert_allclose(actual[f"{k}_var"], expect[k].var("roll"))
+
+    for k in ("outcome", "direct_damage", "total_damage"):
+        counts = expect[k].value_counts("roll", new_dim=k)
+        assert_equal(
+            actual[f"{k}_counts"].sel({k: counts[k]}).transpose(*counts.dims), counts
+        )
+        assert (actual[f"{k}_counts"].sum(k) == 2500).all()
+    assert "hit_counts" not in actual
+    assert "half_counts" not in actual
+
+
+def test_stream_dataarray():
+    actual = stream(lambda: check(10, DC=15).outcome, 3000)
+    assert actual.outcome_counts.sum() == 3000
+    assert set(actual.outcome.values.tolist()) == {-1, 0, 1, 2}
+
+    actual = stream(lambda: check(10, DC=15).outcome.rename(None), 3000)
+    assert "value_mean" in actual
+
+
+def test_stream_single_chunk():
+    actual = stream(lambda: check(10, DC=15), 10, chunk_size=100)
+    assert actual.roll_size == 10
+    assert actual.outcome_counts.sum() == 10
+
+
+def test_stream_restores_roll_size():
+    def func():
+        raise ZeroDivisionError()
+
+    with pytest.raises(ZeroDivisionError):
+        stream(func, 10, chunk_size=3)
+    assert get_config()["roll_size"] == 1000
+
+
+@pytest.mark.parametrize("kwargs", [{"roll_size": 0}, {"chunk_size": 0}])
+def test_stream_bad_params(kwargs):
+    kwargs = {"roll_size": 10, **kwargs}
+    with pytest.raises(ValueError, match="positive"):
+        stream(lambda: check(10, DC=15), **kwargs)
+
+
+def test_stream_mean_var_numerical_stability():
+    """Chan's algorithm does not lose precision with a large offset"""
+    offset = 10**9
+    actual = stream(lambda: check(10, DC=15).natural + offset, 5000, chunk_size=100)
+    np.testing.assert_allclose(actual.natural_mean - offset, 10.5, atol=0.3)
+    np.testing.assert_allclose(actual.natural_var, 399 / 12, rtol=0.05)
+
+
+def test_converge():
+    calls = []
+
+    def func():
+        calls.append(get_config()["roll_size"])
+        return damage(
+            check(
+                DataArray([5, 10], dims=["target"]), DC=20, dependent_dims=["target"]
+            ),
+            Damage("fire", 2, 6, 3),
+            dependent_dims=["target"],
+        )
+
+    actual = converge(func, 0.05, mean=["total_damage"], counts=["outcome"])
+    assert actual.converged
+    assert actual.roll_size == sum(calls)
+    assert all(c == 1000 for c in calls)
+    assert len(calls) > 1
+    assert actual.stderr <= 0.05
+    assert actual.total_damage_mean_stderr.dims == ("target",)
+    assert actual.outcome_freq_stderr.dims == ("target", "outcome")
+    assert actual.stderr == max(
+        actual.total_damage_mean_stderr.max(), actual.outcome_freq_stderr.max()
+    )
+    np.testing.assert_allclose(
+        actual.total_damage_mean_stderr,
+        np.sqrt(actual.total_damage_var / actual.roll_size),
+    )
+    freq = (actual.outcome_counts + 1) / (actual.roll_size + 2)
+    np.testing.assert_allclose(
+        actual.outcome_freq_stderr, np.sqrt(freq * (1 - freq) / actual.roll_size)
+    )
+    # Without converge, it would have taken one chunk
+    assert stream(func, 1000).roll_size == 1000
+
+
+def test_converge_single_value():
+    """A value observed in every roll doesn't have zero standard error,
+    so converge() doesn't stop after the first chunk.
+    """
+    calls = []
+
+    def func():
+        roll_size = get_config()["roll_size"]
+        calls.append(roll_size)
+        return DataArray(np.ones(roll_size, dtype=int), dims=["roll"], name="x")
+
+    actual = converge(func, 0.005, counts=["x"], chunk_size=100)
+    assert actual.x_counts.values.tolist() == [actual.roll_size]
+    assert len(calls) > 1
+    assert actual.converged
+    assert 0 < actual.stderr <= 0.005
+
+
+def test_converge_max_roll_size():
+    actual = converge(
+        lambda: check(10, DC=15),
+        1e-6,
+        counts=["outcome"],
+        chunk_size=300,
+        max_roll_size=1000,
+    )
+    assert actual.roll_size == 1000
+    assert not actual.converged
+    assert actual.stderr > 1e-6
+
+
+def test_converge_bad_params():
+    with pytest.raises(ValueError, match="mean or counts"):
+        converge(lambda: check(10, DC=15), 0.01)
+    with pytest.raises(ValueError, match="positive"):
+        converge(lambda: check(10, DC=15), 0.01, mean=["outcome"], chunk_size=0)
+    with pytest.raises(ValueError, match="'foo'"):
+        converge(lambda: check(10, DC=15), 0.01, mean=["foo"])
+    with pytest.raises(ValueError, match="'bonus'"):
+        converge(lambda: check(10, DC=15), 0.01, counts=["bonus"])
+
+
+def test_counter_rng():
+    set_config(counter_rng=True)
+
+    def f():
+        return damage(check(8, DC=17), Damage("slashing", 2, 6, 4))
+
+    seed(0)
+    set_config(roll_size=1000)
+    expect = f().total_damage
+    seed(0)
+    actual = stream(f, 1000, chunk_size=300)
+    assert_allclose(actual.total_damage_mean, expect.mean("roll"))
+    assert_allclose(actual.total_damage_var, expect.var("roll"))
+    for value in range(int(expect.max()) + 1):
+        assert (
+            actual.total_damage_counts.sel(total_damage=value)
+            == (expect == value).sum()
+        )
+    # stream() advances the draw counter like a single call to func
+    a = roll(1, 6)
+    seed(0)
+    f()
+    assert_equal(roll(1, 6), a)